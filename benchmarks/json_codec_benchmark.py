@@ -0,0 +1,61 @@
+"""
+Per message cost of the websocket JSON codec against the standard library, for the messages of a telephony call:
+parsing an inbound media event and dumping outbound media and mark events.
+
+    python benchmarks/json_codec_benchmark.py [--number 100000]
+
+Install bolna[fast-json] to measure the orjson codec, the stdlib fallback is measured otherwise.
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import timeit
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bolna.helpers import json_codec
+
+# 20ms of 8kHz mulaw, what Twilio sends 50 times a second
+PAYLOAD = base64.b64encode(os.urandom(160)).decode("utf-8")
+INBOUND_MEDIA = json.dumps({"event": "media", "sequenceNumber": "42", "streamSid": "MZ" + uuid.uuid4().hex,
+                            "media": {"track": "inbound", "chunk": "41", "timestamp": "820", "payload": PAYLOAD}},
+                           separators=(",", ":"))
+# 256ms of 8kHz mulaw, an outbound chunk
+OUTBOUND_MEDIA = {"event": "media", "streamSid": "MZ" + uuid.uuid4().hex,
+                  "media": {"payload": base64.b64encode(os.urandom(2048)).decode("utf-8")}}
+OUTBOUND_MARK = {"event": "mark", "streamSid": "MZ" + uuid.uuid4().hex, "mark": {"name": str(uuid.uuid4())}}
+
+CASES = [
+    # What the telephony input handler does with every inbound message
+    ("parse media", lambda: json_codec.extract_media(INBOUND_MEDIA) or json_codec.loads(INBOUND_MEDIA),
+     lambda: json.loads(INBOUND_MEDIA)),
+    ("dumps media", lambda: json_codec.dumps(OUTBOUND_MEDIA), lambda: json.dumps(OUTBOUND_MEDIA)),
+    ("dumps mark", lambda: json_codec.dumps(OUTBOUND_MARK), lambda: json.dumps(OUTBOUND_MARK)),
+]
+
+
+def measure(function, number, repeat):
+    """Best of repeat runs in microseconds per call"""
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=100000, help="calls per run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs, the fastest one is reported")
+    args = parser.parse_args()
+
+    if json_codec.orjson is None:
+        assert json_codec.extract_media(INBOUND_MEDIA) == json.loads(INBOUND_MEDIA)["media"]
+    print(f"codec: {'orjson' if json_codec.orjson is not None else 'stdlib'}")
+    print(f"{'message':<14}{'codec us':>10}{'stdlib us':>11}{'speedup':>9}")
+    for name, codec_function, stdlib_function in CASES:
+        codec_time = measure(codec_function, args.number, args.repeat)
+        stdlib_time = measure(stdlib_function, args.number, args.repeat)
+        print(f"{name:<14}{codec_time:>10.2f}{stdlib_time:>11.2f}{stdlib_time / codec_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
 from .base_manager import BaseManager
 from .task_manager import TaskManager
 from .assistant_manager import AssistantManager
+from .agent_plan import AgentPlan, AgentPlanCache
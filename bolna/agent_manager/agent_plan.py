@@ -0,0 +1,178 @@
+import asyncio
+import time
+import json
+from collections import OrderedDict
+from bolna.models import AgentModel
+from bolna.providers import *
+from bolna.agent_types.graph_based_conversational_agent import get_compiled_graph
+from bolna.helpers.utils import get_md5_hash, get_prompt_responses
+from bolna.helpers.logger_config import configure_logger
+
+logger = configure_logger(__name__)
+
+AGENT_UPDATES_CHANNEL = "agent_config_updates"
+
+
+def copy_config(value):
+    """Copies nested dicts and lists, a lot cheaper than deepcopy for JSON shaped configs"""
+    if isinstance(value, dict):
+        return {key: copy_config(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_config(item) for item in value]
+    return value
+
+
+class TaskPlan:
+    """The provider classes and compiled graph of a task, resolved once per agent version instead of once per call"""
+    def __init__(self, task_id, task_config, prompts=None):
+        self.task_id = task_id
+        # Never handed out as is, TaskManager pops and overwrites keys of the config it gets
+        self.task_config = task_config
+        self.prompts = prompts
+        self.provider_classes = {}
+        self.graph = None
+
+        tools_config = task_config["tools_config"]
+        if tools_config.get("input") is not None:
+            self.__resolve("input", SUPPORTED_INPUT_HANDLERS, tools_config["input"]["provider"], "default")
+        if tools_config.get("output") is not None:
+            self.__resolve("output", SUPPORTED_OUTPUT_HANDLERS, tools_config["output"]["provider"], "default")
+        if tools_config.get("transcriber") is not None:
+            self.__resolve("transcriber", SUPPORTED_TRANSCRIBER_MODELS, tools_config["transcriber"]["model"])
+        if tools_config.get("synthesizer") is not None:
+            self.__resolve("synthesizer", SUPPORTED_SYNTHESIZER_MODELS, tools_config["synthesizer"]["provider"],
+                           tools_config["synthesizer"].get("backup_provider"), required=1)
+        llm_agent_config = tools_config.get("llm_agent")
+        if llm_agent_config is not None:
+            self.__resolve("llm", SUPPORTED_LLM_MODELS, llm_agent_config["family"], llm_agent_config.get("fallback_family"),
+                           required=1)
+            if llm_agent_config.get("agent_flow_type") == "preprocessed" and "prompt" not in llm_agent_config and prompts:
+                self.graph = get_compiled_graph(prompts)
+
+    def __resolve(self, component, registry, *names, required=None):
+        """Looks up every named provider, the first `required` of them (all by default) have to be supported"""
+        for index, name in enumerate(names):
+            if name is None:
+                continue
+            if name in registry:
+                self.provider_classes[(component, name)] = registry[name]
+            elif required is None or index < required:
+                raise ValueError(f"{component} {name} of task {self.task_id} is not supported")
+
+    def get_task_config(self):
+        return copy_config(self.task_config)
+
+    def get_provider_class(self, component, name):
+        return self.provider_classes.get((component, name))
+
+
+class AgentPlan:
+    """A validated agent config along with the plans of its tasks, shared by every call to this version of the agent"""
+    def __init__(self, agent_id, version, agent_config, prompt_responses=None):
+        AgentModel.model_validate(agent_config)
+        self.agent_id = agent_id
+        self.version = version
+        self.agent_config = agent_config
+        self.agent_name = agent_config.get("agent_name", agent_config.get("assistant_name"))
+        self.prompt_responses = prompt_responses
+        self.tasks = tuple(TaskPlan(task_id, task, (prompt_responses or {}).get(f"task_{task_id + 1}"))
+                           for task_id, task in enumerate(agent_config.get("tasks", [])))
+        self.checked_at = time.time()
+
+
+class AgentPlanCache:
+    """
+    Process local LRU of agent plans keyed by agent id. Plans are dropped as soon as an update is published on the
+    agent updates channel, and while that subscription is down they're checked against the stored version after
+    max_age seconds. Only a changed config gets parsed and compiled again.
+    """
+    def __init__(self, redis_client, max_plans=256, max_age=30, channel=AGENT_UPDATES_CHANNEL, local=True):
+        self.redis_client = redis_client
+        self.max_plans = max_plans
+        self.max_age = max_age
+        self.channel = channel
+        self.local = local
+        self.plans = OrderedDict()
+        self.pending = {}
+        # Agents updated while their plan was being compiled, that plan may already be stale and isn't cached
+        self.updated_while_compiling = set()
+        self.subscribed = False
+        self.subscribed_at = None
+        self.stats = {"hits": 0, "misses": 0, "version_checks": 0, "compiled": 0, "invalidations": 0}
+
+    async def __compile(self, agent_id, plan):
+        retrieved_agent_config = await self.redis_client.get(agent_id)
+        if retrieved_agent_config is None:
+            raise KeyError(f"Agent {agent_id} not found")
+
+        version = get_md5_hash(retrieved_agent_config)
+        if plan is not None and plan.version == version:
+            plan.checked_at = time.time()
+            return plan
+
+        prompt_responses = await get_prompt_responses(assistant_id=agent_id, local=self.local)
+        plan = AgentPlan(agent_id, version, json.loads(retrieved_agent_config), prompt_responses=prompt_responses or None)
+        logger.info(f"Compiled plan {version} of agent {agent_id}")
+        self.stats["compiled"] += 1
+        if agent_id in self.updated_while_compiling:
+            return plan
+        self.plans[agent_id] = plan
+        self.plans.move_to_end(agent_id)
+        while len(self.plans) > self.max_plans:
+            self.plans.popitem(last=False)
+        return plan
+
+    async def get(self, agent_id):
+        """Returns the agent's plan, raises KeyError if there's no such agent and ValueError if its config is invalid"""
+        plan = self.plans.get(agent_id)
+        if plan is not None:
+            self.plans.move_to_end(agent_id)
+            # Updates published before we subscribed were missed, so only plans checked since then are trusted
+            trusted = self.subscribed and plan.checked_at >= self.subscribed_at
+            if trusted or time.time() - plan.checked_at < self.max_age:
+                self.stats["hits"] += 1
+                return plan
+            self.stats["version_checks"] += 1
+        else:
+            self.stats["misses"] += 1
+
+        if agent_id not in self.pending:
+            self.pending[agent_id] = asyncio.ensure_future(self.__compile(agent_id, plan))
+            self.pending[agent_id].add_done_callback(lambda _: self.__finish_compile(agent_id))
+        return await asyncio.shield(self.pending[agent_id])
+
+    def __finish_compile(self, agent_id):
+        self.pending.pop(agent_id, None)
+        self.updated_while_compiling.discard(agent_id)
+
+    def invalidate(self, agent_id):
+        if agent_id in self.pending:
+            self.updated_while_compiling.add(agent_id)
+        if self.plans.pop(agent_id, None) is not None:
+            logger.info(f"Dropped the cached plan of agent {agent_id}")
+            self.stats["invalidations"] += 1
+
+    async def publish_update(self, agent_id):
+        self.invalidate(agent_id)
+        await self.redis_client.publish(self.channel, agent_id)
+
+    async def listen_for_updates(self):
+        """Runs for the lifetime of the server, dropping plans of agents whose config was updated by any process"""
+        while True:
+            try:
+                pubsub = self.redis_client.pubsub()
+                await pubsub.subscribe(self.channel)
+                self.subscribed, self.subscribed_at = True, time.time()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.invalidate(message["data"])
+            except asyncio.CancelledError:
+                self.subscribed = False
+                raise
+            except Exception as e:
+                self.subscribed = False
+                logger.error(f"Lost the subscription to {self.channel}, falling back to version checks: {e}")
+                await asyncio.sleep(1)
+
+    def get_stats(self):
+        return {**self.stats, "plans": len(self.plans)}
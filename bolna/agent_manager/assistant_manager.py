@@ -1,16 +1,14 @@
 import time
-import tiktoken
 from .base_manager import BaseManager
 from .task_manager import TaskManager
 from bolna.helpers.logger_config import configure_logger
 
 logger = configure_logger(__name__)
 
-enc = tiktoken.get_encoding("cl100k_base")
-
 class AssistantManager(BaseManager):
     def __init__(self, agent_config, ws=None, assistant_id=None, context_data=None, conversation_history=None,
-                 connected_through_dashboard=None, cache=None, input_queue=None, output_queue=None, **kwargs):
+                 connected_through_dashboard=None, cache=None, input_queue=None, output_queue=None, semantic_cache=None,
+                 plan=None, **kwargs):
         super().__init__()
         self.tools = {}
         self.websocket = ws
@@ -22,10 +20,13 @@ class AssistantManager(BaseManager):
         self.run_id = f"{self.assistant_id}#{str(int(time.time() * 1000))}"
         self.connected_through_dashboard = connected_through_dashboard
         self.cache = cache
+        self.semantic_cache = semantic_cache
         self.input_queue = input_queue
         self.output_queue = output_queue
         self.kwargs = kwargs
         self.conversation_history = conversation_history
+        # AgentPlan of this agent's version, saves resolving providers and loading prompts on every call
+        self.plan = plan
 
 
     async def run(self, local=False, run_id=None):
@@ -39,15 +40,23 @@ class AssistantManager(BaseManager):
         for task_id, task in enumerate(self.tasks):
 
             logger.info(f"Running task {task_id} {task} and sending kwargs {self.kwargs}")
+            task_plan, prompt_kwargs = None, self.kwargs
+            if self.plan is not None:
+                task_plan = self.plan.tasks[task_id]
+                # TaskManager modifies its task config, the plan's own stays untouched
+                task = task_plan.get_task_config()
+                if self.plan.prompt_responses is not None:
+                    prompt_kwargs = {**self.kwargs, "prompt_responses": self.plan.prompt_responses}
             task_manager = TaskManager(self.agent_config.get("agent_name", self.agent_config.get("assistant_name")),
                                        task_id, task, self.websocket,
                                        context_data=self.context_data, input_parameters=input_parameters,
                                        assistant_id=self.assistant_id, run_id=self.run_id,
                                        connected_through_dashboard=self.connected_through_dashboard,
-                                       cache=self.cache, input_queue=self.input_queue, output_queue=self.output_queue,
-                                       conversation_history=self.conversation_history, **self.kwargs)
+                                       cache=self.cache, semantic_cache=self.semantic_cache,
+                                       input_queue=self.input_queue, output_queue=self.output_queue,
+                                       conversation_history=self.conversation_history, task_plan=task_plan, **self.kwargs)
             await task_manager.load_prompt(self.agent_config.get("agent_name", self.agent_config.get("assistant_name")),
-                                           task_id, local=local, **self.kwargs)
+                                           task_id, local=local, **prompt_kwargs)
             task_output = await task_manager.run()
             task_output['run_id'] = self.run_id
             yield task_id, task_output.copy()
@@ -1,5 +1,6 @@
 import asyncio
 from collections import defaultdict
+import math
 import os
 import traceback
 import time
@@ -10,9 +11,19 @@ from datetime import datetime
 from .base_manager import BaseManager
 from bolna.agent_types import *
 from bolna.providers import *
-from bolna.helpers.utils import calculate_audio_duration, create_ws_data_packet, is_valid_md5, get_raw_audio_bytes_from_base64, \
-    get_required_input_types, format_messages, get_prompt_responses, save_audio_file_to_s3, update_prompt_with_context, get_md5_hash, clean_json_string, wav_bytes_to_pcm, write_request_logs, yield_chunks_from_memory
-from bolna.helpers.logger_config import configure_logger
+from bolna.helpers.utils import calculate_audio_duration, create_ws_data_packet, is_valid_md5, \
+    get_required_input_types, format_messages, get_prompt_responses, save_audio_file_to_s3, update_prompt_with_context, get_md5_hash, clean_json_string, wav_bytes_to_pcm, yield_chunks_from_memory
+from bolna.helpers.logger_config import configure_logger, get_logging_stats
+from bolna.helpers.filler_helpers import get_filler_phrases, load_filler_audio
+from bolna.synthesizer.synthesizer_router import SynthesizerRouter
+from bolna.llms import LLMRouter
+from bolna.memory.cache import ConversationResponseCache
+from bolna.helpers.context_window_manager import ContextWindowManager
+from bolna.helpers.usage_ledger import LLMUsageLedger
+from bolna.helpers.request_log_sink import get_request_log_sink
+from bolna.helpers.audio_asset_cache import get_audio_asset_cache
+from bolna.helpers.ws_framing import WebsocketFraming
+from bolna.helpers.mark_tracker import MarkTracker
 import uvloop
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
@@ -24,7 +35,8 @@ logger = configure_logger(__name__)
 class TaskManager(BaseManager):
     def __init__(self, assistant_name, task_id, task, ws, input_parameters=None, context_data=None,
                  assistant_id=None, run_id=None, connected_through_dashboard=False, cache=None,
-                 input_queue=None, conversation_history=None, output_queue=None, yield_chunks=True, **kwargs):
+                 input_queue=None, conversation_history=None, output_queue=None, yield_chunks=True, semantic_cache=None,
+                 task_plan=None, **kwargs):
         super().__init__()
         # Latency and logging 
         self.latency_dict = defaultdict(dict)
@@ -36,6 +48,8 @@ class TaskManager(BaseManager):
         self.tools = {}
         self.websocket = ws
         self.task_config = task
+        # Provider classes and graph resolved ahead of the call when the agent's plan is cached
+        self.task_plan = task_plan
         self.context_data = context_data
         self.connected_through_dashboard = connected_through_dashboard
         self.enforce_streaming = kwargs.get("enforce_streaming", False)
@@ -62,7 +76,7 @@ class TaskManager(BaseManager):
         # Assistant persistance stuff
         self.assistant_id = assistant_id
         self.run_id = run_id
-        self.mark_set = set()
+        self.mark_set = MarkTracker()
         
         self.conversation_ended = False
 
@@ -83,6 +97,8 @@ class TaskManager(BaseManager):
             }
         }
         #IO HANDLERS
+        # JSON or binary audio on the default websocket, negotiated by the client through the input handler
+        self.websocket_framing = WebsocketFraming()
         if task_id == 0:
             self.should_record = self.task_config["tools_config"]["output"]["provider"] == 'default' and self.enforce_streaming #In this case, this is a websocket connection and we should record 
             self.__setup_input_handlers(connected_through_dashboard, input_queue, self.should_record)
@@ -100,6 +116,10 @@ class TaskManager(BaseManager):
         self.llm_task = None
         self.synthesizer_tasks = []
         self.synthesizer_task = None
+        self.backup_synthesizer_task = None
+        self.context_window_manager = None
+        self.synthesizer_router = None
+        self.llm_router = None
 
         # state of conversation
         self.current_request_id = None
@@ -140,13 +160,23 @@ class TaskManager(BaseManager):
                 "classification_model": self.task_config["tools_config"]["llm_agent"]["classification_model"],
                 "max_tokens": self.task_config["tools_config"]["llm_agent"]["max_tokens"]
             }
-        
+            if self.task_config["tools_config"].get("transcriber") is not None:
+                # Used by the LLM to split streamed responses at language specific sentence boundaries
+                llm_config["language"] = self.task_config["tools_config"]["transcriber"].get("language") or "en"
+
         # Output stuff
         self.output_task = None
         self.buffered_output_queue = asyncio.Queue()
 
         # Memory
         self.cache = cache
+        self.response_cache = None
+        if cache is not None:
+            # A plain scalar cache gets keyed by the conversation fingerprint as well
+            self.response_cache = cache if isinstance(cache, ConversationResponseCache) else ConversationResponseCache(cache)
+        # Optional VectorCache for FAQ style agents, opt in as nothing constructs one by default. Utterances only match
+        # within the same agent, system prompt and last assistant turn, see __get_semantic_cache_scope
+        self.semantic_cache = semantic_cache
         logger.info("task initialization completed")
 
         # Sequence id for interruption
@@ -162,8 +192,22 @@ class TaskManager(BaseManager):
         #Setup tasks
         self.__setup_tasks(llm)
 
+        # Token usage of every LLM request in this task
+        self.usage_ledger = LLMUsageLedger()
+        if llm is not None:
+            llm.usage_ledger = self.usage_ledger
+        completion_llm = getattr(self.tools.get("llm_agent"), "conversation_completion_llm", None)
+        if completion_llm is not None:
+            completion_llm.usage_ledger = self.usage_ledger
+
         #setup request logs
         self.request_logs = []
+        self.request_log_sink = get_request_log_sink()
+        # Preprocessed audio shared by every call in this process, preloaded when a graph agent loads its prompts
+        self.audio_asset_cache = get_audio_asset_cache()
+        self.audio_preload_task = None
+        # Process wide logging counters at the start of the call, the difference at the end is logged with the call summary
+        self.logging_stats_at_start = get_logging_stats()
 
         # for long pauses and rushing
         
@@ -181,13 +225,15 @@ class TaskManager(BaseManager):
         #Cut conversation
         self.hang_conversation_after = task.get("hangup_after_silence", 10)
         self.last_transmitted_timesatamp = 0
+        # Stamps last_transmitted_timesatamp once a flow controlled output handler's audio has actually played
+        self.playback_stamp_task = None
         self.let_remaining_audio_pass_through = False #Will be used to let remaining audio pass through in case of utterenceEnd event and there's still audio left to be sent
         self.use_llm_to_determine_hangup = task.get("hangup_after_LLMCall", False)
         self.check_for_completion_prompt = task.get("call_cancellation_prompt", None)
         if self.check_for_completion_prompt is not None:
             completion_json_format = {"answer": "A simple Yes or No based on if you should cut the phone or not"}
             self.check_for_completion_prompt = f"{self.check_for_completion_prompt}\nYour response should be in the following json format\n{completion_json_format}"
-        self.check_for_completion_llm = os.getenv("CHECK_FOR_COMPLETION_LLM")
+        self.check_for_completion_llm = task.get("check_for_completion_llm") or os.getenv("CHECK_FOR_COMPLETION_LLM")
         self.time_since_last_spoken_human_word = 0 
 
         #Handling accidental interruption
@@ -196,7 +242,23 @@ class TaskManager(BaseManager):
         self.interruption_backoff_period = task.get("interruption_backoff_period", 300) #this is the amount of time output loop will sleep before sending next audio
         self.use_llm_for_hanging_up = task.get("hangup_after_LLMCall", False)
         self.allow_extra_sleep = False #It'll help us to back off as soon as we hear interruption for a while
+        self.completion_check_task = None
+        self.transmitted_sequence_ids = set()
+
+        # Pre-synthesized fillers played when the LLM is slow to produce its first token
+        self.use_fillers = task.get("use_fillers", False) and self._is_conversation_task() and not self.connected_through_dashboard \
+            and self.task_config["tools_config"]["output"]["provider"] in SUPPORTED_OUTPUT_TELEPHONY_HANDLERS.keys()
+        self.filler_threshold = task.get("filler_threshold", 1.0)
+        self.filler_audio = []
+        self.fillers_played = 0
         
+    def __get_provider_class(self, component, registry, name):
+        if self.task_plan is not None:
+            provider_class = self.task_plan.get_provider_class(component, name)
+            if provider_class is not None:
+                return provider_class
+        return registry.get(name)
+
     def __setup_output_handlers(self, connected_through_dashboard, output_queue):
         output_kwargs = {"websocket": self.websocket}  
         
@@ -205,20 +267,23 @@ class TaskManager(BaseManager):
         elif self.task_config["tools_config"]["output"]["provider"] in SUPPORTED_OUTPUT_HANDLERS.keys():
             if connected_through_dashboard:
                 logger.info("Connected through dashboard and hence using default output handler")
-                output_handler_class = SUPPORTED_OUTPUT_HANDLERS.get("default")
+                output_handler_class = self.__get_provider_class("output", SUPPORTED_OUTPUT_HANDLERS, "default")
                 output_kwargs['queue'] = output_queue
+                output_kwargs['framing'] = self.websocket_framing
                 self.sampling_rate = 24000
             else:
-                output_handler_class = SUPPORTED_OUTPUT_HANDLERS.get(self.task_config["tools_config"]["output"]["provider"])
+                output_handler_class = self.__get_provider_class("output", SUPPORTED_OUTPUT_HANDLERS, self.task_config["tools_config"]["output"]["provider"])
             
                 if self.task_config["tools_config"]["output"]["provider"] in SUPPORTED_OUTPUT_TELEPHONY_HANDLERS.keys():
                     output_kwargs['mark_set'] = self.mark_set
+                    output_kwargs['max_buffered_duration'] = self.task_config.get("max_buffered_audio_duration", 1.0)
                     logger.info(f"Making sure that the sampling rate for output handler is 8000")
                     self.task_config['tools_config']['synthesizer']['provider_config']['sampling_rate'] = 8000
                     self.task_config['tools_config']['synthesizer']['audio_format'] = 'pcm'
                 else:
                     self.task_config['tools_config']['synthesizer']['provider_config']['sampling_rate'] = 24000
                     output_kwargs['queue'] = output_queue
+                    output_kwargs['framing'] = self.websocket_framing
                 self.sampling_rate = self.task_config['tools_config']['synthesizer']['provider_config']['sampling_rate']
 
             self.tools["output"] = output_handler_class(**output_kwargs)
@@ -239,14 +304,16 @@ class TaskManager(BaseManager):
             if connected_through_dashboard:
                 logger.info("Connected through dashboard and hence using default input handler")
                 # If connected through dashboard get basic dashboard class
-                input_handler_class = SUPPORTED_INPUT_HANDLERS.get("default")
+                input_handler_class = self.__get_provider_class("input", SUPPORTED_INPUT_HANDLERS, "default")
                 input_kwargs['queue'] = input_queue
+                input_kwargs['framing'] = self.websocket_framing
             else:
-                input_handler_class = SUPPORTED_INPUT_HANDLERS.get(
+                input_handler_class = self.__get_provider_class("input", SUPPORTED_INPUT_HANDLERS,
                     self.task_config["tools_config"]["input"]["provider"])
 
                 if self.task_config['tools_config']['input']['provider'] == 'default':
                     input_kwargs['queue'] = input_queue
+                    input_kwargs['framing'] = self.websocket_framing
             self.tools["input"] = input_handler_class(**input_kwargs)
         else:
             raise "Other input handlers not supported yet"
@@ -261,7 +328,7 @@ class TaskManager(BaseManager):
                 if self.connected_through_dashboard:
                     self.task_config["tools_config"]["transcriber"]["stream"] = True if self.enforce_streaming else False
                     logger.info(f'self.task_config["tools_config"]["transcriber"]["stream"] {self.task_config["tools_config"]["transcriber"]["stream"]} self.enforce_streaming {self.enforce_streaming}')
-                transcriber_class = SUPPORTED_TRANSCRIBER_MODELS.get(
+                transcriber_class = self.__get_provider_class("transcriber", SUPPORTED_TRANSCRIBER_MODELS,
                     self.task_config["tools_config"]["transcriber"]["model"])
                 self.tools["transcriber"] = transcriber_class(provider, **self.task_config["tools_config"]["transcriber"], **self.kwargs)
 
@@ -271,35 +338,76 @@ class TaskManager(BaseManager):
             self.kwargs["use_turbo"] = self.task_config["tools_config"]["transcriber"]["language"] == "en"
         if self.task_config["tools_config"]["synthesizer"] is not None:
             self.synthesizer_provider = self.task_config["tools_config"]["synthesizer"].pop("provider")
-            synthesizer_class = SUPPORTED_SYNTHESIZER_MODELS.get(self.synthesizer_provider)
+            synthesizer_class = self.__get_provider_class("synthesizer", SUPPORTED_SYNTHESIZER_MODELS, self.synthesizer_provider)
             provider_config = self.task_config["tools_config"]["synthesizer"].pop("provider_config")
+            backup_provider = self.task_config["tools_config"]["synthesizer"].pop("backup_provider", None)
+            backup_provider_config = self.task_config["tools_config"]["synthesizer"].pop("backup_provider_config", None)
+            first_byte_deadline = self.task_config["tools_config"]["synthesizer"].pop("first_byte_deadline", None)
             if self.connected_through_dashboard:
                 self.task_config["tools_config"]["synthesizer"]["audio_format"] = "mp3" # Hard code mp3 if we're connected through dashboard
                 self.task_config["tools_config"]["synthesizer"]["stream"] = True if self.enforce_streaming else False #Hardcode stream to be False as we don't want to get blocked by a __listen_synthesizer co-routine
         
             self.tools["synthesizer"] = synthesizer_class(**self.task_config["tools_config"]["synthesizer"], **provider_config, **self.kwargs)
+
+            if backup_provider is not None and backup_provider in SUPPORTED_SYNTHESIZER_MODELS.keys():
+                logger.info(f"Setting up {backup_provider} as the backup synthesizer")
+                backup_provider_config = dict(backup_provider_config or {})
+                if "sampling_rate" in provider_config:
+                    backup_provider_config["sampling_rate"] = provider_config["sampling_rate"]
+                backup_synthesizer_class = self.__get_provider_class("synthesizer", SUPPORTED_SYNTHESIZER_MODELS, backup_provider)
+                self.backup_synthesizer_provider = backup_provider
+                self.tools["backup_synthesizer"] = backup_synthesizer_class(**self.task_config["tools_config"]["synthesizer"], **backup_provider_config, **self.kwargs)
+                self.synthesizer_router = SynthesizerRouter(self.synthesizer_provider, backup_provider,
+                                                            first_byte_deadline=first_byte_deadline or 1.0)
             if self.task_config["tools_config"]["llm_agent"] is not None:
                 llm_config["buffer_size"] = self.task_config["tools_config"]["synthesizer"].get('buffer_size')
 
     def __setup_llm(self, llm_config):
         if self.task_config["tools_config"]["llm_agent"] is not None:
             if self.task_config["tools_config"]["llm_agent"]["family"] in SUPPORTED_LLM_MODELS.keys():
-                llm_class = SUPPORTED_LLM_MODELS.get(self.task_config["tools_config"]["llm_agent"]["family"])
+                llm_class = self.__get_provider_class("llm", SUPPORTED_LLM_MODELS, self.task_config["tools_config"]["llm_agent"]["family"])
                 logger.info(f"LLM CONFIG {llm_config}")
                 llm = llm_class(**llm_config, **self.kwargs)
+                if self.task_config["tools_config"]["llm_agent"].get("use_fallback", False):
+                    llm = self.__setup_fallback_llm(llm, llm_config)
                 return llm
             else:
                 raise Exception(f'LLM {self.task_config["tools_config"]["llm_agent"]["family"]} not supported')
 
+    def __setup_fallback_llm(self, llm, llm_config):
+        llm_agent_config = self.task_config["tools_config"]["llm_agent"]
+        fallback_family = llm_agent_config.get("fallback_family") or llm_agent_config["family"]
+        fallback_model = llm_agent_config.get("fallback_model")
+        if fallback_model is None or fallback_family not in SUPPORTED_LLM_MODELS.keys():
+            logger.error(f"use_fallback is set but fallback {fallback_family}/{fallback_model} is not supported, using {llm_agent_config['family']} alone")
+            return llm
+
+        fallback_config = {**llm_config, "streaming_model": fallback_model, "classification_model": fallback_model}
+        # Keys and endpoints passed in belong to the primary, the fallback picks its own up from the environment
+        fallback_kwargs = {key: value for key, value in self.kwargs.items() if key not in ("llm_key", "base_url", "api_version")}
+        fallback_llm = self.__get_provider_class("llm", SUPPORTED_LLM_MODELS, fallback_family)(**fallback_config, **fallback_kwargs)
+        self.llm_router = LLMRouter(llm, fallback_llm, first_token_deadline=llm_agent_config.get("fallback_first_token_deadline") or 1.5)
+        return self.llm_router
+
     def __setup_tasks(self, llm):
         if self.task_config["task_type"] == "conversation":
             if self.task_config["tools_config"]["llm_agent"]["agent_flow_type"] == "streaming":
-                self.tools["llm_agent"] = StreamingContextualAgent(llm)
+                self.tools["llm_agent"] = StreamingContextualAgent(llm, completion_check_model=self.task_config.get("check_for_completion_llm"))
+                llm_agent_config = self.task_config["tools_config"]["llm_agent"]
+                self.context_window_manager = ContextWindowManager(
+                    token_budget=llm_agent_config.get("context_token_budget"), model=llm_agent_config["streaming_model"],
+                    summarizer=llm if llm_agent_config.get("summarize_context", False) else None)
             elif self.task_config["tools_config"]["llm_agent"]["agent_flow_type"] in ("preprocessed", "formulaic"):
                 preprocessed = self.task_config["tools_config"]["llm_agent"]["agent_flow_type"] == "preprocessed"
                 logger.info(f"LLM TYPE {type(llm)}")
+                llm_agent_config = self.task_config["tools_config"]["llm_agent"]
                 self.tools["llm_agent"] = GraphBasedConversationAgent(llm, context_data=self.context_data,
-                                                                      prompts=self.prompts, preprocessed=preprocessed)
+                                                                      prompts=self.prompts, preprocessed=preprocessed,
+                                                                      context_token_budget=llm_agent_config.get("context_token_budget"),
+                                                                      local_classifier=llm_agent_config.get("local_classifier", False),
+                                                                      classifier_threshold=llm_agent_config.get("local_classifier_threshold", 0.5),
+                                                                      classifier_margin=llm_agent_config.get("local_classifier_margin", 0.1),
+                                                                      classifier_verify_rate=llm_agent_config.get("local_classifier_verify_rate", 0.1))
         elif self.task_config["task_type"] == "extraction":
             logger.info("Setting up extraction agent")
             self.tools["llm_agent"] = ExtractionContextualAgent(llm, prompt=self.system_prompt)
@@ -333,9 +441,13 @@ class TaskManager(BaseManager):
             prompt_responses = kwargs.get('prompt_responses', None)
             if not prompt_responses:
                 prompt_responses = await get_prompt_responses(assistant_id=self.assistant_id, local=self.is_local)
-            self.prompts = prompt_responses["task_{}".format(task_id + 1)]
+            # Copied as the system prompt gets enriched with this call's context and prompt_responses may be shared
+            self.prompts = dict(prompt_responses["task_{}".format(task_id + 1)])
             if self.task_config["tools_config"]["llm_agent"]['agent_flow_type'] == "preprocessed":
-                self.tools["llm_agent"].load_prompts_and_create_graph(self.prompts)
+                graph = self.task_plan.graph if self.task_plan is not None else None
+                self.tools["llm_agent"].load_prompts_and_create_graph(self.prompts, graph=graph)
+                # Warm the shared audio cache while the call connects, turns wait on fetches still in flight
+                self.audio_preload_task = asyncio.create_task(self.__preload_preprocessed_audio())
 
         if "system_prompt" in self.prompts:
             # This isn't a graph based agent
@@ -360,6 +472,12 @@ class TaskManager(BaseManager):
 
         self.interim_history = copy.deepcopy(self.history)
 
+        if self.use_fillers:
+            language = self.task_config["tools_config"]["transcriber"].get("language", "en")
+            filler_phrases = get_filler_phrases(self.task_config.get("filler_phrases"), language)
+            self.filler_audio = await load_filler_audio(self.assistant_id, filler_phrases, local=self.is_local)
+            logger.info(f"Loaded {len(self.filler_audio)} fillers")
+
     def __process_stop_words(self, text_chunk, meta_info):
          #THis is to remove stop words. Really helpful in smaller 7B models
         if "end_of_llm_stream" in meta_info and meta_info["end_of_llm_stream"] and "user" in text_chunk[-5:].lower():
@@ -400,6 +518,15 @@ class TaskManager(BaseManager):
         
         self.synthesizer_tasks = []
 
+        if self.completion_check_task is not None:
+            self.completion_check_task.cancel()
+            self.completion_check_task = None
+
+        if "synthesizer" in self.tools:
+            await self.tools["synthesizer"].handle_interruption()
+        if "backup_synthesizer" in self.tools:
+            await self.tools["backup_synthesizer"].handle_interruption()
+
         logger.info(f"Synth Task cancelled seconds")
         if not self.buffered_output_queue.empty():
             logger.info(f"Output queue was not empty and hence emptying it")
@@ -489,6 +616,10 @@ class TaskManager(BaseManager):
         logger.info("Done")
 
     async def __process_end_of_conversation(self):
+        if self.tools.get("output") is not None and not self.conversation_ended:
+            # Telephony audio is sent ahead of playback, let the goodbye play out before closing the call
+            if not await self.tools["output"].wait_until_played():
+                logger.info("Provider didn't ack the last of the audio, ending the conversation anyway")
         logger.info("Got end of conversation. I'm stopping now")
         self.conversation_ended = True
         self.ended_by_assistant = True
@@ -504,7 +635,7 @@ class TaskManager(BaseManager):
         logger.info(f"It's a preprocessed flow and hence updating current node")
         self.tools['llm_agent'].update_current_node()
     
-    def __convert_to_request_log(self, message, meta_info, model, component = "transcriber", direction = 'response'):
+    def __convert_to_request_log(self, message, meta_info, model, component = "transcriber", direction = 'response', input_tokens = None, output_tokens = None):
         log = dict()
         log['direction'] = direction
         log['data'] = message
@@ -513,19 +644,23 @@ class TaskManager(BaseManager):
         log['component'] = component
         log['sequence_id'] = meta_info['sequence_id']
         log['model'] = model
+        if input_tokens is not None:
+            log['input_tokens'] = input_tokens
+        if output_tokens is not None:
+            log['output_tokens'] = output_tokens
         if component == "transcriber":
             if 'is_final' in meta_info and meta_info['is_final']:
                 log['is_final'] = True
         else:
             log['is_final'] = False #This is logged only for users to know final transcript from the transcriber
-        asyncio.create_task(write_request_logs(log, self.run_id))
+        self.request_log_sink.log(log, self.run_id)
 
     ##############################################################
     # LLM task
     ##############################################################
     async def _handle_llm_output(self, next_step, text_chunk, should_bypass_synth, meta_info):
 
-        logger.info("received text from LLM for output processing: {} which belongs to sequence id {}".format(text_chunk, meta_info['sequence_id']))
+        logger.hot("llm_output", "received text from LLM for output processing: %s which belongs to sequence id %s", text_chunk, meta_info['sequence_id'])
         if "request_id" not in meta_info:
             meta_info["request_id"] = str(uuid.uuid4())
         first_buffer_latency = time.time() - meta_info["llm_start_time"]
@@ -535,7 +670,7 @@ class TaskManager(BaseManager):
             task = asyncio.create_task(self._synthesize(create_ws_data_packet(text_chunk, meta_info)))
             self.synthesizer_tasks.append(asyncio.ensure_future(task))
         elif self.tools["output"] is not None:
-            logger.info("Synthesizer not the next step and hence simply returning back")
+            logger.hot("llm_output_bypass", "Synthesizer not the next step and hence simply returning back")
             #self.history = copy.deepcopy(self.interim_history)
             await self.tools["output"].handle(create_ws_data_packet(text_chunk, meta_info))
 
@@ -594,70 +729,150 @@ class TaskManager(BaseManager):
         should_bypass_synth = 'bypass_synth' in meta_info and meta_info['bypass_synth'] == True
         next_step = self._get_next_step(sequence, "llm")        
         meta_info['llm_start_time'] = time.time()
-        cache_response = self.cache.get(get_md5_hash(message['data'])) if self.cache is not None else None
-        if cache_response is not None:
-            logger.info("It was a cache hit and hence simply returning")
-            await self._handle_llm_output(next_step, cache_response, should_bypass_synth, meta_info)
+        messages = copy.deepcopy(self.history)
+        messages.append({'role': 'user', 'content': message['data']})
+
+        cache_key, cached_response = None, None
+        if self.response_cache is not None:
+            cache_key = self.response_cache.get_fingerprint(messages, agent_id=self.assistant_id)
+            cached_response = self.response_cache.get(cache_key, agent_id=self.assistant_id)
+
+        # Semantic cache entries are the response as [(text_chunk, end_of_llm_stream)]
+        semantic_cache_scope = None
+        if cached_response is None and self.semantic_cache is not None:
+            semantic_cache_scope = self.__get_semantic_cache_scope(messages)
+            cached_response = self.semantic_cache.get(message['data'], scope=semantic_cache_scope)
+
+        filler_task = None
+        if cached_response is not None:
+            logger.info("It was a cache hit and hence replaying the cached response")
+            llm_stream = self.__replay_cached_response(cached_response)
         else:
-            messages = copy.deepcopy(self.history)
-            messages.append({'role': 'user', 'content': message['data']})
+            # Only the part of the history which fits the token budget goes to the LLM, the full history is still kept
+            llm_messages, input_tokens = self.context_window_manager.fit(messages)
             ### TODO CHECK IF THIS IS EVEN REQUIRED
-            self.__convert_to_request_log(message=format_messages(messages, use_system_prompt= True), meta_info= meta_info, component="llm", direction="request", model=self.task_config["tools_config"]["llm_agent"]["streaming_model"])
-            
-            async for llm_message in self.tools['llm_agent'].generate(messages, synthesize=True):
-                text_chunk, end_of_llm_stream = llm_message
-                llm_response += " " + text_chunk
-                if self.stream:
-                    if end_of_llm_stream:
-                        meta_info["end_of_llm_stream"] = True
-                    text_chunk = self.__process_stop_words(text_chunk, meta_info)
-                    logger.info(f"##### O/P from LLM {text_chunk} {llm_response}")
-                    await self._handle_llm_output(next_step, text_chunk, should_bypass_synth, meta_info)
-                    
-            if not self.stream:
-                meta_info["end_of_llm_stream"] = True
-                messages.append({"role": "assistant", "content": llm_response})
-                self.history = copy.deepcopy(messages)
-                await self._handle_llm_output(next_step, llm_response, should_bypass_synth, meta_info)
-                self.__convert_to_request_log(message = llm_response, meta_info= meta_info, component="llm", direction="response", model=self.task_config["tools_config"]["llm_agent"]["streaming_model"])
-            else:    
-                if self.current_request_id in self.llm_rejected_request_ids:
-                    logger.info("##### User spoke while LLM was generating response")
-                else:
-                    messages.append({"role": "assistant", "content": llm_response})
-                    self.__convert_to_request_log(message=llm_response, meta_info= meta_info, component="llm", direction="response", model=self.task_config["tools_config"]["llm_agent"]["streaming_model"])
-                    self.interim_history = copy.deepcopy(messages)
-                    self.llm_response_generated = True
-                    if self.callee_silent:
-                        logger.info("##### When we got utterance end, maybe LLM was still generating response. So, copying into history")
-                        self.history = copy.deepcopy(self.interim_history)
-                    #self.__update_transcripts()
-
-            # TODO : Write a better check for completion prompt 
-            if self.use_llm_to_determine_hangup and not self.connected_through_dashboard:
-                answer = await self.tools["llm_agent"].check_for_completion(self.history, self.check_for_completion_prompt)
-                should_hangup = answer['answer'].lower() == "yes"
-                prompt = [
-                        {'role': 'system', 'content': self.check_for_completion_prompt},
-                        {'role': 'user', 'content': format_messages(self.history, use_system_prompt= True)}]
-                logger.info(f"##### Answer from the LLM {answer}")
-                self.__convert_to_request_log(message=format_messages(prompt, use_system_prompt= True), meta_info= meta_info, component="llm", direction="request", model=self.task_config["tools_config"]["llm_agent"]["streaming_model"])
-                self.__convert_to_request_log(message=answer, meta_info= meta_info, component="llm", direction="response", model= self.check_for_completion_llm)
+            self.__convert_to_request_log(message=format_messages(llm_messages, use_system_prompt= True), meta_info= meta_info, component="llm", direction="request", model=self.task_config["tools_config"]["llm_agent"]["streaming_model"], input_tokens=input_tokens)
+            if self.stream and len(self.filler_audio) > 0:
+                filler_task = asyncio.create_task(self.__play_filler_after_threshold(meta_info))
+                self.synthesizer_tasks.append(filler_task)
+            llm_stream = self.tools['llm_agent'].generate(llm_messages, synthesize=True)
+
+        response_chunks = []
+        async for llm_message in llm_stream:
+            response_chunks.append(llm_message)
+            if filler_task is not None:
+                # Once the LLM starts responding we don't need a filler anymore. An already queued filler plays out fully before the response
+                filler_task.cancel()
+                filler_task = None
+            text_chunk, end_of_llm_stream = llm_message
+            llm_response += " " + text_chunk
+            if self.stream:
+                if end_of_llm_stream:
+                    meta_info["end_of_llm_stream"] = True
+                text_chunk = self.__process_stop_words(text_chunk, meta_info)
+                logger.info(f"##### O/P from LLM {text_chunk} {llm_response}")
+                await self._handle_llm_output(next_step, text_chunk, should_bypass_synth, meta_info)
                 
-                if should_hangup:
-                    await self.__process_end_of_conversation()
-                    return
+        if not self.stream:
+            meta_info["end_of_llm_stream"] = True
+            messages.append({"role": "assistant", "content": llm_response})
+            self.history = copy.deepcopy(messages)
+            await self._handle_llm_output(next_step, llm_response, should_bypass_synth, meta_info)
+            self.__convert_to_request_log(message = llm_response, meta_info= meta_info, component="llm", direction="response", model=self.task_config["tools_config"]["llm_agent"]["streaming_model"], output_tokens=self.context_window_manager.count_text_tokens(llm_response))
+        else:    
+            if self.current_request_id in self.llm_rejected_request_ids:
+                logger.info("##### User spoke while LLM was generating response")
+            else:
+                messages.append({"role": "assistant", "content": llm_response})
+                self.__convert_to_request_log(message=llm_response, meta_info= meta_info, component="llm", direction="response", model=self.task_config["tools_config"]["llm_agent"]["streaming_model"], output_tokens=self.context_window_manager.count_text_tokens(llm_response))
+                self.interim_history = copy.deepcopy(messages)
+                self.llm_response_generated = True
+                if self.callee_silent:
+                    logger.info("##### When we got utterance end, maybe LLM was still generating response. So, copying into history")
+                    self.history = copy.deepcopy(self.interim_history)
+                #self.__update_transcripts()
+
+        if cached_response is None:
+            # Streaming responses don't report usage and hence counting what was sent and received
+            model = self.llm_router.last_model if self.llm_router is not None else self.task_config["tools_config"]["llm_agent"]["streaming_model"]
+            output_tokens = self.context_window_manager.count_text_tokens(llm_response)
+            self.usage_ledger.record(model, input_tokens, output_tokens, sequence_id=meta_info.get("sequence_id"))
+            logger.summary("llm_turn", sequence_id=meta_info.get("sequence_id"), model=model, input_tokens=input_tokens,
+                           output_tokens=output_tokens, rejected=self.current_request_id in self.llm_rejected_request_ids)
+
+        if cached_response is None and self.current_request_id not in self.llm_rejected_request_ids:
+            if cache_key is not None:
+                self.response_cache.set(cache_key, response_chunks)
+            if semantic_cache_scope is not None:
+                self.semantic_cache.set(message['data'], response_chunks, scope=semantic_cache_scope)
+
+        # Decide on hanging up while the response is being synthesized instead of holding up the next turn
+        if self.use_llm_to_determine_hangup and not self.connected_through_dashboard:
+            self.completion_check_task = asyncio.create_task(self.__check_for_hangup(copy.deepcopy(self.history), meta_info))
+
+        self.llm_processed_request_ids.add(self.current_request_id)
+        llm_response = ""
+
+    def __get_semantic_cache_scope(self, messages):
+        """The agent, its system prompt and the assistant turn being answered, an answer is only reused within these"""
+        system_prompt = self.system_prompt.get("content", "") if isinstance(self.system_prompt, dict) else ""
+        last_assistant_turn = next((message["content"] for message in reversed(messages) if message["role"] == "assistant"), "")
+        return f"{self.assistant_id}:{get_md5_hash(system_prompt)}:{get_md5_hash(last_assistant_turn or '')}"
+
+    async def __check_for_hangup(self, history, meta_info):
+        try:
+            answer = await self.tools["llm_agent"].check_for_completion(history, self.check_for_completion_prompt)
+            should_hangup = answer['answer'].lower() == "yes"
+            prompt = [
+                    {'role': 'system', 'content': self.check_for_completion_prompt},
+                    {'role': 'user', 'content': format_messages(history, use_system_prompt= True)}]
+            logger.info(f"##### Answer from the LLM {answer}")
+            self.__convert_to_request_log(message=format_messages(prompt, use_system_prompt= True), meta_info= meta_info, component="llm", direction="request", model=self.check_for_completion_llm)
+            self.__convert_to_request_log(message=answer, meta_info= meta_info, component="llm", direction="response", model= self.check_for_completion_llm)
+
+            if should_hangup:
+                # Let the goodbye play out before hanging up
+                await self.__wait_for_response_to_be_transmitted(meta_info["sequence_id"])
+                await self.__process_end_of_conversation()
+        except asyncio.CancelledError:
+            logger.info("User spoke while checking for completion and hence cancelled the check")
+        except Exception as e:
+            traceback.print_exc()
+            logger.error(f"Error while checking for completion {e}")
+
+    async def __wait_for_response_to_be_transmitted(self, sequence_id, timeout=10):
+        start_time = time.time()
+        while sequence_id not in self.transmitted_sequence_ids and time.time() - start_time < timeout:
+            await asyncio.sleep(0.1)
+
+    async def __replay_cached_response(self, cached_response):
+        for text_chunk, end_of_llm_stream in cached_response:
+            yield text_chunk, end_of_llm_stream
+            # Hand over one segment at a time so that the synthesizer gets them like a streamed response
+            await asyncio.sleep(0)
+
+    async def __play_filler_after_threshold(self, meta_info):
+        await asyncio.sleep(self.filler_threshold)
+        if self.conversation_ended or meta_info["sequence_id"] not in self.sequence_ids:
+            return
+        filler = self.filler_audio[self.fillers_played % len(self.filler_audio)]
+        self.fillers_played += 1
+        logger.info(f"No LLM token in {self.filler_threshold} seconds and hence playing a filler")
+        filler_meta_info = copy.deepcopy(meta_info)
+        filler_meta_info["type"] = "audio"
+        filler_meta_info["format"] = "pcm"
+        filler_meta_info["is_filler"] = True
+        # Same sequence id as the response so that an interruption discards the filler as well
+        for chunk in yield_chunks_from_memory(filler, chunk_size=self.output_chunk_size):
+            self.buffered_output_queue.put_nowait(create_ws_data_packet(chunk, filler_meta_info))
 
-            self.llm_processed_request_ids.add(self.current_request_id)
-            llm_response = ""
-    
     async def _listen_llm_input_queue(self):
         logger.info(
             f"Starting listening to LLM queue as either Connected to dashboard = {self.connected_through_dashboard} or  it's a textual chat agent {self.textual_chat_agent}")
         while True:
             try:
                 ws_data_packet = await self.queues["llm"].get()
-                logger.info(f"ws_data_packet {ws_data_packet}")
+                logger.info(lambda: f"LLM input {ws_data_packet['data']} for sequence {ws_data_packet['meta_info'].get('sequence_id')}")
                 meta_info = self.__get_updated_meta_info(ws_data_packet['meta_info'])
                 bos_packet = create_ws_data_packet("<beginning_of_stream>", meta_info)
                 await self.tools["output"].handle(bos_packet)
@@ -677,7 +892,7 @@ class TaskManager(BaseManager):
 
     async def _run_llm_task(self, message):
         sequence, meta_info = self._extract_sequence_and_meta(message)
-        logger.info(f"After adding {self.curr_sequence_id} into sequence id {self.sequence_ids} for message {message}")
+        logger.hot("run_llm_task", lambda: f"After adding {self.curr_sequence_id} into sequence id {self.sequence_ids} for message {message}")
 
         try:
             if self._is_extraction_task() or self._is_summarization_task():
@@ -742,7 +957,7 @@ class TaskManager(BaseManager):
         try:
             while True:
                 message = await self.transcriber_output_queue.get()
-                logger.info(f"##### Message from the transcriber class {message}")
+                logger.hot("transcriber_message", lambda: f"##### Message from the transcriber class {message}")
                 if message["data"].strip() == "":
                     continue
                 if message['data'] == "transcriber_connection_closed":
@@ -897,110 +1112,120 @@ class TaskManager(BaseManager):
     # Synthesizer task
     #################################################################
     def __enqueue_chunk(self, chunk, i, number_of_chunks, meta_info):
-        logger.info(f"Meta_info of chunk {meta_info} {i} {number_of_chunks}")
+        logger.hot("enqueue_chunk", lambda: f"Meta_info of chunk {meta_info} {i} {number_of_chunks}")
+        copied_meta_info = meta_info
+        # A streamed frame can be both the first and the final chunk of a response
         if i == 0 and "is_first_chunk" in meta_info and meta_info["is_first_chunk"]:
-            copied_meta_info = copy.deepcopy(meta_info)
+            copied_meta_info = meta_info.copy()
             logger.info(f"##### Sending first chunk")
             copied_meta_info["is_first_chunk_of_entire_response"] = True
-            self.buffered_output_queue.put_nowait(create_ws_data_packet(chunk, copied_meta_info))
-        elif i == number_of_chunks and "end_of_synthesizer_stream" in meta_info and meta_info['end_of_synthesizer_stream']:
+        if i == number_of_chunks - 1 and "end_of_synthesizer_stream" in meta_info and meta_info['end_of_synthesizer_stream']:
             logger.info(f"##### Truly a final chunk")
-            copied_meta_info = meta_info.copy()
+            copied_meta_info = copied_meta_info.copy()
             copied_meta_info["is_final_chunk_of_entire_response"] = True
-            self.buffered_output_queue.put_nowait(create_ws_data_packet(chunk, copied_meta_info))
-        else:
-            self.buffered_output_queue.put_nowait(create_ws_data_packet(chunk, meta_info))
+        self.buffered_output_queue.put_nowait(create_ws_data_packet(chunk, copied_meta_info))
 
-    async def __listen_synthesizer(self):
+    async def __listen_synthesizer(self, synthesizer_name="synthesizer"):
+        synthesizer_provider = self.synthesizer_provider if synthesizer_name == "synthesizer" else self.backup_synthesizer_provider
+        synthesizer_role = "primary" if synthesizer_name == "synthesizer" else "backup"
         try:
-            if self.stream and self.synthesizer_provider != "polly" and not self.is_an_ivr_call: 
+            if self.stream and synthesizer_provider != "polly" and not self.is_an_ivr_call: 
                 logger.info("Opening websocket connection to synthesizer")
-                await self.tools["synthesizer"].open_connection()
+                await self.tools[synthesizer_name].open_connection()
             while True:
                 logger.info("Listening to synthesizer")
-                async for message in self.tools["synthesizer"].generate():
-                    meta_info = message["meta_info"]
-                    if not self.conversation_ended and message["meta_info"]["sequence_id"] in self.sequence_ids:
-                        logger.info(f"{message['meta_info']['sequence_id'] } is in sequence ids  {self.sequence_ids} and hence removing the sequence ids ")
-                        if self.stream:   
-                            if self.synthesizer_provider == "polly":
-                                if message['meta_info']['is_first_chunk']:
-                                    first_chunk_generation_timestamp = time.time()
-                                    meta_info["synthesizer_first_chunk_latency"] = first_chunk_generation_timestamp - message['meta_info']['synthesizer_start_time']
-                                logger.info(f"Simply Storing in buffered output queue for now")
-
-                                if self.yield_chunks:
-                                    logger.info(f"Yielding chunks")
-                                    number_of_chunks = (len(message['data'])//self.output_chunk_size)
-                                    i = 0
-                                    for chunk in yield_chunks_from_memory(message['data'], chunk_size=self.output_chunk_size):
-                                        self.__enqueue_chunk(chunk, i, number_of_chunks, meta_info)
-                                        i +=1
-                                else:
-                                    self.buffered_output_queue.put_nowait(message)
-                                
-                            else:
-                                if self.task_config["tools_config"]["output"]["provider"] in SUPPORTED_INPUT_TELEPHONY_HANDLERS.keys() and not self.connected_through_dashboard and self.synthesizer_provider == "elevenlabs":
-                                    if meta_info.get('format', '') != 'mulaw':
-                                        message['data'] = wav_bytes_to_pcm(message['data'])
-                                
-                                if "is_first_chunk" in message['meta_info'] and message['meta_info']['is_first_chunk']:
-                                    first_chunk_generation_timestamp = time.time()
-                                    meta_info["synthesizer_first_chunk_latency"] = first_chunk_generation_timestamp - message['meta_info']['synthesizer_start_time']
-                                    #self.latency_dict[message['meta_info']["request_id"]]['synthesizer'] = {"first_chunk_generation_latency": first_chunk_generation_timestamp - message['meta_info']['synthesizer_start_time'], "first_chunk_generation_timestamp": first_chunk_generation_timestamp}
-                                
-                                if self.yield_chunks:
-                                    number_of_chunks = (len(message['data'])/self.output_chunk_size)
-                                    i = 0
-                                    for chunk in yield_chunks_from_memory(message['data'], chunk_size=self.output_chunk_size):
-                                        i+=1
-                                        self.__enqueue_chunk(chunk, i, number_of_chunks, meta_info)
-                                else:
-                                    self.buffered_output_queue.put_nowait(message)
-                            
-                        else:
-                            logger.info("Stream is not enabled and hence sending entire audio")
-                            first_chunk_generation_timestamp = time.time()
-                            self.latency_dict[message['meta_info']["request_id"]]['synthesizer'] = {"first_chunk_generation_latency": first_chunk_generation_timestamp - message['meta_info']['synthesizer_start_time'], "first_chunk_generation_timestamp": first_chunk_generation_timestamp}
-                            #self.history = copy.deepcopy(self.interim_history)
-                            logger.info(f"Changing history")
-                            await self.tools["output"].handle(message)
+                async for message in self.tools[synthesizer_name].generate():
+                    if self.synthesizer_router is None:
+                        await self.__handle_synthesizer_packet(message, synthesizer_provider)
                     else:
-                        logger.info(f"{message['meta_info']['sequence_id']} is not in sequence ids  {self.sequence_ids} and hence not sending to output")                
-                    logger.info(f"Sleeping for 100 ms")
-                    await asyncio.sleep(0.3) #Sleeping for 100ms after receiving every chunk so other tasks can execute
+                        # The router holds back or drops audio which would play out of order or lost the race
+                        for packet_role, packet in self.synthesizer_router.route(synthesizer_role, message):
+                            await self.__handle_synthesizer_packet(packet, self.__get_synthesizer_provider(packet_role))
+                    # Yield to other tasks without delaying audio which is streaming in frame by frame
+                    await asyncio.sleep(0)
 
         except Exception as e:
             traceback.print_exc()
             logger.error(f"Error in synthesizer {e}")
 
+    def __get_synthesizer_provider(self, synthesizer_role):
+        return self.synthesizer_provider if synthesizer_role == "primary" else self.backup_synthesizer_provider
+
+    async def __handle_synthesizer_packet(self, message, synthesizer_provider):
+        meta_info = message["meta_info"]
+        if not self.conversation_ended and message["meta_info"]["sequence_id"] in self.sequence_ids:
+            logger.hot("synthesizer_packet", lambda: f"{message['meta_info']['sequence_id'] } is in sequence ids  {self.sequence_ids} and hence removing the sequence ids ")
+            if self.stream:   
+                if synthesizer_provider == "polly":
+                    if message['meta_info']['is_first_chunk']:
+                        first_chunk_generation_timestamp = time.time()
+                        meta_info["synthesizer_first_chunk_latency"] = first_chunk_generation_timestamp - message['meta_info']['synthesizer_start_time']
+                    if self.yield_chunks:
+                        number_of_chunks = math.ceil(len(message['data']) / self.output_chunk_size)
+                        for i, chunk in enumerate(yield_chunks_from_memory(message['data'], chunk_size=self.output_chunk_size)):
+                            self.__enqueue_chunk(chunk, i, number_of_chunks, meta_info)
+                    else:
+                        self.buffered_output_queue.put_nowait(message)
+                    
+                else:
+                    if self.task_config["tools_config"]["output"]["provider"] in SUPPORTED_INPUT_TELEPHONY_HANDLERS.keys() and not self.connected_through_dashboard and synthesizer_provider == "elevenlabs":
+                        if meta_info.get('format', '') != 'mulaw':
+                            message['data'] = wav_bytes_to_pcm(message['data'])
+                    
+                    if "is_first_chunk" in message['meta_info'] and message['meta_info']['is_first_chunk']:
+                        first_chunk_generation_timestamp = time.time()
+                        meta_info["synthesizer_first_chunk_latency"] = first_chunk_generation_timestamp - message['meta_info']['synthesizer_start_time']
+                        #self.latency_dict[message['meta_info']["request_id"]]['synthesizer'] = {"first_chunk_generation_latency": first_chunk_generation_timestamp - message['meta_info']['synthesizer_start_time'], "first_chunk_generation_timestamp": first_chunk_generation_timestamp}
+                    
+                    if self.yield_chunks:
+                        number_of_chunks = math.ceil(len(message['data']) / self.output_chunk_size)
+                        for i, chunk in enumerate(yield_chunks_from_memory(message['data'], chunk_size=self.output_chunk_size)):
+                            self.__enqueue_chunk(chunk, i, number_of_chunks, meta_info)
+                    else:
+                        self.buffered_output_queue.put_nowait(message)
+                
+            else:
+                logger.info("Stream is not enabled and hence sending entire audio")
+                first_chunk_generation_timestamp = time.time()
+                self.latency_dict[message['meta_info']["request_id"]]['synthesizer'] = {"first_chunk_generation_latency": first_chunk_generation_timestamp - message['meta_info']['synthesizer_start_time'], "first_chunk_generation_timestamp": first_chunk_generation_timestamp}
+                #self.history = copy.deepcopy(self.interim_history)
+                logger.info(f"Changing history")
+                await self.tools["output"].handle(message)
+        else:
+            logger.info(f"{message['meta_info']['sequence_id']} is not in sequence ids  {self.sequence_ids} and hence not sending to output")
+
+    def __get_preprocessed_audio_format(self):
+        """Format and chunk size in which preprocessed audio is sent, and hence cached"""
+        if self.connected_through_dashboard or self.task_config['tools_config']['output'] == "default":
+            return self.task_config["tools_config"]["output"]["format"], None
+        return 'pcm', (16384 if self.yield_chunks else None)
+
+    async def __preload_preprocessed_audio(self):
+        try:
+            audio_format, chunk_size = self.__get_preprocessed_audio_format()
+            await self.audio_asset_cache.preload(self.assistant_name, self.assistant_id, self.tools["llm_agent"].graph.audio_hashes,
+                                                 audio_format, chunk_size=chunk_size, local=self.is_local)
+        except Exception as e:
+            logger.error(f"Could not preload preprocessed audio {e}")
+
     async def __send_preprocessed_audio(self, meta_info, text):
-        #TODO: Either load IVR audio into memory before call or user s3 iter_cunks
-        # This will help with interruption in IVR
+        audio_format, chunk_size = self.__get_preprocessed_audio_format()
+        audio_chunks = await self.audio_asset_cache.get(self.assistant_name, self.assistant_id, text, audio_format,
+                                                        chunk_size=chunk_size, local=self.is_local)
+        if audio_chunks is None:
+            logger.error(f"Preprocessed audio {text} not found")
+            return
+
         if self.connected_through_dashboard or self.task_config['tools_config']['output'] == "default":
-            audio_chunk = await get_raw_audio_bytes_from_base64(self.assistant_name, text,
-                                                            self.task_config["tools_config"]["output"][
-                                                                "format"], local=self.is_local,
-                                                            assistant_id=self.assistant_id)
             logger.info("Sending preprocessed audio")
-            await self.tools["output"].handle(create_ws_data_packet(audio_chunk, meta_info))
+            await self.tools["output"].handle(create_ws_data_packet(audio_chunks[0], meta_info))
         else:
-            audio_chunk = await get_raw_audio_bytes_from_base64(self.assistant_name, text,
-                                                            'pcm', local=self.is_local,
-                                                            assistant_id=self.assistant_id)
-
             if not self.buffered_output_queue.empty():
                 logger.info(f"Output queue was not empty and hence emptying it")
                 self.buffered_output_queue = asyncio.Queue()
 
-            if self.yield_chunks:
-                for chunk in yield_chunks_from_memory(audio_chunk, chunk_size=16384):
-                    logger.debug("Sending chunk to output queue")
-                    message = create_ws_data_packet(chunk, meta_info)
-                    self.buffered_output_queue.put_nowait(message)
-            else:
-                message = create_ws_data_packet(audio_chunk, meta_info)
-                self.buffered_output_queue.put_nowait(message)
+            for chunk in audio_chunks:
+                self.buffered_output_queue.put_nowait(create_ws_data_packet(chunk, meta_info))
 
     async def _synthesize(self, message):
         meta_info = message["meta_info"]
@@ -1017,9 +1242,15 @@ class TaskManager(BaseManager):
                     # self.sequence_ids.add(meta_info["sequence_id"])
                     # logger.info(f"After adding into sequence id {self.sequence_ids}")
                     self.__convert_to_request_log(message = text, meta_info= meta_info, component="synthesizer", direction="request", model = self.synthesizer_provider)
-                    logger.info('##### sending text to {} for generation: {} '.format(self.synthesizer_provider, text))
+                    logger.hot("synthesize", "##### sending text to %s for generation: %s ", self.synthesizer_provider, text)
                     self.synthesizer_characters += len(text)
-                    await self.tools["synthesizer"].push(message)
+                    if self.synthesizer_router is not None:
+                        self.synthesizer_router.register_request(meta_info)
+                        backup_message = copy.deepcopy(message)
+                        await self.tools["synthesizer"].push(message)
+                        self.synthesizer_tasks.append(asyncio.create_task(self.__hedge_synthesizer_request(backup_message)))
+                    else:
+                        await self.tools["synthesizer"].push(message)
                 else:
                     logger.info("other synthesizer models not supported yet")
             else:
@@ -1029,6 +1260,32 @@ class TaskManager(BaseManager):
             traceback.print_exc()
             logger.error(f"Error in synthesizer: {e}")
 
+    async def __hedge_synthesizer_request(self, message):
+        request_id = message["meta_info"]["synthesizer_request_id"]
+        sequence_id = message["meta_info"]["sequence_id"]
+        # Only the request the primary is working on is timed, the ones queued behind it wait for their turn
+        while sequence_id in self.sequence_ids and not self.conversation_ended:
+            delay = self.synthesizer_router.get_hedge_delay(request_id)
+            if delay is None:
+                return
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            logger.info(f"{self.synthesizer_provider} missed the first byte deadline and hence hedging the request to {self.backup_synthesizer_provider}")
+            self.synthesizer_router.mark_hedged(request_id)
+            self.synthesizer_characters += len(message["data"])
+            await self.tools["backup_synthesizer"].push(message)
+            break
+
+        # The backup's audio is held until the primary is done with the audio before it, or stalls on it
+        while sequence_id in self.sequence_ids and not self.conversation_ended:
+            held_packets = self.synthesizer_router.release_if_stalled(request_id)
+            if held_packets is None:
+                return
+            for packet_role, packet in held_packets:
+                await self.__handle_synthesizer_packet(packet, self.__get_synthesizer_provider(packet_role))
+            await asyncio.sleep(self.synthesizer_router.poll_interval)
+
     ############################################################
     # Output handling
     ############################################################
@@ -1060,37 +1317,38 @@ class TaskManager(BaseManager):
                 if self.nitro and not self.let_remaining_audio_pass_through:
                     time_since_first_interim_result = (time.time() *1000)- self.time_since_first_interim_result if self.time_since_first_interim_result != -1 else -1
                     if  time_since_first_interim_result != -1 and time_since_first_interim_result < self.required_delay_before_speaking:
-                        logger.info(f"##### It's been {time_since_first_interim_result} ms since first  interim result and required time to wait for it is {self.required_delay_before_speaking}. Hence sleeping for 100ms. self.time_since_first_interim_result {self.time_since_first_interim_result}")
+                        logger.hot("wait_for_interim", lambda: f"##### It's been {time_since_first_interim_result} ms since first  interim result and required time to wait for it is {self.required_delay_before_speaking}. Hence sleeping for 100ms. self.time_since_first_interim_result {self.time_since_first_interim_result}")
                         await asyncio.sleep(0.1) #sleep for 100ms and continue 
                         continue
                     else:
-                        logger.info(f"First interim result hasn't been gotten yet and hence sleeping ")
+                        logger.hot("wait_for_first_interim", "First interim result hasn't been gotten yet and hence sleeping")
                         await asyncio.sleep(0.1)
 
-                    logger.info(f"##### Got to wait {self.required_delay_before_speaking} ms before speaking and alreasy waited {time_since_first_interim_result} since the first interim result")
+                    logger.hot("waited_for_interim", lambda: f"##### Got to wait {self.required_delay_before_speaking} ms before speaking and alreasy waited {time_since_first_interim_result} since the first interim result")
                 
                 if prev_message is None:
                     message = await self.buffered_output_queue.get()   
                     current_message = message 
                 else:
-                    logger.info(f'prev message is not none and hence getting prev message')
+                    logger.hot("prev_message", 'prev message is not none and hence getting prev message')
                     message = prev_message
                     prev_message = None
-                logger.info("##### Start response is True and hence starting to speak {} Current sequence ids".format(message['meta_info'], self.sequence_ids))
+                logger.hot("output_packet", lambda: f"##### Start response is True and hence starting to speak {message['meta_info']} Current sequence ids {self.sequence_ids}")
                 if "end_of_conversation" in message['meta_info']:
                     await self.__process_end_of_conversation()
                 
                 if 'sequence_id' in message['meta_info'] and message["meta_info"]["sequence_id"] in self.sequence_ids:
                     await self.tools["output"].handle(message)                    
                     duration = calculate_audio_duration(len(message["data"]), self.sampling_rate)
-                    logger.info(f"Duration of the byte {duration}")
+                    logger.hot("output_duration", "Duration of the byte %s", duration)
                     self.conversation_recording['output'].append({'data': message['data'], "start_time": time.time(), "duration": duration})
                 else:
-                    logger.info(f'{message["meta_info"]["sequence_id"]} is not in {self.sequence_ids} and hence not speaking')
+                    logger.hot("output_dropped", lambda: f'{message["meta_info"]["sequence_id"]} is not in {self.sequence_ids} and hence not speaking')
                     continue
                 
                 if "is_final_chunk_of_entire_response" in message['meta_info'] and message['meta_info']['is_final_chunk_of_entire_response']:
                     self.started_transmitting_audio = False
+                    self.transmitted_sequence_ids.add(message['meta_info']['sequence_id'])
                     logger.info("##### End of synthesizer stream and ")                    
 
                 if "is_first_chunk_of_entire_response" in message['meta_info'] and message['meta_info']['is_first_chunk_of_entire_response']:
@@ -1124,20 +1382,34 @@ class TaskManager(BaseManager):
 
                     if message['meta_info']["request_id"] not in self.latency_dict:
                         self.latency_dict[message['meta_info']["request_id"]] = latency_metrics
-                        logger.info("LATENCY METRICS FOR {} are {}".format(message['meta_info']["request_id"], latency_metrics))
+                        logger.summary("turn_latency", request_id=message['meta_info']["request_id"], sequence_id=meta_info.get("sequence_id"),
+                                       transcriber=transcriber_latency, llm_first_buffer=first_llm_buffer_latency,
+                                       synthesizer_first_chunk=synthesizer_first_chunk_latency, overall_first_byte=overall_first_byte_latency)
                 
-                # Sleep until this particular audio frame is spoken only if the duration for the frame is atleast 500ms
-                if duration > 0:
-                    logger.info(f"##### Sleeping for {duration} to maintain quueue on our side {self.sampling_rate}")
+                # Sleep until this particular audio frame is spoken, telephony handlers pace themselves on mark acks instead
+                if duration > 0 and not self.tools["output"].flow_controlled:
+                    logger.hot("output_sleep", "##### Sleeping for %s to maintain quueue on our side %s", duration, self.sampling_rate)
                     await asyncio.sleep(duration) #30 milliseconds less
                     
-                self.last_transmitted_timesatamp = time.time()
-                logger.info(f"##### Updating Last transmitted timestamp to {self.last_transmitted_timesatamp}")
+                if self.tools["output"].flow_controlled:
+                    # Sent isn't spoken yet, stamp once the provider has played everything marked so far
+                    if self.playback_stamp_task is None or self.playback_stamp_task.done():
+                        self.playback_stamp_task = asyncio.create_task(self.__stamp_when_played())
+                else:
+                    self.last_transmitted_timesatamp = time.time()
+                    logger.hot("last_transmitted", "##### Updating Last transmitted timestamp to %s", self.last_transmitted_timesatamp)
                 
         except Exception as e:
             traceback.print_exc()
             logger.error(f'Error in processing message output')
 
+    async def __stamp_when_played(self):
+        # Waits on the acks of marks already sent by the output handler, sending marks of our own would defeat their batching
+        output_handler = self.tools["output"]
+        await self.mark_set.wait_until_played(output_handler.get_buffered_duration() + output_handler.ack_timeout)
+        self.last_transmitted_timesatamp = time.time()
+        logger.hot("last_transmitted", "##### Updating Last transmitted timestamp to %s", self.last_transmitted_timesatamp)
+
     async def __check_for_completion(self):
         while True:
             await asyncio.sleep(2)
@@ -1175,6 +1447,8 @@ class TaskManager(BaseManager):
                     logger.info("Starting synthesizer task")
                     try:
                         self.synthesizer_task = asyncio.create_task(self.__listen_synthesizer())
+                        if "backup_synthesizer" in self.tools:
+                            self.backup_synthesizer_task = asyncio.create_task(self.__listen_synthesizer("backup_synthesizer"))
                     except asyncio.CancelledError as e:
                         logger.error(f'Synth task got cancelled {e}')
                         traceback.print_exc()
@@ -1218,15 +1492,55 @@ class TaskManager(BaseManager):
             # Construct output
             if "synthesizer" in self.tools and self.synthesizer_task is not None:   
                 self.synthesizer_task.cancel()
+            if self.backup_synthesizer_task is not None:
+                self.backup_synthesizer_task.cancel()
+            if self.context_window_manager is not None:
+                self.context_window_manager.cancel()
+            if self.completion_check_task is not None:
+                self.completion_check_task.cancel()
             if self._is_conversation_task() and self.use_llm_to_determine_hangup is False:
                 self.hangup_task.cancel()
+
+            # Make sure the call's request logs are on disk before handing over the output
+            await self.request_log_sink.flush(self.run_id)
+            if self.audio_preload_task is not None:
+                self.audio_preload_task.cancel()
+            if self.playback_stamp_task is not None:
+                self.playback_stamp_task.cancel()
+            logging_stats = {key: round(value - self.logging_stats_at_start[key], 4) for key, value in get_logging_stats().items()}
+            logger.summary("task_ended", run_id=self.run_id, task_id=self.task_id, duration=round(time.time() - self.start_time, 2),
+                           **{f"logging_{key}": value for key, value in logging_stats.items()})
             
             if self.task_id == 0:
                 output = {"messages": self.history, "conversation_time": time.time() - self.start_time,
                           "label_flow": self.label_flow, "call_sid": self.call_sid, "stream_sid": self.stream_sid,
                           "transcriber_duration": self.transcriber_duration,
                           "synthesizer_characters": self.synthesizer_characters, "ended_by_assistant": self.ended_by_assistant,
-                          "latency_dict": self.latency_dict}
+                          "latency_dict": self.latency_dict, "llm_token_usage": self.usage_ledger.get_usage()}
+
+                if self.response_cache is not None:
+                    output["response_cache_stats"] = self.response_cache.get_stats(self.assistant_id)
+
+                if self.semantic_cache is not None:
+                    output["semantic_cache_stats"] = self.semantic_cache.get_stats()
+
+                if self.use_fillers:
+                    output["fillers_played"] = self.fillers_played
+
+                if self.mark_set.stats["marks_sent"] > 0:
+                    output["playback_stats"] = self.mark_set.get_stats()
+
+                if self.audio_preload_task is not None:
+                    output["audio_asset_cache_stats"] = self.audio_asset_cache.get_stats()
+
+                if self.synthesizer_router is not None:
+                    output["synthesizer_router_stats"] = self.synthesizer_router.get_stats()
+
+                if self.llm_router is not None:
+                    output["llm_router_stats"] = self.llm_router.get_stats()
+
+                if isinstance(self.tools.get("llm_agent"), GraphBasedConversationAgent) and self.tools["llm_agent"].local_classifier:
+                    output["classifier_stats"] = self.tools["llm_agent"].get_classifier_stats()
 
                 if self.should_record:
                     output['recording_url'] = await save_audio_file_to_s3(self.conversation_recording, self.sampling_rate, self.assistant_id, self.run_id)
@@ -1240,6 +1554,8 @@ class TaskManager(BaseManager):
                     output = {"summary" : self.summarized_data, "task_type": "summarization"}
                 elif self.task_config["task_type"] == "webhook":
                     output = {"status": self.webhook_response, "task_type": "webhook"}
+                if self.task_config["task_type"] in ("extraction", "summarization"):
+                    output["llm_token_usage"] = self.usage_ledger.get_usage()
             return output
 
     def handle_cancellation(self, message):
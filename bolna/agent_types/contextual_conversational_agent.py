@@ -1,8 +1,7 @@
-import json
 import os
 from dotenv import load_dotenv
 from .base_agent import BaseAgent
-from bolna.helpers.utils import format_messages
+from bolna.helpers.utils import format_messages, get_conversation_fingerprint, get_md5_hash
 from bolna.llms import OpenAiLLM
 from bolna.prompts import CHECK_FOR_COMPLETION_PROMPT
 from bolna.helpers.logger_config import configure_logger
@@ -12,20 +11,28 @@ logger = configure_logger(__name__)
 
 
 class StreamingContextualAgent(BaseAgent):
-    def __init__(self, llm):
+    def __init__(self, llm, completion_check_model=None):
         super().__init__()
         self.llm = llm
-        self.conversation_completion_llm = OpenAiLLM(classification_model=os.getenv('CHECK_FOR_COMPLETION_LLM', llm.classification_model))
+        # A smaller model is good enough to answer yes or no
+        completion_check_model = completion_check_model or os.getenv('CHECK_FOR_COMPLETION_LLM', llm.classification_model)
+        self.conversation_completion_llm = OpenAiLLM(classification_model=completion_check_model)
         self.history = [{'content': ""}]
+        self.completion_check_cache = {}
 
     async def check_for_completion(self, messages, check_for_completion_prompt = CHECK_FOR_COMPLETION_PROMPT):
+        check_for_completion_prompt = check_for_completion_prompt or CHECK_FOR_COMPLETION_PROMPT
+        cache_key = get_md5_hash(check_for_completion_prompt + get_conversation_fingerprint(messages, last_n_turns=len(messages)))
+        if cache_key in self.completion_check_cache:
+            logger.info("Already checked for completion in this conversation state")
+            return self.completion_check_cache[cache_key]
+
         prompt = [
             {'role': 'system', 'content': check_for_completion_prompt},
             {'role': 'user', 'content': format_messages(messages, use_system_prompt=True)}]
 
-        answer = None
-        response = await self.conversation_completion_llm.generate(prompt, True, False, request_json=True)
-        answer = json.loads(response)
+        answer = await self.conversation_completion_llm.generate_keys(prompt, keys=["answer"])
+        self.completion_check_cache[cache_key] = answer
 
         logger.info('Agent: {}'.format(answer['answer']))
         return answer
@@ -14,5 +14,6 @@ class ExtractionContextualAgent(BaseAgent):
 
     async def generate(self, history, stream=True, synthesize=False):
         logger.info("extracting json from the previous conversation data")
-        json_data = await self.llm.generate(history, stream=False, synthesize=False, request_json=True)
+        # Returns the parsed object as soon as it closes, ignoring anything the model adds after it
+        json_data = await self.llm.generate_keys(history, classification_task=False)
         return json_data
@@ -1,51 +1,80 @@
-import random
+import os
 import json
+import random
 import asyncio
 import traceback
+from collections import OrderedDict
+from types import MappingProxyType
 from .base_agent import BaseAgent
 from bolna.helpers.logger_config import configure_logger
 from bolna.helpers.utils import update_prompt_with_context, get_md5_hash
+from bolna.helpers.context_window_manager import ContextWindowManager
+from bolna.helpers.intent_classifier import IntentClassifier
 
 logger = configure_logger(__name__)
 
+MAX_COMPILED_GRAPHS = int(os.getenv("MAX_COMPILED_GRAPHS", 64))
+
 
 class Node:
-    def __init__(self, node_id, node_label, content, classification_labels: list = None, prompt=None, milestone_check_prompt=None,
-                 children: list = None):
-        self.node_id = node_id
-        self.node_label = node_label
-        self.content = content
-        self.children = children
-        self.classification_labels = classification_labels
-        self.prompt = prompt
-        self.need_response_generation = False
-        self.milestone_check_prompt = milestone_check_prompt
+    """
+    Node of a compiled graph. Nodes are shared by every call of the agent and hence can't be modified, per call state
+    like the current node or prompts rendered with the call's context lives in the agent.
+    """
+    __slots__ = ("node_id", "node_label", "content", "children", "classification_labels", "prompt", "classification_prompt",
+                 "examples_prompt", "need_response_generation", "milestone_check_prompt")
+
+    def __init__(self, node_id, node_label, content, classification_labels: list = None, prompt=None, milestone_check_prompt=None):
+        prompt_parts = prompt.split('###Examples') if prompt is not None else []
+        values = {
+            "node_id": node_id,
+            "node_label": node_label,
+            "content": tuple(MappingProxyType(dict(audio_pair)) for audio_pair in content),
+            "children": (),
+            "classification_labels": tuple(classification_labels or []),
+            "prompt": prompt,
+            # Only the examples are templated with the call's context
+            "classification_prompt": prompt_parts[0] if len(prompt_parts) == 2 else None,
+            "examples_prompt": prompt_parts[1] if len(prompt_parts) == 2 else None,
+            "need_response_generation": False,
+            "milestone_check_prompt": milestone_check_prompt,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Node {self.node_id} is shared across calls and can't be modified")
+
+    def _link(self, children):
+        object.__setattr__(self, "children", tuple(children))
+
+    def render_prompt(self, context_data=None):
+        if self.examples_prompt is None:
+            return self.prompt
+        return '###Examples'.join([self.classification_prompt, update_prompt_with_context(self.examples_prompt, context_data)])
 
 
 class Graph:
-    def __init__(self, conversation_data, preprocessed=False, context_data=None):
-        self.preprocessed = preprocessed
+    """Compiled once per agent version and shared by all of its calls, use get_compiled_graph to get one"""
+    def __init__(self, conversation_data, version=None):
+        self.version = version
         self.root = None
-        self.graph = self._create_graph(conversation_data, context_data)
+        self.graph = self._create_graph(conversation_data)
+        self.__classifiers = {}
+        # Templated texts are synthesized per call with the recipient's data, the rest is preprocessed audio
+        self.audio_hashes = tuple(dict.fromkeys(audio_pair['audio'] for node in self.graph.values()
+                                                for audio_pair in node.content if '{' not in audio_pair['text']))
 
-    def _create_graph(self, data, context_data=None):
-        logger.info(f"Creating graph")
+    def _create_graph(self, data):
+        logger.info(f"Compiling graph {self.version}")
         node_map = dict()
         for node_id, node_data in data.items():
-            prompt_parts = node_data.get("prompt").split('###Examples')
-            prompt = node_data.get('prompt')
-            if len(prompt_parts) == 2:
-                classification_prompt = prompt_parts[0]
-                user_prompt = update_prompt_with_context(prompt_parts[1], context_data)
-                prompt = '###Examples'.join([classification_prompt, user_prompt])
-
             node = Node(
                 node_id=node_id,
                 node_label=node_data["label"],
                 content=node_data["content"],
                 classification_labels=node_data.get("classification_labels", []),
-                prompt=prompt,
-                children=[],
+                prompt=node_data.get("prompt"),
                 milestone_check_prompt=node_data.get("milestone_check_prompt", ""),
             )
             node_map[node_id] = node
@@ -54,38 +83,93 @@ class Graph:
 
         for node_id, node_data in data.items():
             children_ids = node_data.get("children", [])
-            node_map[node_id].children = [node_map[child_id] for child_id in children_ids] if children_ids else []
-        return node_map
+            node_map[node_id]._link(node_map[child_id] for child_id in children_ids or [])
+        return MappingProxyType(node_map)
+
+    def get_classifiers(self, threshold, margin):
+        """Local classifiers of every node which has examples, trained once per graph and threshold"""
+        if (threshold, margin) not in self.__classifiers:
+            classifiers = {}
+            for node_id, node in self.graph.items():
+                classifier = IntentClassifier.from_prompt(node.prompt, [child.node_label for child in node.children],
+                                                          threshold=threshold, margin=margin)
+                if classifier is not None:
+                    classifiers[node_id] = classifier
+            logger.info(f"Trained local classifiers for nodes {list(classifiers.keys())}")
+            self.__classifiers[(threshold, margin)] = classifiers
+        return self.__classifiers[(threshold, margin)]
+
+
+_compiled_graphs = OrderedDict()
+
 
-    # @TODO complete this function
-    def remove_node(self, parent, node):
-        print("Not yet implemented")
+def get_graph_version(conversation_data):
+    return get_md5_hash(json.dumps(conversation_data, sort_keys=True))
+
+
+def get_compiled_graph(conversation_data):
+    """Returns the compiled graph for this version of the agent's prompts, compiling it on first use"""
+    version = get_graph_version(conversation_data)
+    if version in _compiled_graphs:
+        _compiled_graphs.move_to_end(version)
+        return _compiled_graphs[version]
+
+    graph = Graph(conversation_data, version=version)
+    _compiled_graphs[version] = graph
+    while len(_compiled_graphs) > MAX_COMPILED_GRAPHS:
+        _compiled_graphs.popitem(last=False)
+    return graph
 
 
 class GraphBasedConversationAgent(BaseAgent):
-    def __init__(self, llm, prompts, context_data=None, preprocessed=True):
+    def __init__(self, llm, prompts, context_data=None, preprocessed=True, context_token_budget=None, local_classifier=False,
+                 classifier_threshold=0.5, classifier_margin=0.1, classifier_verify_rate=0.1):
         super().__init__()
         # Config
         self.llm = llm
         self.context_data = context_data
         self.preprocessed = preprocessed
+        # Classification prompts carry their own examples and hence the budget only needs to cover recent turns
+        self.context_window_manager = ContextWindowManager(token_budget=context_token_budget or 2000,
+                                                           min_messages_to_keep=2)
+
+        # Local classifiers answer confident transitions without an LLM call
+        self.local_classifier = local_classifier
+        self.classifier_threshold = classifier_threshold
+        self.classifier_margin = classifier_margin
+        # Fraction of local answers which are checked against the LLM in the background to measure accuracy
+        self.classifier_verify_rate = classifier_verify_rate
+        self.classifiers = {}
+        self.verification_tasks = set()
+        self.classifier_stats = {"local": 0, "llm_fallback": 0, "verified": 0, "verified_correct": 0,
+                                 "fallback_guesses": 0, "fallback_guesses_correct": 0}
 
-        # Goals
+        # Shared compiled graph, the current node and the prompts rendered with this call's context are all per call
         self.graph = None
+        self.current_node = None
+        self.current_node_interim = None
+        self.rendered_prompts = {}
         self.conversation_intro_done = False
 
-    def load_prompts_and_create_graph(self, prompts):
-        self.graph = Graph(prompts,  context_data=self.context_data)
+    def load_prompts_and_create_graph(self, prompts, graph=None):
+        self.graph = graph if graph is not None else get_compiled_graph(prompts)
         self.current_node = self.graph.root
         self.current_node_interim = self.graph.root #Handle interim node because we are dealing with interim results 
+        self.rendered_prompts = {}
+        if self.local_classifier:
+            self.classifiers = self.graph.get_classifiers(self.classifier_threshold, self.classifier_margin)
+
+    def _get_node_prompt(self, node):
+        if node.node_id not in self.rendered_prompts:
+            self.rendered_prompts[node.node_id] = node.render_prompt(self.context_data)
+        return self.rendered_prompts[node.node_id]
 
     def _get_audio_text_pair(self, node):
         ind = random.randint(0, len(node.content) - 1)
         audio_pair = node.content[ind]
         contextual_text = update_prompt_with_context(audio_pair['text'], self.context_data)
         if contextual_text != audio_pair['text']:
-            audio_pair['text'] = contextual_text
-            audio_pair['audio'] = get_md5_hash(contextual_text)
+            return {**audio_pair, 'text': contextual_text, 'audio': get_md5_hash(contextual_text)}
         return audio_pair
 
     async def _get_next_formulaic_agent_next_step(self, history, stream=True, synthesize=False):
@@ -107,23 +191,59 @@ class GraphBasedConversationAgent(BaseAgent):
             return self._handle_intro_message()
 
         logger.info(f"Conversation intro was done and hence moving forward")
-        if len(history) > 7:
-            # @TODO: Add summary of left out messages
-            prev_messages = history[-6:]
+        prev_messages = history[1:] if len(history) > 0 and history[0]["role"] == "system" else history
+        message, input_tokens = self.context_window_manager.fit([{"role": "system", "content": self._get_node_prompt(self.current_node)}] + prev_messages)
+
+        guess, confident = None, False
+        classifier = self.classifiers.get(self.current_node.node_id)
+        user_messages = [m["content"] for m in prev_messages if m["role"] == "user"]
+        if classifier is not None and len(user_messages) > 0:
+            guess, score, confident = classifier.predict(user_messages[-1])
+            logger.info(f"Local classification {guess} with score {score}, confident {confident}")
+
+        if confident:
+            label = guess
+            self.classifier_stats["local"] += 1
+            if random.random() < self.classifier_verify_rate:
+                task = asyncio.create_task(self.__verify_local_label(message, label))
+                self.verification_tasks.add(task)
+                task.add_done_callback(self.verification_tasks.discard)
         else:
-            prev_messages = history[1:]
-
-        message = [{"role": "system", "content": self.current_node.prompt}] + prev_messages
-        # Get classification label from LLM
-        response = await self.llm.generate(message, True, False, request_json=True)
-        logger.info(f"Classification response {response}")
-        classification_result = json.loads(response)
-        label = classification_result["classification_label"]
+            label = await self.__classify_with_llm(message, input_tokens)
+            if classifier is not None:
+                self.classifier_stats["llm_fallback"] += 1
+                if guess is not None:
+                    # How often the unconfident guess was right anyway, helps tuning the threshold
+                    self.classifier_stats["fallback_guesses"] += 1
+                    self.classifier_stats["fallback_guesses_correct"] += int(guess.strip().lower() == label.strip().lower())
+
         for child in self.current_node.children:
             if child.node_label.strip().lower() == label.strip().lower():
                 self.current_node_interim = child
                 return self._get_audio_text_pair(child)
 
+    async def __classify_with_llm(self, message, input_tokens):
+        logger.info(f"Classification request with {input_tokens} input tokens")
+        # Get classification label from LLM, the rest of the response isn't needed once the label is parsed
+        classification_result = await self.llm.generate_keys(message, keys=["classification_label"])
+        logger.info(f"Classification response {classification_result}")
+        return classification_result["classification_label"]
+
+    async def __verify_local_label(self, message, label):
+        try:
+            llm_label = await self.llm.generate_keys(message, keys=["classification_label"])
+            self.classifier_stats["verified"] += 1
+            self.classifier_stats["verified_correct"] += int(llm_label["classification_label"].strip().lower() == label.strip().lower())
+        except Exception as e:
+            logger.error(f"Could not verify local classification {e}")
+
+    def get_classifier_stats(self):
+        stats = dict(self.classifier_stats)
+        total = stats["local"] + stats["llm_fallback"]
+        stats["fallback_rate"] = round(stats["llm_fallback"] / total, 4) if total > 0 else 0
+        stats["accuracy"] = round(stats["verified_correct"] / stats["verified"], 4) if stats["verified"] > 0 else None
+        return stats
+
     def update_current_node(self):
         self.current_node = self.current_node_interim
         
@@ -132,8 +252,7 @@ class GraphBasedConversationAgent(BaseAgent):
             if self.preprocessed:
                 logger.info(f"Current node {str(self.current_node)}")
                 if len(self.current_node.children) == 0:
-                    ind = random.randint(0, len(self.current_node.content) - 1)
-                    audio_pair = self.current_node.content[ind]
+                    audio_pair = self._get_audio_text_pair(self.current_node)
                     logger.info('Agent: {}'.format(audio_pair.get('text')))
                     yield audio_pair
                 else:
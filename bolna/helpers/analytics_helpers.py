@@ -14,46 +14,54 @@ load_dotenv()
 logger = configure_logger(__name__)
 
 
+def calculate_total_cost_of_llm_from_token_usage(llm_token_usage, cost_per_input_token, cost_per_output_token, model_costs=None):
+    """
+    llm_token_usage is the per model usage recorded during the call, i.e. {model: {"input": tokens, "output": tokens}}.
+    model_costs can override the per token cost for specific models, e.g. the one used to check for completion.
+    """
+    model_costs = model_costs or {}
+    total_cost = 0
+    for model, usage in llm_token_usage.items():
+        input_cost = model_costs.get(model, {}).get("input", cost_per_input_token)
+        output_cost = model_costs.get(model, {}).get("output", cost_per_output_token)
+        total_cost += (usage.get("input", 0) * input_cost) + (usage.get("output", 0) * output_cost)
+    return round(total_cost, 5), llm_token_usage
+
+
 def calculate_total_cost_of_llm_from_transcript(messages, cost_per_input_token, cost_per_output_token, model="gpt-3.5-turbo", check_for_completion = False, ended_by_assistant = False, completion_input_token_cost = 0.000001, completion_output_token_cost = 0.000002):
-    total_input_tokens = 0
-    total_output_tokens = 0
-    completion_check_input_tokens = 0
-    completion_check_output_tokens = 0
+    """
+    Estimates the usage of a call from its transcript, for callers which don't have the usage recorded during the call.
+    Every message is tokenized once and the prompt of each assistant message is a running sum, so this is linear too.
+    """
     completion_model = os.getenv("CHECK_FOR_COMPLETION_LLM")
-    completion_wrong_answer_tokens = token_counter(model=model, text="{'answer': 'No'}") 
-    completion_right_answer_tokens = token_counter(model=model, text="{'answer': 'Yes'}")  
-    llm_token_usage = dict()
+    completion_wrong_answer_tokens = token_counter(model=model, text="{'answer': 'No'}")
+    completion_right_answer_tokens = token_counter(model=model, text="{'answer': 'Yes'}")
+    completion_prompt_tokens = token_counter(model=completion_model, messages=[{'role': 'system', 'content': CHECK_FOR_COMPLETION_PROMPT}])
+    llm_token_usage = {model: {"input": 0, "output": 0}}
+    completion_usage = {"input": 0, "output": 0}
+    prompt_tokens, transcript_tokens = 0, 0
     for i, message in enumerate(messages):
+        message_tokens = token_counter(model=model, messages=[message])
+        transcript_tokens += token_counter(model=completion_model, text=format_messages([message]))
         if message['role'] == 'assistant':
-            total_input_tokens += token_counter(model=model, messages=messages[:i])
-            total_output_tokens += token_counter(model=model, text=message['content'])
-
-            # Check for conversation completion
-            completion_check_prompt = [
-                {'role': 'system', 'content': CHECK_FOR_COMPLETION_PROMPT},
-                {'role': 'user', 'content': format_messages(messages[:i+1])} 
-            ]
-            completion_check_input_tokens += token_counter(model=completion_model, messages=completion_check_prompt) 
+            llm_token_usage[model]["input"] += prompt_tokens
+            llm_token_usage[model]["output"] += token_counter(model=model, text=message['content'])
+            completion_usage["input"] += completion_prompt_tokens + transcript_tokens
             if i == len(messages) - 1 and ended_by_assistant:
-                completion_check_output_tokens += completion_right_answer_tokens
+                completion_usage["output"] += completion_right_answer_tokens
             else:
-                completion_check_output_tokens += completion_wrong_answer_tokens
-
-    total_cost = (total_input_tokens * cost_per_input_token) + (total_output_tokens * cost_per_output_token)
-    llm_token_usage[model] = {
-        "input": total_input_tokens,
-        "output": total_output_tokens,
-    }
+                completion_usage["output"] += completion_wrong_answer_tokens
+        prompt_tokens += message_tokens
 
+    total_cost, _ = calculate_total_cost_of_llm_from_token_usage(llm_token_usage, cost_per_input_token, cost_per_output_token)
     if check_for_completion:
         if completion_model not in llm_token_usage:
             llm_token_usage[completion_model] = {"input": 0, "output": 0}
-        llm_token_usage[completion_model]["input"] += completion_check_input_tokens
-        llm_token_usage[completion_model]["output"] += completion_check_output_tokens
-        check_for_completion_cost = (completion_check_input_tokens * completion_input_token_cost) + (completion_check_output_tokens * completion_output_token_cost)
+        llm_token_usage[completion_model]["input"] += completion_usage["input"]
+        llm_token_usage[completion_model]["output"] += completion_usage["output"]
+        check_for_completion_cost = (completion_usage["input"] * completion_input_token_cost) + (completion_usage["output"] * completion_output_token_cost)
         logger.info(f"Cost to check completion = {check_for_completion_cost}")
         total_cost += check_for_completion_cost
-
     return round(total_cost, 5), llm_token_usage
 
 
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from bolna.helpers.logger_config import configure_logger
+from bolna.helpers.utils import get_raw_audio_bytes_from_base64, yield_chunks_from_memory, S3_AUDIO_CACHE_REVALIDATE_SECONDS
+
+logger = configure_logger(__name__)
+
+
+class AudioAssetCache:
+    """
+    Per process LRU of preprocessed audio, kept already split into output chunks so that an IVR turn only enqueues
+    buffers which are in memory. Concurrent loads of the same asset share a single fetch. Assets are loaded again
+    after max_age seconds as a voice change regenerates the audio under the same text hash.
+    """
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_concurrent_fetches=8, max_age=S3_AUDIO_CACHE_REVALIDATE_SECONDS):
+        self.max_bytes = max_bytes
+        self.max_concurrent_fetches = max_concurrent_fetches
+        self.max_age = max_age
+        # key -> (chunks, loaded_at), least recently used first
+        self.assets = OrderedDict()
+        self.size = 0
+        self.pending = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "failed_fetches": 0, "reloads": 0}
+
+    @staticmethod
+    def __get_key(assistant_id, assistant_name, audio_hash, audio_format, chunk_size):
+        return assistant_id or assistant_name, audio_hash, audio_format, chunk_size
+
+    def __store(self, key, chunks):
+        size = sum(len(chunk) for chunk in chunks)
+        if size > self.max_bytes:
+            return
+        self.__remove(key)
+        self.assets[key] = (chunks, time.time())
+        self.size += size
+        while self.size > self.max_bytes:
+            evicted_key = next(iter(self.assets))
+            self.__remove(evicted_key)
+            self.stats["evictions"] += 1
+
+    def __remove(self, key):
+        if key in self.assets:
+            chunks, _ = self.assets.pop(key)
+            self.size -= sum(len(chunk) for chunk in chunks)
+
+    async def __fetch(self, key, assistant_name, assistant_id, audio_hash, audio_format, chunk_size, local):
+        try:
+            audio = await get_raw_audio_bytes_from_base64(assistant_name, audio_hash, audio_format, local=local,
+                                                          assistant_id=assistant_id)
+        except Exception as e:
+            logger.error(f"Could not load preprocessed audio {audio_hash}.{audio_format}: {e}")
+            audio = None
+
+        if audio is None:
+            self.stats["failed_fetches"] += 1
+            return None
+        chunks = tuple(yield_chunks_from_memory(audio, chunk_size)) if chunk_size else (audio,)
+        self.__store(key, chunks)
+        return chunks
+
+    def __start_fetch(self, key, *fetch_args):
+        self.pending[key] = asyncio.ensure_future(self.__fetch(key, *fetch_args))
+        self.pending[key].add_done_callback(lambda _: self.pending.pop(key, None))
+
+    async def get(self, assistant_name, assistant_id, audio_hash, audio_format, chunk_size=None, local=False):
+        """Returns the audio as a tuple of chunks of chunk_size bytes (a single chunk if None), or None if it's missing"""
+        key = self.__get_key(assistant_id, assistant_name, audio_hash, audio_format, chunk_size)
+        if key in self.assets:
+            chunks, loaded_at = self.assets[key]
+            self.assets.move_to_end(key)
+            if time.time() - loaded_at < self.max_age:
+                self.stats["hits"] += 1
+                return chunks
+            # Served until the reload replaces it, a failed reload keeps serving it
+            if key in self.pending:
+                return chunks
+            self.stats["reloads"] += 1
+            self.__start_fetch(key, assistant_name, assistant_id, audio_hash, audio_format, chunk_size, local)
+            return chunks
+
+        self.stats["misses"] += 1
+        if key not in self.pending:
+            self.__start_fetch(key, assistant_name, assistant_id, audio_hash, audio_format, chunk_size, local)
+        # Shielded so that a turn cancelled by an interruption doesn't cancel the fetch other calls are waiting on
+        return await asyncio.shield(self.pending[key])
+
+    async def preload(self, assistant_name, assistant_id, audio_hashes, audio_format, chunk_size=None, local=False):
+        """Loads every asset which isn't cached yet, returns the number of assets available in memory"""
+        semaphore = asyncio.Semaphore(self.max_concurrent_fetches)
+
+        async def load(audio_hash):
+            async with semaphore:
+                return await self.get(assistant_name, assistant_id, audio_hash, audio_format, chunk_size, local)
+
+        results = await asyncio.gather(*[load(audio_hash) for audio_hash in set(audio_hashes)])
+        loaded = sum(1 for chunks in results if chunks is not None)
+        logger.info(f"Preloaded {loaded}/{len(results)} audio assets of {assistant_id or assistant_name} in {audio_format}")
+        return loaded
+
+    def get_stats(self):
+        return {**self.stats, "assets": len(self.assets), "bytes": self.size}
+
+
+_audio_asset_cache = None
+
+
+def get_audio_asset_cache():
+    global _audio_asset_cache
+    if _audio_asset_cache is None:
+        _audio_asset_cache = AudioAssetCache(
+            max_bytes=int(os.getenv("AUDIO_ASSET_CACHE_MAX_MB", 256)) * 1024 * 1024,
+            max_concurrent_fetches=int(os.getenv("AUDIO_ASSET_MAX_CONCURRENT_FETCHES", 8)))
+    return _audio_asset_cache
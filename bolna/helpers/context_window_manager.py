@@ -0,0 +1,122 @@
+import asyncio
+import traceback
+from bolna.helpers.logger_config import configure_logger
+from bolna.helpers.utils import format_messages
+from bolna.prompts import CONVERSATION_SUMMARY_PROMPT
+
+logger = configure_logger(__name__)
+
+# Every chat message costs a few tokens on top of its content for the role and separators
+TOKENS_PER_MESSAGE = 4
+
+
+class ContextWindowManager:
+    """
+    Keeps the messages sent to the LLM within a token budget.
+
+    The system prompt (and the running summary if summarization is on) is always sent first. Older turns are dropped in
+    blocks from the front of the conversation so that once trimmed, the window start stays put for the next few turns.
+    This keeps the prompt prefix stable which is what provider side prefix caching keys on.
+    """
+    def __init__(self, token_budget=None, model="gpt-3.5-turbo", trim_ratio=0.7, min_messages_to_keep=4, summarizer=None):
+        self.token_budget = token_budget
+        self.model = model
+        # When over budget, trim down to trim_ratio * budget so that we don't have to trim again on the very next turn
+        self.trim_ratio = trim_ratio
+        self.min_messages_to_keep = min_messages_to_keep
+        self.summarizer = summarizer
+        self.summary = None
+        self.summary_task = None
+        self.summarized_upto = 0
+        self.window_start = 0
+        self.token_counts = {}
+        self.__encoding = None
+
+    @property
+    def encoding(self):
+        # Loading the encoding takes a while, don't pay for it unless we actually count tokens
+        if self.__encoding is None:
+            import tiktoken
+            try:
+                self.__encoding = tiktoken.encoding_for_model(self.model)
+            except KeyError:
+                self.__encoding = tiktoken.get_encoding("cl100k_base")
+        return self.__encoding
+
+    def count_text_tokens(self, text):
+        return len(self.encoding.encode(text or ""))
+
+    def count_message_tokens(self, message):
+        key = (message["role"], message["content"])
+        if key not in self.token_counts:
+            self.token_counts[key] = TOKENS_PER_MESSAGE + self.count_text_tokens(str(message["content"]))
+        return self.token_counts[key]
+
+    def count_tokens(self, messages):
+        return sum(self.count_message_tokens(message) for message in messages)
+
+    def __get_prefix(self, messages):
+        prefix = [messages[0]] if len(messages) > 0 and messages[0]["role"] == "system" else []
+        if self.summary is not None:
+            prefix.append({"role": "system", "content": f"### Summary of the conversation so far\n{self.summary}"})
+        return prefix
+
+    def __advance_window(self, conversation, available_tokens):
+        target = available_tokens * self.trim_ratio
+        last_start = max(len(conversation) - self.min_messages_to_keep, 0)
+        tokens = self.count_tokens(conversation[self.window_start:])
+        while tokens > target and self.window_start < last_start:
+            tokens -= self.count_message_tokens(conversation[self.window_start])
+            self.window_start += 1
+        # Always start the window at a user message so that the LLM doesn't see a reply without its question
+        while self.window_start < last_start and conversation[self.window_start]["role"] != "user":
+            self.window_start += 1
+
+    def fit(self, messages):
+        """Returns the messages to send to the LLM and their token count"""
+        conversation = messages[1:] if len(messages) > 0 and messages[0]["role"] == "system" else messages
+        if self.window_start > len(conversation):
+            # History got reset underneath us
+            self.window_start, self.summarized_upto, self.summary = 0, 0, None
+
+        if self.token_budget is None:
+            return messages, self.count_tokens(messages)
+
+        prefix = self.__get_prefix(messages)
+        available_tokens = self.token_budget - self.count_tokens(prefix)
+        if self.count_tokens(conversation[self.window_start:]) > available_tokens:
+            previous_start = self.window_start
+            self.__advance_window(conversation, available_tokens)
+            logger.info(f"Context over the budget of {self.token_budget} tokens, dropped {self.window_start - previous_start} messages")
+            self.__summarize_dropped_messages(conversation)
+
+        fitted_messages = prefix + conversation[self.window_start:]
+        return fitted_messages, self.count_tokens(fitted_messages)
+
+    def __summarize_dropped_messages(self, conversation):
+        if self.summarizer is None or self.window_start <= self.summarized_upto:
+            return
+        if self.summary_task is not None and not self.summary_task.done():
+            return
+        dropped_messages = conversation[self.summarized_upto:self.window_start]
+        self.summary_task = asyncio.create_task(self.__summarize(dropped_messages, self.window_start))
+
+    async def __summarize(self, dropped_messages, summarized_upto):
+        try:
+            conversation = format_messages(dropped_messages)
+            if self.summary is not None:
+                conversation = f"Summary of the earlier conversation: {self.summary}\n{conversation}"
+            summary = await self.summarizer.generate([
+                {"role": "system", "content": CONVERSATION_SUMMARY_PROMPT},
+                {"role": "user", "content": conversation}
+            ])
+            # Swapped in between turns, the next request picks it up
+            self.summary, self.summarized_upto = summary, summarized_upto
+            logger.info(f"Summarized the conversation upto message {summarized_upto}")
+        except Exception as e:
+            traceback.print_exc()
+            logger.error(f"Could not summarize the conversation {e}")
+
+    def cancel(self):
+        if self.summary_task is not None:
+            self.summary_task.cancel()
@@ -0,0 +1,43 @@
+import re
+import zlib
+import numpy as np
+
+
+def normalize_text(text):
+    text = re.sub(r"[^\w\s]", " ", str(text).lower())
+    return " ".join(text.split())
+
+
+class BaseEmbedding:
+    dimension = None
+
+    def embed(self, texts):
+        """Returns a float32 matrix of shape (len(texts), dimension) with L2 normalised rows"""
+        raise NotImplementedError
+
+
+class HashedNgramEmbedding(BaseEmbedding):
+    """
+    Local stand-in for an embedding model. Words and character n-grams are hashed into a fixed size vector, which is
+    good enough to match small wording variations of the same question without a network round trip.
+    """
+    def __init__(self, dimension=512, ngram_size=3):
+        self.dimension = dimension
+        self.ngram_size = ngram_size
+
+    def __features(self, text):
+        words = text.split()
+        features = [f"w:{word}" for word in words]
+        padded = f" {text} "
+        features.extend(f"c:{padded[i:i + self.ngram_size]}" for i in range(len(padded) - self.ngram_size + 1))
+        return features
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self.__features(normalize_text(text)):
+                # crc32 instead of hash() so that embeddings are stable across processes
+                vectors[row, zlib.crc32(feature.encode()) % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
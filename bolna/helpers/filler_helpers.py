@@ -0,0 +1,92 @@
+import asyncio
+import copy
+import io
+from bolna.helpers.logger_config import configure_logger
+from bolna.synthesizer.base_synthesizer import BaseSynthesizer
+from bolna.helpers.utils import get_md5_hash, store_file, get_raw_audio_bytes_from_base64, BUCKET_NAME, AudioSegment
+
+logger = configure_logger(__name__)
+
+# Played while the LLM hasn't produced its first token yet, so these should be short and non committal
+DEFAULT_FILLER_PHRASES = {
+    "en": ["Hmm, let me see.", "Okay, one moment.", "Right, just a second."],
+    "hi": ["हम्म, एक सेकंड।", "ठीक है, एक पल।", "अच्छा, एक मिनट।"]
+}
+
+
+def get_filler_phrases(phrases=None, language="en"):
+    if phrases is not None and len(phrases) > 0:
+        return phrases
+    language = "en" if language is None else language.split("-")[0]
+    return DEFAULT_FILLER_PHRASES.get(language, DEFAULT_FILLER_PHRASES["en"])
+
+
+def get_filler_file_key(assistant_id, phrase, local=False):
+    # Same layout as preprocessed audio so that get_raw_audio_bytes_from_base64 can read it back
+    if local:
+        return f"{assistant_id}/pcm/{get_md5_hash(phrase)}.pcm"
+    return f"{assistant_id}/audio/{get_md5_hash(phrase)}.pcm"
+
+
+def convert_to_pcm(audio_bytes, sampling_rate=8000):
+    audio = AudioSegment.from_file(io.BytesIO(audio_bytes))
+    audio = audio.set_frame_rate(sampling_rate).set_channels(1).set_sample_width(2)
+    return audio.raw_data
+
+
+def create_filler_synthesizer(synthesizer_config, **kwargs):
+    from bolna.providers import SUPPORTED_SYNTHESIZER_MODELS
+    synthesizer_config = copy.deepcopy(synthesizer_config)
+    provider = synthesizer_config.pop("provider")
+    provider_config = synthesizer_config.pop("provider_config")
+    for key in ("backup_provider", "backup_provider_config", "first_byte_deadline"):
+        synthesizer_config.pop(key, None)
+    # One off synthesis, the audio is converted to pcm before storing it
+    synthesizer_config["stream"] = False
+    synthesizer_config["audio_format"] = "mp3"
+    synthesizer_class = SUPPORTED_SYNTHESIZER_MODELS.get(provider)
+    return synthesizer_class(**synthesizer_config, **provider_config, **kwargs)
+
+
+async def _synthesize_and_store_filler(synthesizer, phrase, assistant_id, local, sampling_rate):
+    try:
+        audio = await synthesizer.synthesize(phrase)
+        if audio is None:
+            logger.error(f"Synthesizer did not return any audio for filler {phrase}")
+            return None
+        file_key = get_filler_file_key(assistant_id, phrase, local)
+        await store_file(bucket_name=BUCKET_NAME, file_key=file_key, file_data=convert_to_pcm(audio, sampling_rate),
+                         content_type="pcm", local=local)
+        return file_key
+    except Exception as e:
+        logger.error(f"Could not generate filler audio for {phrase}: {e}")
+        return None
+
+
+async def generate_filler_audio(task, assistant_id, local=False, sampling_rate=8000):
+    """Pre-synthesizes the filler phrases of a conversation task at agent creation"""
+    synthesizer_config = task["tools_config"]["synthesizer"]
+    language = (task["tools_config"].get("transcriber") or {}).get("language", "en")
+    phrases = get_filler_phrases(task.get("filler_phrases"), language)
+    synthesizer = create_filler_synthesizer(synthesizer_config)
+    if type(synthesizer).synthesize is BaseSynthesizer.synthesize:
+        logger.error(f"{synthesizer_config['provider']} does not support one off synthesis and hence fillers are disabled")
+        return []
+    file_keys = await asyncio.gather(*[
+        _synthesize_and_store_filler(synthesizer, phrase, assistant_id, local, sampling_rate) for phrase in phrases])
+    logger.info(f"Stored filler audio {file_keys}")
+    return [file_key for file_key in file_keys if file_key is not None]
+
+
+async def load_filler_audio(assistant_id, phrases, local=False):
+    fillers = []
+    for phrase in phrases:
+        try:
+            audio = await get_raw_audio_bytes_from_base64(assistant_id, get_md5_hash(phrase), 'pcm',
+                                                          assistant_id=assistant_id, local=local)
+        except Exception as e:
+            logger.error(f"Could not load filler audio for {phrase}: {e}")
+            continue
+        if audio is not None and len(audio) > 0:
+            fillers.append(audio)
+    return fillers
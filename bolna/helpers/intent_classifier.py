@@ -0,0 +1,105 @@
+import re
+import numpy as np
+from bolna.helpers.embeddings import HashedNgramEmbedding
+from bolna.helpers.logger_config import configure_logger
+
+logger = configure_logger(__name__)
+
+LABEL_SEPARATORS = ("->", "=>", "|", ":", " - ")
+UTTERANCE_PREFIX = re.compile(r"^\s*(?:[-*•]|\d+[.)])?\s*(?:user|human|customer|caller|q)?\s*(?:says|said)?\s*:?\s*", re.IGNORECASE)
+JSON_LABEL = re.compile(r'"classification_label"\s*:\s*"([^"]+)"')
+
+
+def _clean_utterance(text):
+    return UTTERANCE_PREFIX.sub("", text).strip().strip("\"'`").strip()
+
+
+def parse_classification_examples(examples_text, labels):
+    """
+    Extracts (utterance, label) pairs from the ###Examples section of a classification prompt. Understands an example
+    per line like `I want to buy -> interested` as well as an utterance line followed by a json line with the label.
+    """
+    labels_by_name = {label.strip().lower(): label for label in labels}
+    examples = []
+    pending_utterance = None
+    for line in examples_text.splitlines():
+        line = line.strip()
+        if len(line) == 0:
+            continue
+
+        match = JSON_LABEL.search(line)
+        if match is not None:
+            label = labels_by_name.get(match.group(1).strip().lower())
+            utterance = _clean_utterance(line[:match.start()].rstrip("{ ,"))
+            utterance = utterance if len(utterance) > 0 else pending_utterance
+            if label is not None and utterance:
+                examples.append((utterance, label))
+            pending_utterance = None
+            continue
+
+        for separator in LABEL_SEPARATORS:
+            utterance, _, label = line.rpartition(separator)
+            label = labels_by_name.get(label.strip().strip("\"'`.").lower())
+            if label is not None and len(_clean_utterance(utterance)) > 0:
+                examples.append((_clean_utterance(utterance), label))
+                pending_utterance = None
+                break
+        else:
+            pending_utterance = _clean_utterance(line)
+    return examples
+
+
+class IntentClassifier:
+    """
+    Nearest centroid classifier over TF-IDF weighted hashed n-grams, trained from the few examples in a node's prompt.
+    It only answers when the best label is both above the threshold and clearly ahead of the runner up, anything
+    less confident is left to the LLM.
+    """
+    def __init__(self, labels, examples, embedding_model=None, threshold=0.6, margin=0.1):
+        self.labels = list(labels)
+        self.embedding_model = embedding_model if embedding_model is not None else HashedNgramEmbedding()
+        self.threshold = threshold
+        self.margin = margin
+        self.idf = None
+        self.centroids = None
+        self.fit(examples)
+
+    @staticmethod
+    def __normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def fit(self, examples):
+        vectors = self.embedding_model.embed([utterance for utterance, _ in examples])
+        document_frequency = (vectors > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(examples)) / (1 + document_frequency)) + 1).astype(np.float32)
+        vectors = self.__normalize(vectors * self.idf)
+        example_labels = np.array([self.labels.index(label) for _, label in examples])
+        self.centroids = self.__normalize(np.stack([vectors[example_labels == index].mean(axis=0)
+                                                    for index in range(len(self.labels))]))
+
+    def scores(self, text):
+        query = self.__normalize(self.embedding_model.embed([text])[0] * self.idf)
+        return self.centroids @ query
+
+    def predict(self, text):
+        """Returns (label, score, confident)"""
+        scores = self.scores(text)
+        ranked = np.argsort(-scores)
+        best = float(scores[ranked[0]])
+        runner_up = float(scores[ranked[1]]) if len(ranked) > 1 else 0.0
+        confident = best >= self.threshold and best - runner_up >= self.margin
+        return self.labels[ranked[0]], best, confident
+
+    @classmethod
+    def from_prompt(cls, prompt, labels, **kwargs):
+        """Returns None unless every label has at least one example to learn from"""
+        if prompt is None or len(labels) < 2 or "###Examples" not in prompt:
+            return None
+        examples = parse_classification_examples(prompt.split("###Examples", 1)[1], labels)
+        missing_labels = set(labels) - set(label for _, label in examples)
+        if len(missing_labels) > 0:
+            logger.info(f"No examples for {missing_labels} and hence not using a local classifier")
+            return None
+        return cls(labels, examples, **kwargs)
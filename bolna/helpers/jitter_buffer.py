@@ -0,0 +1,120 @@
+import audioop
+import heapq
+import numpy as np
+from bolna.helpers.logger_config import configure_logger
+
+logger = configure_logger(__name__)
+
+
+class JitterBuffer:
+    """
+    Inbound telephony audio on its way to the transcriber. Frames are released in media timestamp order, a missing
+    frame is waited on for a few frames and then filled with comfort noise, and released audio is batched by how
+    loud it is: small batches while the caller speaks so transcripts come quicker, large ones through silence so
+    there are fewer websocket sends.
+    """
+    def __init__(self, encoding="mulaw", sampling_rate=8000, reorder_frames=3, speech_batch_ms=60, silence_batch_ms=400,
+                 speech_rms_threshold=300, speech_hangover_ms=300, max_gap_ms=1000, comfort_noise_level=30):
+        self.encoding = encoding
+        self.sample_width = 1 if encoding == "mulaw" else 2
+        self.bytes_per_ms = sampling_rate * self.sample_width // 1000
+        self.reorder_frames = reorder_frames
+        self.speech_batch_ms = speech_batch_ms
+        self.silence_batch_ms = silence_batch_ms
+        self.speech_rms_threshold = speech_rms_threshold
+        self.speech_hangover_ms = speech_hangover_ms
+        self.max_gap_ms = max_gap_ms
+        self.comfort_noise = self.__create_comfort_noise(sampling_rate, comfort_noise_level)
+
+        self.frames = []
+        self.next_timestamp = None
+        self.batch = []
+        self.batch_ms = 0
+        self.ms_since_speech = None
+        self.stats = {"frames": 0, "late_frames": 0, "filled_ms": 0, "batches": 0}
+
+    def __create_comfort_noise(self, sampling_rate, level):
+        """A second of low level noise in the inbound encoding, sliced to fill gaps"""
+        noise = np.random.default_rng().normal(0, level, sampling_rate).clip(-32768, 32767).astype(np.int16).tobytes()
+        return audioop.lin2ulaw(noise, 2) if self.encoding == "mulaw" else noise
+
+    def __is_speech(self, audio):
+        linear = audioop.ulaw2lin(audio, 1) if self.encoding == "mulaw" else audio
+        return audioop.rms(linear, 2) >= self.speech_rms_threshold
+
+    @property
+    def is_speaking(self):
+        return self.ms_since_speech is not None and self.ms_since_speech < self.speech_hangover_ms
+
+    def __fill(self, gap_ms):
+        gap_ms = min(gap_ms, self.max_gap_ms)
+        self.stats["filled_ms"] += gap_ms
+        filler = self.comfort_noise * (gap_ms // 1000 + 1)
+        return self.__add_to_batch(filler[:gap_ms * self.bytes_per_ms], gap_ms, is_filler=True)
+
+    def __add_to_batch(self, audio, duration_ms, is_filler=False):
+        batches = []
+        was_speaking = self.is_speaking
+        if not is_filler and self.__is_speech(audio):
+            self.ms_since_speech = 0
+            if not was_speaking and self.batch_ms > 0:
+                # Speech just started, don't hold it behind the silence batched so far
+                batches.append(self.__take_batch())
+        elif self.ms_since_speech is not None:
+            self.ms_since_speech += duration_ms
+
+        self.batch.append(audio)
+        self.batch_ms += duration_ms
+        if self.batch_ms >= (self.speech_batch_ms if self.is_speaking else self.silence_batch_ms):
+            batches.append(self.__take_batch())
+        return batches
+
+    def __take_batch(self):
+        batch = b''.join(self.batch)
+        self.batch, self.batch_ms = [], 0
+        self.stats["batches"] += 1
+        return batch
+
+    def __release(self, timestamp, audio):
+        if self.next_timestamp is not None and timestamp < self.next_timestamp:
+            # Its slot was already filled with comfort noise or it's a duplicate
+            self.stats["late_frames"] += 1
+            return []
+        batches = []
+        duration_ms = len(audio) // self.bytes_per_ms
+        if self.next_timestamp is not None and timestamp > self.next_timestamp:
+            batches.extend(self.__fill(timestamp - self.next_timestamp))
+        batches.extend(self.__add_to_batch(audio, duration_ms))
+        self.next_timestamp = timestamp + duration_ms
+        return batches
+
+    def push(self, audio, timestamp=None):
+        """Adds a media frame and returns the batches, if any, that are ready for the transcriber"""
+        self.stats["frames"] += 1
+        if timestamp is None:
+            # Nothing to order by, pass it through as is
+            return self.__add_to_batch(audio, len(audio) // self.bytes_per_ms)
+
+        heapq.heappush(self.frames, (int(timestamp), self.stats["frames"], audio))
+        batches = []
+        while len(self.frames) > 0:
+            head_timestamp = self.frames[0][0]
+            # Hold on to out of order frames for a bit in case the missing one turns up
+            if self.next_timestamp is not None and head_timestamp > self.next_timestamp and len(self.frames) <= self.reorder_frames:
+                break
+            head_timestamp, _, head_audio = heapq.heappop(self.frames)
+            batches.extend(self.__release(head_timestamp, head_audio))
+        return batches
+
+    def flush(self):
+        """Releases everything held, returns the final batch or None"""
+        batches = []
+        while len(self.frames) > 0:
+            timestamp, _, audio = heapq.heappop(self.frames)
+            batches.extend(self.__release(timestamp, audio))
+        if self.batch_ms > 0:
+            batches.append(self.__take_batch())
+        return b''.join(batches) if len(batches) > 0 else None
+
+    def get_stats(self):
+        return dict(self.stats)
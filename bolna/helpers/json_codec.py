@@ -0,0 +1,69 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    # pip install bolna[fast-json] for the faster codec, the standard library is used otherwise
+    orjson = None
+
+# json.dumps builds a new encoder whenever it's given options, this one is reused
+_compact_encoder = json.JSONEncoder(separators=(",", ":"))
+
+# Telephony providers send compact JSON, anything else is left to loads
+MEDIA_EVENT = '"event":"media"'
+PAYLOAD_KEY = '"payload":"'
+MEDIA_FIELDS = (("timestamp", '"timestamp":'), ("track", '"track":'), ("chunk", '"chunk":'))
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    """Compact JSON as a str, ready for send_text"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return _compact_encoder.encode(obj)
+
+
+def _find_value(message, key, start, end):
+    """Value of a string or number field between start and end, as a str"""
+    index = message.find(key, start, end)
+    if index == -1:
+        return None
+    index += len(key)
+    if message[index] == '"':
+        return message[index + 1:message.find('"', index + 1)]
+    value_end = index
+    while value_end < end and message[value_end] not in ",}":
+        value_end += 1
+    return message[index:value_end].strip()
+
+
+def extract_media(message):
+    """
+    Fast path for the telephony media events which arrive every 20ms. Returns the event's media object (payload,
+    timestamp, track and chunk as present, all as str) by finding the fields in the text instead of parsing all of it.
+    Returns None for any other event, or anything it can't read with certainty, so that the caller falls back to loads.
+    orjson parses the whole event faster than this, so with it installed everything goes to loads, see
+    benchmarks/json_codec_benchmark.py.
+    """
+    if orjson is not None:
+        return None
+    payload_start = message.find(PAYLOAD_KEY)
+    if payload_start == -1 or MEDIA_EVENT not in message:
+        return None
+    payload_end = message.find('"', payload_start + len(PAYLOAD_KEY))
+    if payload_end == -1 or message.find("\\", payload_start, payload_end) != -1:
+        return None
+
+    media = {"payload": message[payload_start + len(PAYLOAD_KEY):payload_end]}
+    for name, key in MEDIA_FIELDS:
+        value = _find_value(message, key, 0, payload_start)
+        if value is None:
+            value = _find_value(message, key, payload_end, len(message))
+        if value is not None:
+            media[name] = value
+    return media
@@ -0,0 +1,66 @@
+import importlib
+from collections.abc import Mapping
+
+
+class LazyModule:
+    """
+    Stands in for a heavy module (or an attribute of it) and imports it on first use, so that importing bolna doesn't
+    pay for torch, scipy or pydub unless a code path actually needs them.
+    """
+    def __init__(self, module_name, attribute=None):
+        self._module_name = module_name
+        self._attribute = attribute
+        self._target = None
+
+    def _load(self):
+        if self._target is None:
+            module = importlib.import_module(self._module_name)
+            self._target = getattr(module, self._attribute) if self._attribute is not None else module
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+
+def lazy_import(module_name, attribute=None):
+    return LazyModule(module_name, attribute)
+
+
+class LazyRegistry(Mapping):
+    """
+    Maps a provider name to "module:ClassName" and imports the module only when the provider is looked up. Listing
+    the supported providers doesn't import anything.
+    """
+    def __init__(self, paths):
+        self.paths = dict(paths)
+        self.loaded = {}
+
+    def __getitem__(self, name):
+        if name not in self.loaded:
+            module_name, class_name = self.paths[name].split(":")
+            self.loaded[name] = getattr(importlib.import_module(module_name), class_name)
+        return self.loaded[name]
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, name):
+        return name in self.paths
+
+    def __repr__(self):
+        return f"LazyRegistry({list(self.paths.keys())})"
+
+
+def lazy_module_getattr(module_name, attributes):
+    """Returns a PEP 562 __getattr__ which imports a package's attribute from its submodule on first access"""
+    def __getattr__(name):
+        if name not in attributes:
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+        return getattr(importlib.import_module(attributes[name], module_name), name)
+    return __getattr__
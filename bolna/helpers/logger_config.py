@@ -1,9 +1,101 @@
 import logging
+import os
+import time
 
-VALID_LOGGING_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+VALID_LOGGING_LEVELS = ["DEBUG", "INFO", "SUMMARY", "WARNING", "ERROR", "CRITICAL"]
 
+# Per turn and per call summaries, kept by the production profile which drops everything else below WARNING
+SUMMARY = 25
+logging.addLevelName(SUMMARY, "SUMMARY")
 
-def configure_logger(file_name, enabled=True, logging_level='INFO'):
+# development logs everything at INFO, production keeps only summaries, warnings and errors
+LOG_PROFILE = os.getenv("LOG_PROFILE", "development")
+# High frequency events (per audio chunk, per transcript) are logged at most this many times a second per event
+HOT_LOGS_PER_SECOND = float(os.getenv("HOT_LOGS_PER_SECOND", 2))
+
+_logging_stats = {"cpu_time": 0.0, "emitted": 0, "suppressed": 0}
+
+
+def get_logging_stats():
+    """CPU time spent creating and writing log records in this process along with emitted and suppressed counts"""
+    return dict(_logging_stats)
+
+
+class StructuredLogger:
+    """
+    Thin facade over a logging.Logger. Messages may be callables which are only formatted when the level is enabled,
+    hot() rate limits high frequency events per key and summary() logs fields which survive the production profile.
+    """
+    def __init__(self, logger, hot_logs_per_second=HOT_LOGS_PER_SECOND, hot_logs_enabled=True):
+        self.logger = logger
+        self.hot_log_interval = 1 / hot_logs_per_second if hot_logs_per_second > 0 else None
+        self.hot_logs_enabled = hot_logs_enabled
+        self.hot_keys = {}
+
+    @property
+    def disabled(self):
+        return self.logger.disabled
+
+    @disabled.setter
+    def disabled(self, disabled):
+        self.logger.disabled = disabled
+
+    def isEnabledFor(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level, msg, args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            _logging_stats["suppressed"] += 1
+            return
+        start_time = time.thread_time()
+        if callable(msg):
+            msg = msg()
+        # stacklevel points module and funcName at the caller instead of this facade
+        self.logger.log(level, msg, *args, stacklevel=3, **kwargs)
+        _logging_stats["cpu_time"] += time.thread_time() - start_time
+        _logging_stats["emitted"] += 1
+
+    def debug(self, msg, *args, **kwargs):
+        self._log(logging.DEBUG, msg, args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self._log(logging.INFO, msg, args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self._log(logging.WARNING, msg, args, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self._log(logging.ERROR, msg, args, **kwargs)
+
+    def exception(self, msg, *args, **kwargs):
+        self._log(logging.ERROR, msg, args, exc_info=True, **kwargs)
+
+    def critical(self, msg, *args, **kwargs):
+        self._log(logging.CRITICAL, msg, args, **kwargs)
+
+    def summary(self, event, **fields):
+        self._log(SUMMARY, lambda: f"{event} " + " ".join(f"{key}={value}" for key, value in fields.items()), ())
+
+    def hot(self, key, msg, *args, **kwargs):
+        """Logs at INFO at most hot_logs_per_second times a second for the key, suppressed repeats are counted"""
+        if not self.hot_logs_enabled or not self.logger.isEnabledFor(logging.INFO):
+            _logging_stats["suppressed"] += 1
+            return
+        now = time.monotonic()
+        last_logged, suppressed = self.hot_keys.get(key, (0, 0))
+        if self.hot_log_interval is not None and now - last_logged < self.hot_log_interval:
+            self.hot_keys[key] = (last_logged, suppressed + 1)
+            _logging_stats["suppressed"] += 1
+            return
+        self.hot_keys[key] = (now, 0)
+        if suppressed > 0:
+            msg = (lambda message: lambda: f"{message() if callable(message) else message} ({suppressed} similar suppressed)")(msg)
+        self._log(logging.INFO, msg, args, **kwargs)
+
+
+def configure_logger(file_name, enabled=True, logging_level=None):
+    if logging_level is None:
+        logging_level = os.getenv("LOG_LEVEL", "SUMMARY" if LOG_PROFILE == "production" else "INFO")
     if logging_level not in VALID_LOGGING_LEVELS:
         logging_level = "INFO"
 
@@ -13,7 +105,7 @@ def configure_logger(file_name, enabled=True, logging_level='INFO'):
         datefmt="%Y-%m-%d %H:%M:%S",
     )
 
-    logger = logging.getLogger(file_name)
+    logger = StructuredLogger(logging.getLogger(file_name), hot_logs_enabled=LOG_PROFILE != "production")
 
     if not enabled:
         logger.disabled = True
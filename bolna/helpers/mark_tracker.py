@@ -0,0 +1,85 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class MarkTracker:
+    """
+    Playback cursor for audio sent to Twilio or Exotel. Media is followed by a mark which the provider echoes back once
+    everything sent before it has played, so the marks still outstanding tell how much audio is buffered there.
+    Behaves like the set of outstanding mark names which the input and output handlers used to share.
+    """
+    def __init__(self):
+        # mark name -> seconds of audio sent between the previous mark and this one, oldest first
+        self.marks = OrderedDict()
+        self.unmarked_duration = 0.0
+        self.in_flight_duration = 0.0
+        # Bumped on every clear, audio which waited across a clear belongs to the interrupted response
+        self.clears = 0
+        self.changed = asyncio.Event()
+        self.stats = {"marks_sent": 0, "marks_acked": 0, "flow_control_waits": 0, "flow_control_timeouts": 0,
+                      "max_in_flight_duration": 0.0}
+
+    def __contains__(self, mark_id):
+        return mark_id in self.marks
+
+    def __len__(self):
+        return len(self.marks)
+
+    def add_audio(self, duration):
+        """Audio sent to the provider, it's acknowledged by the next mark"""
+        self.unmarked_duration += duration
+        self.in_flight_duration += duration
+        self.stats["max_in_flight_duration"] = max(self.stats["max_in_flight_duration"], round(self.in_flight_duration, 3))
+
+    def add(self, mark_id):
+        self.marks[mark_id] = self.unmarked_duration
+        self.unmarked_duration = 0.0
+        self.stats["marks_sent"] += 1
+
+    def remove(self, mark_id):
+        """Acknowledges the mark, and every mark before it as providers play audio in order"""
+        if mark_id not in self.marks:
+            return
+        while len(self.marks) > 0:
+            acked_mark_id, duration = self.marks.popitem(last=False)
+            self.in_flight_duration = max(self.in_flight_duration - duration, 0.0)
+            self.stats["marks_acked"] += 1
+            if acked_mark_id == mark_id:
+                break
+        self.changed.set()
+
+    def clear(self):
+        """Forgets everything in flight, the provider's buffer was just cleared"""
+        self.marks.clear()
+        self.unmarked_duration = 0.0
+        self.in_flight_duration = 0.0
+        self.clears += 1
+        self.changed.set()
+
+    async def __wait_until_buffered(self, max_duration, timeout):
+        deadline = time.time() + timeout
+        while self.in_flight_duration - self.unmarked_duration > max_duration:
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout=max(deadline - time.time(), 0))
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def wait_for_room(self, max_duration, timeout):
+        """Waits until at most max_duration seconds of marked audio are buffered at the provider, False on timeout"""
+        if self.in_flight_duration - self.unmarked_duration <= max_duration:
+            return True
+        self.stats["flow_control_waits"] += 1
+        if not await self.__wait_until_buffered(max_duration, timeout):
+            self.stats["flow_control_timeouts"] += 1
+            return False
+        return True
+
+    async def wait_until_played(self, timeout):
+        """Waits until the provider has acked all of the marked audio, False on timeout"""
+        return await self.__wait_until_buffered(0, timeout)
+
+    def get_stats(self):
+        return {**self.stats, "in_flight_duration": round(self.in_flight_duration, 3)}
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+import time
+import aiofiles
+from bolna.helpers.logger_config import configure_logger
+
+logger = configure_logger(__name__)
+
+REQUEST_LOG_CSV_HEADER = "Time,Component,Direction,Leg ID,Sequence ID,Model,Data,Input Tokens,Output Tokens,Characters,Final Transcript\n"
+
+
+def format_request_log_csv(message):
+    component_details = [None, None, None, None, None]
+    row = [message['time'], message["component"], message["direction"], message["leg_id"], message['sequence_id'], message['model']]
+    if message["component"] == "llm":
+        component_details = [message['data'], message.get('input_tokens', 0), message.get('output_tokens', 0), None, None]
+    elif message["component"] == "transcriber":
+        component_details = [message['data'], None, None, None, message.get('is_final', False)]
+    elif message["component"] == "synthesizer":
+        component_details = [message['data'], None, None, len(message['data']), None]
+    row = row + component_details
+    return ','.join(['"' + str(item).replace('"', '""') + '"' if item is not None else '' for item in row]) + '\n'
+
+
+def format_request_log_jsonl(message):
+    return json.dumps(message, default=str, ensure_ascii=False) + '\n'
+
+
+class RequestLogSink:
+    """
+    Per process writer for request logs. Rows are queued without blocking the call and a single background task writes
+    them in batches, keeping one open file per run until the run is flushed at the end of the call.
+    """
+    def __init__(self, log_dir="./logs", output_format="csv", batch_size=50, flush_interval=0.5, max_queue_size=10000):
+        self.log_dir = log_dir
+        self.output_format = output_format
+        self.extension = "jsonl" if output_format == "jsonl" else "csv"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.queue = None
+        self.writer_task = None
+        self.files = {}
+        self.dropped_rows = 0
+
+    def __ensure_writer(self):
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        if self.writer_task is None or self.writer_task.done():
+            self.writer_task = asyncio.create_task(self.__run())
+
+    def log(self, message, run_id):
+        self.__ensure_writer()
+        try:
+            self.queue.put_nowait((run_id, message))
+        except asyncio.QueueFull:
+            # Never hold up the call for logs
+            self.dropped_rows += 1
+            if self.dropped_rows % 1000 == 1:
+                logger.error(f"Request log queue is full, dropped {self.dropped_rows} rows so far")
+
+    async def flush(self, run_id, timeout=5):
+        """Writes out everything queued for the run so far and closes its file"""
+        if self.queue is None:
+            return
+        flushed = asyncio.Event()
+        self.__ensure_writer()
+        # Flush markers are never dropped, wait for room instead
+        await self.queue.put((run_id, flushed))
+        try:
+            await asyncio.wait_for(flushed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out flushing request logs of {run_id}")
+
+    async def __get_file(self, run_id):
+        if run_id not in self.files:
+            log_dir = f"{self.log_dir}/{run_id.split('#')[0]}"
+            os.makedirs(log_dir, exist_ok=True)
+            log_file_path = f"{log_dir}/{run_id.split('#')[1]}.{self.extension}"
+            write_header = self.extension == "csv" and not os.path.exists(log_file_path)
+            self.files[run_id] = await aiofiles.open(log_file_path, mode='a')
+            if write_header:
+                await self.files[run_id].write(REQUEST_LOG_CSV_HEADER)
+        return self.files[run_id]
+
+    async def __write_batch(self, batch):
+        rows = {}
+        for run_id, message in batch:
+            formatted = format_request_log_jsonl(message) if self.output_format == "jsonl" else format_request_log_csv(message)
+            rows.setdefault(run_id, []).append(formatted)
+        for run_id, run_rows in rows.items():
+            try:
+                log_file = await self.__get_file(run_id)
+                await log_file.write(''.join(run_rows))
+                await log_file.flush()
+            except Exception as e:
+                logger.error(f"Could not write {len(run_rows)} request log rows of {run_id}: {e}")
+
+    async def __close_run(self, run_id):
+        log_file = self.files.pop(run_id, None)
+        if log_file is not None:
+            await log_file.close()
+
+    async def __run(self):
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size and not isinstance(batch[-1][1], asyncio.Event):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            rows = [item for item in batch if not isinstance(item[1], asyncio.Event)]
+            if len(rows) > 0:
+                await self.__write_batch(rows)
+
+            for run_id, flushed in batch:
+                if isinstance(flushed, asyncio.Event):
+                    await self.__close_run(run_id)
+                    flushed.set()
+
+
+_request_log_sink = None
+
+
+def get_request_log_sink():
+    global _request_log_sink
+    if _request_log_sink is None:
+        _request_log_sink = RequestLogSink(
+            log_dir=os.getenv("REQUEST_LOG_DIR", "./logs"),
+            output_format=os.getenv("REQUEST_LOG_FORMAT", "csv"),
+            batch_size=int(os.getenv("REQUEST_LOG_BATCH_SIZE", 50)),
+            flush_interval=int(os.getenv("REQUEST_LOG_FLUSH_INTERVAL_MS", 500)) / 1000)
+    return _request_log_sink
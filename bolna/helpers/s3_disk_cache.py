@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+import aiofiles
+from aiobotocore.session import AioSession
+from botocore.exceptions import BotoCoreError, ClientError
+from bolna.helpers.logger_config import configure_logger
+
+logger = configure_logger(__name__)
+
+
+class S3DiskCache:
+    """
+    Size bounded local disk cache in front of S3. Objects are stored once per content hash under blobs/ and every
+    cached key has a small entry under keys/ with its ETag, so the index survives restarts. Entries older than
+    max_age are revalidated with a conditional GET, concurrent fetches of the same key share a single request and the
+    least recently used keys are evicted once the cache grows past max_bytes.
+    """
+    def __init__(self, cache_dir="./s3_cache", max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.session = AioSession()
+        # (bucket, key) -> {"etag", "digest", "size", "validated_at"}, least recently used first
+        self.entries = OrderedDict()
+        self.blob_refs = {}
+        self.size = 0
+        self.pending = {}
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stale_served": 0, "evictions": 0}
+        os.makedirs(f"{self.cache_dir}/blobs", exist_ok=True)
+        os.makedirs(f"{self.cache_dir}/keys", exist_ok=True)
+        self.__load_index()
+
+    @staticmethod
+    def __get_entry_name(bucket_name, file_key):
+        return hashlib.md5(f"{bucket_name}/{file_key}".encode()).hexdigest()
+
+    def __get_blob_path(self, digest):
+        return f"{self.cache_dir}/blobs/{digest}"
+
+    def __get_entry_path(self, bucket_name, file_key):
+        return f"{self.cache_dir}/keys/{self.__get_entry_name(bucket_name, file_key)}.json"
+
+    def __load_index(self):
+        entries = []
+        for file_name in os.listdir(f"{self.cache_dir}/keys"):
+            entry_path = f"{self.cache_dir}/keys/{file_name}"
+            try:
+                with open(entry_path, "r") as f:
+                    entry = json.load(f)
+                if os.path.exists(self.__get_blob_path(entry["digest"])):
+                    entries.append((os.path.getmtime(entry_path), entry))
+                else:
+                    os.remove(entry_path)
+            except Exception as e:
+                logger.error(f"Ignoring unreadable cache entry {entry_path}: {e}")
+
+        for _, entry in sorted(entries, key=lambda item: item[0]):
+            self.__add_entry((entry["bucket"], entry["key"]), entry)
+        if len(self.entries) > 0:
+            logger.info(f"Loaded {len(self.entries)} cached S3 objects ({self.size} bytes) from {self.cache_dir}")
+
+    def __add_entry(self, cache_key, entry):
+        self.entries[cache_key] = entry
+        self.entries.move_to_end(cache_key)
+        if self.blob_refs.get(entry["digest"], 0) == 0:
+            self.size += entry["size"]
+        self.blob_refs[entry["digest"]] = self.blob_refs.get(entry["digest"], 0) + 1
+
+    def __remove_entry(self, cache_key):
+        entry = self.entries.pop(cache_key)
+        self.blob_refs[entry["digest"]] -= 1
+        if self.blob_refs[entry["digest"]] == 0:
+            del self.blob_refs[entry["digest"]]
+            self.size -= entry["size"]
+            try:
+                os.remove(self.__get_blob_path(entry["digest"]))
+            except FileNotFoundError:
+                pass
+        try:
+            os.remove(self.__get_entry_path(*cache_key))
+        except FileNotFoundError:
+            pass
+
+    def __evict(self):
+        while self.size > self.max_bytes and len(self.entries) > 0:
+            self.__remove_entry(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+
+    def __read_blob(self, digest):
+        with open(self.__get_blob_path(digest), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[:]
+
+    async def __write_file(self, path, data, mode="wb"):
+        # Written next to the destination and renamed so that readers never see a partial file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        async with aiofiles.open(temp_path, mode) as f:
+            await f.write(data)
+        os.replace(temp_path, path)
+
+    async def __store(self, bucket_name, file_key, content, etag):
+        cache_key = (bucket_name, file_key)
+        if cache_key in self.entries:
+            self.__remove_entry(cache_key)
+
+        digest = hashlib.sha256(content).hexdigest()
+        if not os.path.exists(self.__get_blob_path(digest)):
+            await self.__write_file(self.__get_blob_path(digest), content)
+        entry = {"bucket": bucket_name, "key": file_key, "etag": etag, "digest": digest, "size": len(content),
+                 "validated_at": time.time()}
+        await self.__write_file(self.__get_entry_path(bucket_name, file_key), json.dumps(entry), mode="w")
+        self.__add_entry(cache_key, entry)
+        self.__evict()
+
+    async def __fetch(self, bucket_name, file_key, entry):
+        """Fetches the object, conditionally on the cached ETag if there is one, and returns its content"""
+        async with AsyncExitStack() as exit_stack:
+            s3_client = await exit_stack.enter_async_context(self.session.create_client('s3'))
+            request = {"Bucket": bucket_name, "Key": file_key}
+            if entry is not None:
+                request["IfNoneMatch"] = entry["etag"]
+            try:
+                response = await s3_client.get_object(**request)
+            except ClientError as error:
+                if entry is None or error.response.get("Error", {}).get("Code") not in ("304", "NotModified"):
+                    raise
+                if (bucket_name, file_key) in self.entries:
+                    entry["validated_at"] = time.time()
+                    self.stats["revalidated"] += 1
+                    return self.__read_blob(entry["digest"])
+                # Evicted while we were revalidating it
+                response = await s3_client.get_object(Bucket=bucket_name, Key=file_key)
+            content = await response['Body'].read()
+
+        await self.__store(bucket_name, file_key, content, response.get("ETag"))
+        return content
+
+    async def __fetch_or_serve_stale(self, bucket_name, file_key, entry):
+        try:
+            return await self.__fetch(bucket_name, file_key, entry)
+        except (BotoCoreError, ClientError) as error:
+            if entry is not None and os.path.exists(self.__get_blob_path(entry["digest"])):
+                logger.error(f"Could not revalidate {file_key}, serving the cached copy: {error}")
+                self.stats["stale_served"] += 1
+                return self.__read_blob(entry["digest"])
+            logger.error(error)
+            return None
+
+    async def get(self, bucket_name, file_key, max_age=None):
+        """
+        Returns the object's content or None if it couldn't be fetched. Cached copies older than max_age seconds are
+        revalidated against S3, a max_age of None trusts them until they're evicted which suits content addressed keys.
+        """
+        cache_key = (bucket_name, file_key)
+        entry = self.entries.get(cache_key)
+        if entry is not None and not os.path.exists(self.__get_blob_path(entry["digest"])):
+            # Removed from under us, fetch it again
+            self.__remove_entry(cache_key)
+            entry = None
+
+        if entry is None:
+            self.stats["misses"] += 1
+        else:
+            self.entries.move_to_end(cache_key)
+            if max_age is None or time.time() - entry["validated_at"] < max_age:
+                self.stats["hits"] += 1
+                return self.__read_blob(entry["digest"])
+
+        if cache_key not in self.pending:
+            self.pending[cache_key] = asyncio.ensure_future(self.__fetch_or_serve_stale(bucket_name, file_key, entry))
+            self.pending[cache_key].add_done_callback(lambda _: self.pending.pop(cache_key, None))
+        return await asyncio.shield(self.pending[cache_key])
+
+    def get_stats(self):
+        return {**self.stats, "objects": len(self.entries), "bytes": self.size}
+
+
+_s3_disk_cache = None
+
+
+def get_s3_disk_cache():
+    """Returns the process wide cache, or None when S3_CACHE_MAX_MB is 0"""
+    global _s3_disk_cache
+    max_mb = int(os.getenv("S3_CACHE_MAX_MB", 1024))
+    if _s3_disk_cache is None and max_mb > 0:
+        _s3_disk_cache = S3DiskCache(cache_dir=os.getenv("S3_CACHE_DIR", "./s3_cache"), max_bytes=max_mb * 1024 * 1024)
+    return _s3_disk_cache
@@ -0,0 +1,97 @@
+import json
+from bolna.helpers.logger_config import configure_logger
+
+logger = configure_logger(__name__)
+
+
+class StreamingJsonParser:
+    """
+    Incrementally parses a JSON object as its text streams in from the LLM and resolves every top level key as soon as
+    its value is complete. Anything before the opening brace (like a ```json fence) is ignored.
+    """
+    def __init__(self, keys=None):
+        # Stop as soon as these keys are resolved, None waits for the whole object
+        self.keys = keys
+        self.buffer = ""
+        self.values = {}
+        self.complete = False
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.expecting = None
+        self.current_key = None
+        self.key_start = None
+        self.value_start = None
+
+    def is_done(self):
+        if self.complete:
+            return True
+        return self.keys is not None and all(key in self.values for key in self.keys)
+
+    def __resolve(self, end):
+        text = self.buffer[self.value_start:end]
+        self.value_start, self.expecting = None, None
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            logger.error(f"Could not parse the value of {self.current_key}: {text}")
+            return None
+        self.values[self.current_key] = value
+        return self.current_key
+
+    def feed(self, text):
+        """Returns the top level keys resolved by this chunk of text"""
+        self.buffer += text
+        resolved = {}
+        while self.position < len(self.buffer) and not self.complete:
+            i, c = self.position, self.buffer[self.position]
+            self.position += 1
+            key = None
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.expecting == "key":
+                        self.current_key = json.loads(self.buffer[self.key_start:i + 1])
+                        self.expecting = "colon"
+                    elif self.depth == 1 and self.value_start is not None:
+                        key = self.__resolve(i + 1)
+            elif self.depth == 0:
+                if c == "{":
+                    self.depth, self.expecting = 1, "key"
+            elif c == '"':
+                self.in_string = True
+                if self.depth == 1 and self.expecting == "key":
+                    self.key_start = i
+                elif self.depth == 1 and self.expecting == "value":
+                    self.value_start = i
+            elif c in "{[":
+                if self.depth == 1 and self.expecting == "value":
+                    self.value_start = i
+                self.depth += 1
+            elif c in "}]":
+                self.depth -= 1
+                if self.depth == 1 and self.value_start is not None:
+                    key = self.__resolve(i + 1)
+                elif self.depth == 0:
+                    if self.value_start is not None:
+                        key = self.__resolve(i)
+                    self.complete = True
+            elif self.depth == 1:
+                if c == ":":
+                    self.expecting = "value"
+                elif c == ",":
+                    if self.value_start is not None:
+                        key = self.__resolve(i)
+                    self.expecting = "key"
+                elif not c.isspace() and self.expecting == "value" and self.value_start is None:
+                    self.value_start = i
+
+            if key is not None:
+                resolved[key] = self.values[key]
+        return resolved
@@ -0,0 +1,149 @@
+from bolna.helpers.logger_config import configure_logger
+
+logger = configure_logger(__name__)
+
+# Per language punctuation used to decide where a streamed LLM response can be handed over to the synthesizer.
+# Languages which do not separate words by whitespace (zh, ja) can end a segment right after the terminator.
+SEGMENTATION_RULES = {
+    "default": {
+        "sentence_terminators": ".!?",
+        "clause_terminators": ",;:",
+        "requires_whitespace": True,
+        "abbreviations": set()
+    },
+    "en": {
+        "sentence_terminators": ".!?",
+        "clause_terminators": ",;:",
+        "requires_whitespace": True,
+        "abbreviations": {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "no", "approx"}
+    },
+    "hi": {
+        "sentence_terminators": "।॥.!?",
+        "clause_terminators": ",;:",
+        "requires_whitespace": False,
+        "abbreviations": set()
+    },
+    "zh": {
+        "sentence_terminators": "。！？.!?",
+        "clause_terminators": "，、；：,;:",
+        "requires_whitespace": False,
+        "abbreviations": set()
+    },
+    "ja": {
+        "sentence_terminators": "。！？.!?",
+        "clause_terminators": "、，；：,;:",
+        "requires_whitespace": False,
+        "abbreviations": set()
+    }
+}
+
+SENTENCE_BOUNDARY = "sentence"
+CLAUSE_BOUNDARY = "clause"
+
+
+def get_segmentation_rules(language):
+    if language is None:
+        return SEGMENTATION_RULES["default"]
+    language = language.lower()
+    if language in SEGMENTATION_RULES:
+        return SEGMENTATION_RULES[language]
+    # pt-BR, en-IN etc. fall back to their base language
+    return SEGMENTATION_RULES.get(language.split("-")[0], SEGMENTATION_RULES["default"])
+
+
+class StreamingTextSegmenter:
+    """
+    Incrementally splits streamed LLM text into segments which end at sentence or clause boundaries.
+    The first segment is kept short so that the synthesizer can start speaking early, later segments are larger.
+    """
+    def __init__(self, language="en", first_chunk_size=12, chunk_size=40, max_chunk_size=None):
+        self.rules = get_segmentation_rules(language)
+        self.first_chunk_size = first_chunk_size
+        self.chunk_size = max(chunk_size or 40, first_chunk_size)
+        # Only cut at a clause once the sentence gets long, and hard cut at whitespace if there's no punctuation at all
+        self.clause_flush_size = 2 * self.chunk_size
+        self.max_chunk_size = max_chunk_size if max_chunk_size is not None else 4 * self.chunk_size
+        self.buffer = ""
+        self.segments_emitted = 0
+
+    def reset(self):
+        self.buffer = ""
+        self.segments_emitted = 0
+
+    def _is_abbreviation(self, end):
+        if len(self.rules["abbreviations"]) == 0 or self.buffer[end - 1] != ".":
+            return False
+        word = self.buffer[:end - 1].split(" ")[-1].lower()
+        return word in self.rules["abbreviations"] or (len(word) == 1 and word.isalpha())
+
+    def _find_boundaries(self):
+        boundaries = []
+        buffer = self.buffer
+        for i, char in enumerate(buffer):
+            if char in self.rules["sentence_terminators"]:
+                kind = SENTENCE_BOUNDARY
+            elif char in self.rules["clause_terminators"]:
+                kind = CLAUSE_BOUNDARY
+            else:
+                continue
+
+            end = i + 1
+            # Swallow trailing terminators and closing quotes, e.g. `?!` or `."`
+            while end < len(buffer) and (buffer[end] in self.rules["sentence_terminators"] or buffer[end] in "\"')]”’"):
+                end += 1
+
+            if self.rules["requires_whitespace"]:
+                # We can't tell if `3.` is the end of a sentence or `3.5` until we see what follows
+                if end >= len(buffer) or not buffer[end].isspace():
+                    continue
+                if kind == SENTENCE_BOUNDARY and self._is_abbreviation(end):
+                    continue
+            boundaries.append((end, kind))
+        return boundaries
+
+    def _split_index(self):
+        min_size = self.first_chunk_size if self.segments_emitted == 0 else self.chunk_size
+        boundaries = [(end, kind) for end, kind in self._find_boundaries() if end >= min_size]
+
+        if self.segments_emitted == 0 and len(boundaries) > 0:
+            return boundaries[0][0]
+
+        sentence_boundaries = [end for end, kind in boundaries if kind == SENTENCE_BOUNDARY]
+        if len(sentence_boundaries) > 0:
+            return sentence_boundaries[0]
+
+        buffer_length = len(self.buffer)
+        if buffer_length >= self.clause_flush_size and len(boundaries) > 0:
+            return boundaries[-1][0]
+
+        hard_limit = self.chunk_size if self.segments_emitted == 0 else self.max_chunk_size
+        if buffer_length >= hard_limit:
+            last_space = self.buffer.rfind(" ", 0, buffer_length)
+            if last_space > 0:
+                return last_space
+            if not self.rules["requires_whitespace"]:
+                return buffer_length
+        return None
+
+    def push(self, text):
+        """Adds a chunk of streamed text and returns the list of segments which are ready to be synthesized"""
+        segments = []
+        if not text:
+            return segments
+        self.buffer += text
+        while True:
+            index = self._split_index()
+            if index is None:
+                break
+            segment = self.buffer[:index].strip()
+            self.buffer = self.buffer[index:].lstrip()
+            if segment != "":
+                segments.append(segment)
+                self.segments_emitted += 1
+        return segments
+
+    def flush(self):
+        """Returns whatever is left in the buffer at the end of the stream"""
+        segment = self.buffer.strip()
+        self.reset()
+        return segment
@@ -0,0 +1,32 @@
+import time
+from collections import defaultdict
+from bolna.helpers.logger_config import configure_logger
+
+logger = configure_logger(__name__)
+
+
+class LLMUsageLedger:
+    """
+    Records token usage of every LLM request made during a call, so that the cost of the call is a simple sum at the
+    end instead of replaying and re-tokenizing the transcript.
+    """
+    def __init__(self):
+        self.requests = []
+        self.usage = defaultdict(lambda: {"input": 0, "output": 0, "requests": 0})
+
+    def record(self, model, input_tokens, output_tokens, purpose="conversation", sequence_id=None):
+        input_tokens, output_tokens = input_tokens or 0, output_tokens or 0
+        self.requests.append({
+            "model": model,
+            "purpose": purpose,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "sequence_id": sequence_id,
+            "time": time.time()
+        })
+        self.usage[model]["input"] += input_tokens
+        self.usage[model]["output"] += output_tokens
+        self.usage[model]["requests"] += 1
+
+    def get_usage(self):
+        return {model: dict(usage) for model, usage in self.usage.items()}
@@ -10,23 +10,32 @@ import io
 import wave
 import numpy as np
 import aiofiles
-import torch
-import torchaudio
-from scipy.io import wavfile
 from botocore.exceptions import BotoCoreError, ClientError
 from aiobotocore.session import AioSession
 from contextlib import AsyncExitStack
 from dotenv import load_dotenv
 from pydantic import create_model
 from .logger_config import configure_logger
+from .lazy_import import lazy_import
+from .request_log_sink import REQUEST_LOG_CSV_HEADER, format_request_log_csv
+from .s3_disk_cache import get_s3_disk_cache
 from bolna.constants import PREPROCESS_DIR
-from pydub import AudioSegment
+
+# Heavy audio libraries are only loaded by the code paths that need them
+torch = lazy_import("torch")
+torchaudio = lazy_import("torchaudio")
+wavfile = lazy_import("scipy.io.wavfile")
+AudioSegment = lazy_import("pydub", "AudioSegment")
 
 logger = configure_logger(__name__)
 load_dotenv()
 BUCKET_NAME = os.getenv('BUCKET_NAME')
 RECORDING_BUCKET_NAME = os.getenv('RECORDING_BUCKET_NAME')
 RECORDING_BUCKET_URL = os.getenv('RECORDING_BUCKET_URL')
+# Cached agent configs are revalidated against S3 after this many seconds, audio is addressed by md5 and never is
+S3_CACHE_REVALIDATE_SECONDS = float(os.getenv('S3_CACHE_REVALIDATE_SECONDS', 30))
+# Audio is keyed by the md5 of its text, not of the audio, and regenerated under the same key when the voice changes
+S3_AUDIO_CACHE_REVALIDATE_SECONDS = float(os.getenv('S3_AUDIO_CACHE_REVALIDATE_SECONDS', 300))
 
 class DictWithMissing(dict):
     def __missing__(self, key):
@@ -132,6 +141,14 @@ async def get_s3_file(bucket_name, file_key):
             file_content = await response['Body'].read()
             return file_content
 
+
+async def get_cached_s3_file(bucket_name, file_key, max_age=None):
+    """get_s3_file through the local disk cache, see S3DiskCache.get for max_age"""
+    s3_disk_cache = get_s3_disk_cache()
+    if s3_disk_cache is None:
+        return await get_s3_file(bucket_name, file_key)
+    return await s3_disk_cache.get(bucket_name, file_key, max_age=max_age)
+
 async def delete_s3_file_by_prefix(bucket_name,file_key):
     session = AioSession()
     async with AsyncExitStack() as exit_stack:
@@ -168,7 +185,7 @@ async def store_file(bucket_name=None, file_key=None, file_data=None, content_ty
     if local:
         dir_name = PREPROCESS_DIR if preprocess_dir is None else preprocess_dir
         directory_path = os.path.join(dir_name, os.path.dirname(file_key))
-        logger.info(file_data)
+        logger.info(f"Storing {file_key} locally")
         os.makedirs(directory_path, exist_ok=True)
         if content_type == "json":
             logger.info(f"Writing to {dir_name}/{file_key} ")
@@ -176,7 +193,8 @@ async def store_file(bucket_name=None, file_key=None, file_data=None, content_ty
                 data = json.dumps(file_data)
                 f.write(data)
         elif content_type in ["mp3", "wav", "pcm", "csv"]:
-            with open(f"{dir_name}/{file_key}", 'w') as f:
+            mode = 'w' if content_type == "csv" else 'wb'
+            with open(f"{dir_name}/{file_key}", mode) as f:
                 data = file_data
                 f.write(data)
 
@@ -192,7 +210,7 @@ async def get_raw_audio_bytes_from_base64(agent_name, b64_string, audio_format='
     else:
         object_key = f"{assistant_id}/audio/{b64_string}.{audio_format}"
         logger.info(f"Reading {object_key}")
-        audio_data = await get_s3_file(BUCKET_NAME, object_key)
+        audio_data = await get_cached_s3_file(BUCKET_NAME, object_key, max_age=S3_AUDIO_CACHE_REVALIDATE_SECONDS)
 
     return audio_data
 
@@ -201,6 +219,22 @@ def get_md5_hash(text):
     return hashlib.md5(text.encode()).hexdigest()
 
 
+def get_conversation_fingerprint(messages, last_n_turns=3):
+    """
+    Rolling md5 over the system prompt, the last n turns and the latest user utterance.
+    The same utterance in a different conversation state gets a different fingerprint.
+    """
+    system_messages = [message for message in messages[:1] if message['role'] == 'system']
+    conversation = [message for message in messages if message['role'] != 'system']
+    # A turn is a user message and the assistant's reply, the last message is the new utterance
+    conversation = conversation[-(2 * last_n_turns + 1):]
+    fingerprint = ""
+    for message in system_messages + conversation:
+        content = " ".join(str(message['content']).lower().split())
+        fingerprint = get_md5_hash(f"{fingerprint}{message['role']}:{content}")
+    return fingerprint
+
+
 def is_valid_md5(hash_string):
     return bool(re.fullmatch(r"[0-9a-f]{32}", hash_string))
 
@@ -258,7 +292,7 @@ async def get_prompt_responses(assistant_id, local=False):
         key = f"{assistant_id}/conversation_details.json"
         logger.info(f"Loading up the conversation details from the s3 file BUCKET_NAME {BUCKET_NAME} {key}")
         try:
-            response = await get_s3_file(BUCKET_NAME, key)
+            response = await get_cached_s3_file(BUCKET_NAME, key, max_age=S3_CACHE_REVALIDATE_SECONDS)
             file_content = response.decode('utf-8')
             json_content = json.loads(file_content)
             return json_content
@@ -320,6 +354,25 @@ def yield_chunks_from_memory(audio_bytes, chunk_size=512):
         yield audio_bytes[i:i + chunk_size]
 
 
+async def yield_frames_from_stream(byte_stream, frame_size=1600, sample_width=2):
+    """
+    Re-chunks an async stream of bytes into frames of atleast frame_size bytes as they arrive.
+    Frames never split a sample and at most one frame worth of audio is buffered.
+    """
+    buffer = b''
+    async for chunk in byte_stream:
+        buffer += chunk
+        if len(buffer) < frame_size:
+            continue
+        frame_length = len(buffer) - (len(buffer) % sample_width)
+        yield buffer[:frame_length]
+        buffer = buffer[frame_length:]
+
+    frame_length = len(buffer) - (len(buffer) % sample_width)
+    if frame_length > 0:
+        yield buffer[:frame_length]
+
+
 def pcm_to_wav_bytes(pcm_data, sample_rate = 16000, num_channels = 1, sample_width = 2):
     buffer = io.BytesIO()
     bit_depth = 16 
@@ -400,20 +453,10 @@ Message type
 8. is_final
 '''
 async def write_request_logs(message, run_id):
-    component_details = [None, None, None, None, None]
+    # Writes a single row, calls go through the batched RequestLogSink instead
     logger.info(f"Message {message}")
-    row = [message['time'], message["component"], message["direction"], message["leg_id"], message['sequence_id'], message['model']]
-    if message["component"] == "llm":
-        component_details = [message['data'], message.get('input_tokens', 0), message.get('output_tokens', 0), None, None]
-    elif message["component"] == "transcriber":
-        component_details = [message['data'], None, None, None, message.get('is_final', False)]
-    elif message["component"] == "synthesizer":
-        component_details = [message['data'], None, None, len(message['data']), None]
-    
-    row = row + component_details
-    
-    header = "Time,Component,Direction,Leg ID,Sequence ID,Model,Data,Input Tokens,Output Tokens,Characters,Final Transcript\n"
-    log_string = ','.join(['"' + str(item).replace('"', '""') + '"' if item is not None else '' for item in row]) + '\n'    
+    header = REQUEST_LOG_CSV_HEADER
+    log_string = format_request_log_csv(message)
     log_dir = f"./logs/{run_id.split('#')[0]}"
     os.makedirs(log_dir, exist_ok=True) 
     log_file_path = f"{log_dir}/{run_id.split('#')[1]}.csv"
@@ -0,0 +1,43 @@
+import struct
+
+# Every binary frame is this header followed by the raw bytes: frame type, audio format and sequence id
+FRAME_HEADER = struct.Struct("!BBI")
+FRAME_TYPES = {"audio": 1}
+AUDIO_FORMATS = {"pcm": 1, "wav": 2, "mp3": 3, "mulaw": 4}
+FRAME_TYPE_NAMES = {value: key for key, value in FRAME_TYPES.items()}
+AUDIO_FORMAT_NAMES = {value: key for key, value in AUDIO_FORMATS.items()}
+
+
+def encode_frame(data, frame_type="audio", audio_format=None, sequence_id=None):
+    header = FRAME_HEADER.pack(FRAME_TYPES[frame_type], AUDIO_FORMATS.get(audio_format, 0), (sequence_id or 0) & 0xFFFFFFFF)
+    return header + data
+
+
+def decode_frame(frame):
+    """Returns the frame as a dict of type, format, sequence_id and data, format is None if it wasn't given"""
+    if len(frame) < FRAME_HEADER.size:
+        raise ValueError(f"Binary frame of {len(frame)} bytes is shorter than its header")
+    frame_type, audio_format, sequence_id = FRAME_HEADER.unpack_from(frame)
+    if frame_type not in FRAME_TYPE_NAMES:
+        raise ValueError(f"Unknown binary frame type {frame_type}")
+    return {"type": FRAME_TYPE_NAMES[frame_type], "format": AUDIO_FORMAT_NAMES.get(audio_format),
+            "sequence_id": sequence_id, "data": frame[FRAME_HEADER.size:]}
+
+
+class WebsocketFraming:
+    """
+    How audio travels on a dashboard websocket, shared by its input and output handlers. Audio is base64 inside JSON
+    until the client asks for binary frames with {"type": "config", "audio_framing": "binary"}, control messages and
+    text always stay JSON.
+    """
+    def __init__(self):
+        self.binary_audio = False
+
+    def negotiate(self, config):
+        """Applies the client's config message and returns the acknowledgement to send back"""
+        self.binary_audio = config.get("audio_framing") == "binary"
+        acknowledgement = {"type": "config", "audio_framing": "binary" if self.binary_audio else "json"}
+        if self.binary_audio:
+            acknowledgement["frame_header"] = {"struct": FRAME_HEADER.format, "frame_types": FRAME_TYPES,
+                                               "audio_formats": AUDIO_FORMATS}
+        return acknowledgement
@@ -1,3 +1,8 @@
-from .default import DefaultInputHandler
-from .telephony_providers.twilio import TwilioInputHandler
-from .telephony_providers.exotel import ExotelInputHandler
+from bolna.helpers.lazy_import import lazy_module_getattr
+
+# Handlers are imported on first access, see bolna.providers
+__getattr__ = lazy_module_getattr(__name__, {
+    "DefaultInputHandler": ".default",
+    "TwilioInputHandler": ".telephony_providers.twilio",
+    "ExotelInputHandler": ".telephony_providers.exotel",
+})
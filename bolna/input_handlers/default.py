@@ -6,14 +6,17 @@ import base64
 import time
 from dotenv import load_dotenv
 from bolna.helpers.logger_config import configure_logger
+from bolna.helpers import json_codec
 from bolna.helpers.utils import create_ws_data_packet
+from bolna.helpers.ws_framing import decode_frame
 
 logger = configure_logger(__name__)
 load_dotenv()
 
 
 class DefaultInputHandler:
-    def __init__(self, queues=None, websocket=None, input_types=None, mark_set = None, queue = None, connected_through_dashboard=False, conversation_recording = None):
+    def __init__(self, queues=None, websocket=None, input_types=None, mark_set = None, queue = None, connected_through_dashboard=False, conversation_recording = None,
+                 framing=None):
         self.queues = queues
         self.websocket = websocket
         self.input_types = input_types
@@ -22,6 +25,9 @@ class DefaultInputHandler:
         self.connected_through_dashboard = connected_through_dashboard
         self.queue = queue
         self.conversation_recording = conversation_recording
+        # Shared with the output handler, switched to binary audio frames when the client asks for them
+        self.framing = framing
+
     async def stop_handler(self):
         self.running = False
         try:
@@ -30,8 +36,7 @@ class DefaultInputHandler:
         except Exception as e:
             logger.error(f"Error closing WebSocket: {e}")
 
-    def __process_audio(self, audio):
-        data = base64.b64decode(audio)
+    def __process_audio(self, data):
         ws_data_packet = create_ws_data_packet(
             data=data,
             meta_info={
@@ -67,7 +72,16 @@ class DefaultInputHandler:
                     logger.info(f"self.queue is not None and hence listening to the queue")
                     request = await self.queue.get()
                 else:
-                    request = await self.websocket.receive_json()                    
+                    message = await self.websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        raise Exception(f"Websocket disconnected with code {message.get('code')}")
+                    if message.get("bytes") is not None:
+                        # Binary frames only ever carry audio
+                        frame = decode_frame(message["bytes"])
+                        if 'audio' in self.input_types or self.connected_through_dashboard:
+                            self.__process_audio(frame["data"])
+                        continue
+                    request = json_codec.loads(message["text"])
                 await self.process_message(request)
         except Exception as e:
             # Send EOS message to transcriber to shut the connection
@@ -84,12 +98,17 @@ class DefaultInputHandler:
             return
 
     async def process_message(self, message):
+        if message['type'] == 'config':
+            if self.framing is not None and self.queue is None:
+                await self.websocket.send_text(json_codec.dumps(self.framing.negotiate(message)))
+            return
+
         if message['type'] not in self.input_types.keys() and not self.connected_through_dashboard:
             logger.info(f"straight away returning")
             return {"message": "invalid input type"}
 
         if message['type'] == 'audio':
-            self.__process_audio(message['data'])
+            self.__process_audio(base64.b64decode(message['data']))
 
         elif message["type"] == "text":
             logger.info(f"Received text: {message['data']}")
@@ -5,9 +5,10 @@ import uvloop
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 import base64
-import json
 from dotenv import load_dotenv
 from bolna.helpers.utils import create_ws_data_packet
+from bolna.helpers import json_codec
+from bolna.helpers.jitter_buffer import JitterBuffer
 from bolna.helpers.logger_config import configure_logger
 
 logger = configure_logger(__name__)
@@ -19,11 +20,9 @@ class TelephonyInputHandler(DefaultInputHandler):
         super().__init__(queues, websocket, input_types, connected_through_dashboard)
         self.stream_sid = None
         self.call_sid = None
-        self.buffer = []
-        self.message_count = 0
         self.mark_set = mark_set
-        self.last_media_received = 0
         self.io_provider = None
+        self.jitter_buffer = None
 
     async def call_start(self, packet):
         pass
@@ -47,43 +46,40 @@ class TelephonyInputHandler(DefaultInputHandler):
         ws_data_packet = create_ws_data_packet(data=audio_data, meta_info=meta_info)
         self.queues['transcriber'].put_nowait(ws_data_packet)
 
+    def __get_audio_meta_info(self):
+        return {
+            'io': self.io_provider,
+            'call_sid': self.call_sid,
+            'stream_sid': self.stream_sid,
+            'sequence': self.input_types['audio']
+        }
+
+    async def __flush_jitter_buffer(self):
+        """Sends whatever the jitter buffer still holds, the caller's last words, before the call's EOS"""
+        final_batch = self.jitter_buffer.flush()
+        if final_batch is not None:
+            await self.ingest_audio(final_batch, self.__get_audio_meta_info())
+
     async def _listen(self):
-        buffer = []
+        # Twilio streams mulaw, Exotel 16 bit linear PCM, both at 8khz
+        self.jitter_buffer = JitterBuffer(encoding="mulaw" if self.io_provider == "twilio" else "linear16")
         while True:
             try:
                 message = await self.websocket.receive_text()
 
-                packet = json.loads(message)
+                # Media events skip full parsing, they're 50 a second
+                media_data = json_codec.extract_media(message)
+                packet = {'event': 'media', 'media': media_data} if media_data is not None else json_codec.loads(message)
                 if packet['event'] == 'start':
                     await self.call_start(packet)
                 elif packet['event'] == 'media':
                     media_data = packet['media']
                     media_audio = base64.b64decode(media_data['payload'])
-                    media_ts = int(media_data["timestamp"])
 
                     if 'chunk' in packet['media'] or ('track' in packet['media'] and packet['media']['track'] == 'inbound'):
-                        meta_info = {
-                            'io': self.io_provider,
-                            'call_sid': self.call_sid,
-                            'stream_sid': self.stream_sid,
-                            'sequence': self.input_types['audio']
-                        }
-                        '''
-                        if self.last_media_received + 20 < media_ts:
-                            bytes_to_fill = 8 * (media_ts - (self.last_media_received + 20))
-                            logger.info(f"Filling {bytes_to_fill} bytes of silence")
-                            #await self.ingest_audio(b"\xff" * bytes_to_fill, meta_info)
-                        '''
-                        self.last_media_received = media_ts
-                        buffer.append(media_audio)
-                        self.message_count += 1
-
-                        # Send 100 ms of audio to deepgram
-                        if self.message_count == 10:
-                            merged_audio = b''.join(buffer)
-                            buffer = []
-                            await self.ingest_audio(merged_audio, meta_info)
-                            self.message_count = 0
+                        meta_info = self.__get_audio_meta_info()
+                        for batch in self.jitter_buffer.push(media_audio, media_data.get("timestamp")):
+                            await self.ingest_audio(batch, meta_info)
                     else:
                         logger.info("Getting media elements but not inbound media")
 
@@ -91,13 +87,18 @@ class TelephonyInputHandler(DefaultInputHandler):
                     await self.process_mark_message(packet)
 
                 elif packet['event'] == 'stop':
-                    logger.info('call stopping')
+                    await self.__flush_jitter_buffer()
+                    logger.info(f'call stopping, inbound audio {self.jitter_buffer.get_stats()}')
                     ws_data_packet = create_ws_data_packet(data=None, meta_info={'io': 'default', 'eos': True})
                     self.queues['transcriber'].put_nowait(ws_data_packet)
                     break
 
             except Exception as e:
                 traceback.print_exc()
+                try:
+                    await self.__flush_jitter_buffer()
+                except Exception as flush_error:
+                    logger.error(f'Could not flush the jitter buffer: {flush_error}')
                 ws_data_packet = create_ws_data_packet(
                     data=None,
                     meta_info={
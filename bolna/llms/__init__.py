@@ -1,2 +1,8 @@
-from .openai_llm import OpenAiLLM
-from .litellm import LiteLLM
+from bolna.helpers.lazy_import import lazy_module_getattr
+
+# LLMs are imported on first access so that litellm is only loaded by agents which use it
+__getattr__ = lazy_module_getattr(__name__, {
+    "OpenAiLLM": ".openai_llm",
+    "LiteLLM": ".litellm",
+    "LLMRouter": ".llm_router",
+})
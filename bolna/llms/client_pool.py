@@ -0,0 +1,36 @@
+import os
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from bolna.helpers.logger_config import configure_logger
+
+logger = configure_logger(__name__)
+load_dotenv()
+
+# Shared across every call handled by this process
+_http_client = None
+_openai_clients = {}
+
+
+def get_http_client():
+    """One pooled HTTP client per process, limits can be tuned for high call counts through the environment"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        limits = httpx.Limits(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20)),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", 30))
+        )
+        timeout = httpx.Timeout(float(os.getenv("LLM_REQUEST_TIMEOUT", 60)), connect=5.0)
+        logger.info(f"Creating shared LLM http client with {limits}")
+        _http_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+    return _http_client
+
+
+def get_openai_client(api_key, base_url=None):
+    """Returns the AsyncOpenAI client for the given base url and key, all of them share the same connection pool"""
+    http_client = get_http_client()
+    client_key = (base_url, api_key)
+    if client_key not in _openai_clients or _openai_clients[client_key][1] is not http_client:
+        _openai_clients[client_key] = (AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client), http_client)
+    return _openai_clients[client_key][0]
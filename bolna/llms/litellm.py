@@ -1,7 +1,9 @@
 import os
+from types import MappingProxyType
 import litellm
 from dotenv import load_dotenv
 from .llm import BaseLLM
+from .client_pool import get_http_client
 from bolna.helpers.utils import json_to_pydantic_schema
 from bolna.helpers.logger_config import configure_logger
 import time
@@ -13,88 +15,96 @@ load_dotenv()
 class LiteLLM(BaseLLM):
     def __init__(self, streaming_model, max_tokens=30, buffer_size=40,
                  classification_model=None, temperature=0.0, **kwargs):
-        super().__init__(max_tokens, buffer_size)
+        super().__init__(max_tokens, buffer_size, language=kwargs.get("language", "en"))
         self.model = streaming_model
         self.started_streaming = False
-        self.model_args = {"max_tokens": max_tokens, "temperature": temperature, "model": self.model}
+        model_args = {"max_tokens": max_tokens, "temperature": temperature, "model": self.model}
 
         self.api_key = kwargs.get("llm_key", os.getenv('LITELLM_MODEL_API_KEY'))
         self.api_base = kwargs.get("base_url", os.getenv('LITELLM_MODEL_API_BASE'))
         self.api_version = kwargs.get("api_version", os.getenv('LITELLM_MODEL_API_VERSION'))
         if self.api_key:
-            self.model_args["api_key"] = self.api_key
+            model_args["api_key"] = self.api_key
         if self.api_base:
-            self.model_args["api_base"] = self.api_base
+            model_args["api_base"] = self.api_base
         if self.api_version:
-            self.model_args["api_version"] = self.api_version
+            model_args["api_version"] = self.api_version
 
         if "top_k" in kwargs:
-            self.model_args["top_k"] = kwargs["top_k"]
+            model_args["top_k"] = kwargs["top_k"]
         if "top_p" in kwargs:
-            self.model_args["top_p"] = kwargs["top_p"]
+            model_args["top_p"] = kwargs["top_p"]
         if "stop" in kwargs:
-            self.model_args["stop"] = kwargs["stop"]
+            model_args["stop"] = kwargs["stop"]
         if "presence_penalty" in kwargs:
-            self.model_args["presence_penalty"] = kwargs["presence_penalty"]
+            model_args["presence_penalty"] = kwargs["presence_penalty"]
         if "frequency_penalty" in kwargs:
-            self.model_args["frequency_penalty"] = kwargs["frequency_penalty"]
+            model_args["frequency_penalty"] = kwargs["frequency_penalty"]
 
         if len(kwargs) != 0:
             if "base_url" in kwargs:
-                self.model_args["api_base"] = kwargs["base_url"]
+                model_args["api_base"] = kwargs["base_url"]
             if "llm_key" in kwargs:
-                self.model_args["api_key"] = kwargs["llm_key"]
+                model_args["api_key"] = kwargs["llm_key"]
             if "api_version" in kwargs:
-                self.model_args["api_version"] = kwargs["api_version"]
+                model_args["api_version"] = kwargs["api_version"]
+        # Read only, every request builds its own arguments on top of these
+        self.model_args = MappingProxyType(model_args)
         self.classification_model = classification_model
 
+        # litellm's openai compatible providers go through this session, share the process wide connection pool
+        if litellm.aclient_session is None:
+            litellm.aclient_session = get_http_client()
+
     async def generate_stream(self, messages, synthesize=True):
-        answer, buffer = "", ""
-        model_args = self.model_args.copy()
-        model_args["messages"] = messages
-        model_args["stream"] = True
+        start_time = time.time()
+        async for text_chunk, end_of_stream in self.segment_stream(self.stream_tokens(messages), synthesize=synthesize):
+            if not self.started_streaming:
+                self.started_streaming = True
+            yield text_chunk, end_of_stream
+        self.started_streaming = False
+        logger.info(f"Time to generate response {time.time() - start_time}")
+
+    async def stream_tokens(self, messages, request_json=False, classification_task=False):
+        """Raw text chunks as the model produces them"""
+        model_args = {**self.model_args, "messages": messages, "stream": True}
+        if classification_task and self.classification_model is not None:
+            model_args["model"] = self.classification_model
+        if request_json:
+            # The conversational max_tokens and stop would cut the JSON short
+            model_args.pop("max_tokens", None)
+            model_args.pop("stop", None)
+            model_args["response_format"] = self.get_json_response_format()
 
         logger.info(f"request to model: {self.model}: {messages}")
-        start_time = time.time()
         async for chunk in await litellm.acompletion(**model_args):
             if (text_chunk := chunk['choices'][0]['delta'].content) and not chunk['choices'][0].finish_reason:
-                answer += text_chunk
-                buffer += text_chunk
-
-                if len(buffer) >= self.buffer_size and synthesize:
-                    text = ' '.join(buffer.split(" ")[:-1])
-
-                    if synthesize:
-                        if not self.started_streaming:
-                            self.started_streaming = True
-                        yield text, False
-                    buffer = buffer.split(" ")[-1]
-
-        if synthesize:
-            if buffer != "":
-                yield buffer, True
-        else:
-            yield answer, True
-        self.started_streaming = False
-        logger.info(f"Time to generate response {time.time() - start_time}")
+                yield text_chunk
 
     async def generate(self, messages, classification_task=False, stream=False, synthesize=True, request_json=False):
         text = ""
-        model_args = self.model_args.copy()
-        model_args["model"] = self.classification_model if classification_task is True else self.model
-        model_args["messages"] = messages
-        model_args["stream"] = stream
+        model_args = {
+            **self.model_args,
+            "model": self.classification_model if classification_task is True else self.model,
+            "messages": messages,
+            "stream": stream
+        }
 
         if request_json is True:
-            model_args['response_format'] = {
-                "type": "json_object",
-                "schema": json_to_pydantic_schema('{"classification_label": "classification label goes here"}')
-            }
+            model_args['response_format'] = self.get_json_response_format()
         logger.info(f'Request to litellm {model_args}')
         try:
             completion = await litellm.acompletion(**model_args)
             text = completion.choices[0].message.content
-            logger.error(completion)
+            logger.info(completion)
+            self.record_usage(model_args["model"], getattr(completion, "usage", None),
+                              purpose="classification" if classification_task else "generation")
         except Exception as e:
             logger.error(f'Error generating response {e}')
         return text
+
+    def get_json_response_format(self):
+        return {
+            "type": "json_object",
+            "schema": json_to_pydantic_schema('{"classification_label": "classification label goes here"}')
+        }
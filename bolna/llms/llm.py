@@ -1,15 +1,97 @@
+import json
+import time
 from bolna.helpers.logger_config import configure_logger
+from bolna.helpers.text_segmenter import StreamingTextSegmenter
+from bolna.helpers.streaming_json_parser import StreamingJsonParser
+from bolna.helpers.utils import clean_json_string
 
 logger = configure_logger(__name__)
 
 
 class BaseLLM:
-    def __init__(self, max_tokens=100, buffer_size=40):
+    def __init__(self, max_tokens=100, buffer_size=40, language="en", first_chunk_size=12):
         self.buffer_size = buffer_size
         self.max_tokens = max_tokens
+        self.language = language
+        self.first_chunk_size = first_chunk_size
+        # Set by the task manager to account token usage of every request
+        self.usage_ledger = None
+        self.__token_counter = None
+
+    def record_usage(self, model, usage, purpose="conversation"):
+        if self.usage_ledger is None or usage is None:
+            return
+        self.usage_ledger.record(model, getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0), purpose)
+
+    def record_streamed_usage(self, model, messages, response, purpose="conversation"):
+        # Streamed responses don't report usage and hence counting what was sent and received
+        if self.usage_ledger is None:
+            return
+        if self.__token_counter is None:
+            from bolna.helpers.context_window_manager import ContextWindowManager
+            self.__token_counter = ContextWindowManager(model=model)
+        self.usage_ledger.record(model, self.__token_counter.count_tokens(messages),
+                                 self.__token_counter.count_text_tokens(response), purpose)
+
+    async def stream_tokens(self, messages, request_json=False, classification_task=False):
+        pass
+
+    async def generate_keys(self, messages, keys=None, classification_task=True):
+        """
+        Streams a JSON response and returns the parsed top level keys as soon as all of the given keys are complete,
+        the rest of the generation is cancelled. Returns the whole object if keys is None.
+        """
+        parser = StreamingJsonParser(keys)
+        start_time = time.time()
+        stream = self.stream_tokens(messages, request_json=True, classification_task=classification_task)
+        try:
+            async for text_chunk in stream:
+                parser.feed(text_chunk)
+                if parser.is_done():
+                    break
+        finally:
+            await stream.aclose()
+        logger.info(f"Parsed {list(parser.values.keys())} in {time.time() - start_time}")
+        model = self.classification_model if classification_task else self.model
+        self.record_streamed_usage(model, messages, parser.buffer, purpose="classification" if classification_task else "generation")
+
+        if not parser.is_done():
+            # Not a single JSON object, let json raise a proper error if it's not parseable at all
+            return json.loads(clean_json_string(parser.buffer.strip()))
+        return parser.values
 
     async def respond_back_with_filler(self, messages):
         pass
 
     async def generate(self, messages, stream=True, classification_task=False, synthesize=True):
         pass
+
+    def get_text_segmenter(self):
+        # Override to plug in a different segmentation strategy
+        return StreamingTextSegmenter(language=self.language, first_chunk_size=self.first_chunk_size,
+                                      chunk_size=self.buffer_size)
+
+    async def segment_stream(self, text_stream, synthesize=True):
+        """
+        Converts a stream of raw text chunks from the LLM into (text, end_of_stream) tuples.
+        When synthesizing, text is yielded at sentence/clause boundaries, otherwise the whole answer is yielded at the end.
+        """
+        answer = ""
+        segmenter = self.get_text_segmenter()
+        start_time = time.time()
+        first_segment_sent = False
+        async for text_chunk in text_stream:
+            answer += text_chunk
+            if not synthesize:
+                continue
+
+            for segment in segmenter.push(text_chunk):
+                if not first_segment_sent:
+                    first_segment_sent = True
+                    logger.info(f"Time to first segment {time.time() - start_time}")
+                yield segment, False
+
+        if synthesize:  # This is used only in streaming sense
+            yield segmenter.flush(), True
+        else:
+            yield answer, True
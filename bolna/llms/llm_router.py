@@ -0,0 +1,134 @@
+import asyncio
+import time
+from collections import deque
+from .llm import BaseLLM
+from bolna.helpers.logger_config import configure_logger
+
+logger = configure_logger(__name__)
+
+
+class LLMRouter(BaseLLM):
+    """
+    Sends every request to the primary LLM and hedges it to the fallback LLM if the primary fails or doesn't produce
+    its first token within the deadline. Whichever model answers first is streamed and the other request is cancelled.
+    """
+    def __init__(self, primary_llm, fallback_llm, first_token_deadline=1.5, window_size=50):
+        self.primary_llm = primary_llm
+        self.fallback_llm = fallback_llm
+        super().__init__(primary_llm.max_tokens, primary_llm.buffer_size, language=primary_llm.language,
+                         first_chunk_size=primary_llm.first_chunk_size)
+        self.model = primary_llm.model
+        self.classification_model = primary_llm.classification_model
+        self.first_token_deadline = first_token_deadline
+        self.started_streaming = False
+        # Model which served the last request, usage is accounted against it
+        self.last_model = self.model
+        self.hedged_requests = 0
+        self.wins = {"primary": 0, "fallback": 0}
+        self.latencies = {"primary": deque(maxlen=window_size), "fallback": deque(maxlen=window_size)}
+
+    @property
+    def usage_ledger(self):
+        return self.primary_llm.usage_ledger
+
+    @usage_ledger.setter
+    def usage_ledger(self, usage_ledger):
+        self.primary_llm.usage_ledger = usage_ledger
+        self.fallback_llm.usage_ledger = usage_ledger
+
+    def __get_llm(self, name):
+        return self.primary_llm if name == "primary" else self.fallback_llm
+
+    async def __timed(self, name, call):
+        start_time = time.time()
+        result = await call(self.__get_llm(name))
+        self.latencies[name].append(time.time() - start_time)
+        return result
+
+    @staticmethod
+    def __release_loser(task, release):
+        if not task.cancelled() and task.exception() is None:
+            asyncio.ensure_future(release(task.result()))
+
+    async def __race(self, call, release=None):
+        """
+        Awaits call(primary_llm) and starts call(fallback_llm) if the primary misses the deadline or fails.
+        Returns the name of the winner along with its result, the loser is cancelled. A loser which got its result
+        anyway, e.g. when both finished together, has it passed to release so that a stream it opened gets closed.
+        """
+        pending = {asyncio.create_task(self.__timed("primary", call)): "primary"}
+        done, _ = await asyncio.wait(pending.keys(), timeout=self.first_token_deadline)
+        hedged = False
+        error = None
+        try:
+            while True:
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is None:
+                        self.wins[name] += 1
+                        self.last_model = self.__get_llm(name).model
+                        if name == "fallback":
+                            logger.info(f"Fallback LLM {self.fallback_llm.model} answered first")
+                        return name, task.result()
+                    error = task.exception()
+                    logger.error(f"{name} LLM request failed {error}")
+
+                if not hedged:
+                    hedged = True
+                    self.hedged_requests += 1
+                    logger.info(f"Primary LLM {self.model} failed or missed the deadline of {self.first_token_deadline}s, hedging to {self.fallback_llm.model}")
+                    pending[asyncio.create_task(self.__timed("fallback", call))] = "fallback"
+                elif len(pending) == 0:
+                    raise error
+
+                done, _ = await asyncio.wait(pending.keys(), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+                if release is not None:
+                    # Runs right away for a task that's already done, cancel() can't stop that one
+                    task.add_done_callback(lambda loser: self.__release_loser(loser, release))
+
+    @staticmethod
+    async def __open_stream(llm, messages, request_json, classification_task):
+        stream = llm.stream_tokens(messages, request_json, classification_task)
+        try:
+            return stream, await stream.__anext__()
+        except StopAsyncIteration:
+            return stream, None
+
+    async def stream_tokens(self, messages, request_json=False, classification_task=False):
+        _, (stream, first_token) = await self.__race(lambda llm: self.__open_stream(llm, messages, request_json, classification_task),
+                                                     release=lambda loser: loser[0].aclose())
+        if first_token is None:
+            return
+        try:
+            yield first_token
+            async for text_chunk in stream:
+                yield text_chunk
+        finally:
+            await stream.aclose()
+
+    async def generate_stream(self, messages, synthesize=True, request_json=False):
+        async for text_chunk, end_of_stream in self.segment_stream(self.stream_tokens(messages, request_json), synthesize=synthesize):
+            if not self.started_streaming:
+                self.started_streaming = True
+            yield text_chunk, end_of_stream
+        self.started_streaming = False
+
+    async def generate(self, messages, classification_task=False, stream=False, synthesize=True, request_json=False):
+        _, response = await self.__race(lambda llm: llm.generate(messages, classification_task=classification_task, stream=stream,
+                                                                synthesize=synthesize, request_json=request_json))
+        return response
+
+    async def generate_keys(self, messages, keys=None, classification_task=True):
+        _, response = await self.__race(lambda llm: llm.generate_keys(messages, keys=keys, classification_task=classification_task))
+        return response
+
+    def get_stats(self):
+        return {
+            "hedged_requests": self.hedged_requests,
+            "wins": self.wins,
+            "latency": {name: round(sum(samples) / len(samples), 4) if len(samples) > 0 else None
+                        for name, samples in self.latencies.items()}
+        }
@@ -1,8 +1,9 @@
 import os
+from types import MappingProxyType
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
 
 from .llm import BaseLLM
+from .client_pool import get_openai_client
 from bolna.helpers.logger_config import configure_logger
 
 logger = configure_logger(__name__)
@@ -12,7 +13,7 @@ load_dotenv()
 class OpenAiLLM(BaseLLM):
     def __init__(self, max_tokens=100, buffer_size=40, streaming_model="gpt-3.5-turbo-16k",
                  classification_model="gpt-3.5-turbo-1106", temperature= 0.1, **kwargs):
-        super().__init__(max_tokens, buffer_size)
+        super().__init__(max_tokens, buffer_size, language=kwargs.get("language", "en"))
         self.model = streaming_model
         self.started_streaming = False
         logger.info(f"Initializing OpenAI LLM with model: {self.model} and maxc tokens {max_tokens}")
@@ -20,20 +21,20 @@ class OpenAiLLM(BaseLLM):
         self.classification_model = classification_model
         self.temperature = temperature
         self.vllm_model = "vllm" in self.model
-        self.model_args = { "max_tokens": self.max_tokens, "temperature": self.temperature, "model": self.model}
+        model_args = { "max_tokens": self.max_tokens, "temperature": self.temperature, "model": self.model}
 
         if self.vllm_model:
             base_url = kwargs.get("base_url", os.getenv("VLLM_SERVER_BASE_URL"))
             api_key=kwargs.get('llm_key', None)
-            if len(api_key) > 0:
+            if api_key is not None and len(api_key) > 0:
                 api_key = api_key
             else:
                 api_key = "EMPTY"
-            self.async_client = AsyncOpenAI( base_url=base_url, api_key= api_key)
+            self.async_client = get_openai_client(api_key, base_url=base_url)
             self.model = self.model[5:]
-            self.model_args["model"] = self.model
+            model_args["model"] = self.model
             if "top_k" in kwargs:
-                self.model_args["top_k"] = kwargs["top_k"]
+                model_args["top_k"] = kwargs["top_k"]
             logger.info(f"Using VLLM model base_url {base_url} and model {self.model} and api key {api_key}")
         else:
             llm_key = kwargs.get('llm_key', os.getenv('OPENAI_API_KEY'))
@@ -41,50 +42,62 @@ class OpenAiLLM(BaseLLM):
                 llm_key = os.getenv('OPENAI_API_KEY')
             else:
                 llm_key = kwargs['llm_key']
-            self.async_client = AsyncOpenAI(api_key=llm_key)
+            self.async_client = get_openai_client(llm_key)
         
         if "top_p" in kwargs:
-            self.model_args["top_p"] = kwargs["top_p"]
+            model_args["top_p"] = kwargs["top_p"]
         if "stop" in kwargs:
-            self.model_args["stop"] = kwargs["stop"]        
+            model_args["stop"] = kwargs["stop"]        
         if "presence_penalty" in kwargs:
-            self.model_args["presence_penalty"] = kwargs["presence_penalty"]
+            model_args["presence_penalty"] = kwargs["presence_penalty"]
         if  "frequency_penalty" in kwargs:
-            self.model_args["frequency_penalty"] = kwargs["frequency_penalty"]
+            model_args["frequency_penalty"] = kwargs["frequency_penalty"]
+        # Read only, every request builds its own arguments on top of these so concurrent requests can't leak into each other
+        self.model_args = MappingProxyType(model_args)
 
     async def generate_stream(self, messages, classification_task=False, synthesize=True, request_json=False):
         if len(messages) == 0:
             raise Exception("No messages provided")
-        
-        response_format = self.get_response_format(request_json)
-
-        answer, buffer = "", ""
-        model = self.classification_model if classification_task is True else self.model
-        logger.info(f"request to open ai {messages} max tokens {self.max_tokens} ")
-        model_args = self.model_args
-        model_args["response_format"] = response_format
-        model_args["messages"] = messages
-        model_args["stream"] = True
-        model_args["stop"] = ["User:"]
-        async for chunk in await self.async_client.chat.completions.create(**model_args):
-            if text_chunk := chunk.choices[0].delta.content:
-                answer += text_chunk
-                buffer += text_chunk
 
-                if len(buffer) >= self.buffer_size and synthesize:
-                    buffer_words = buffer.split(" ")
-                    text = ' '.join(buffer_words[:-1])
-
-                    if not self.started_streaming:
-                        self.started_streaming = True
-                    yield text, False
-                    buffer = buffer_words[-1]
+        async for text_chunk, end_of_stream in self.segment_stream(self.stream_tokens(messages, request_json), synthesize=synthesize):
+            if not self.started_streaming:
+                self.started_streaming = True
+            yield text_chunk, end_of_stream
+        self.started_streaming = False
 
-        if synthesize: # This is used only in streaming sense 
-            yield buffer, True
+    async def stream_tokens(self, messages, request_json=False, classification_task=False):
+        """Raw text chunks as the model produces them"""
+        response_format = self.get_response_format(request_json)
+        if request_json:
+            # Same arguments as generate, the conversational max_tokens and stop would cut the JSON short
+            logger.info(f"request to open ai {messages}")
+            model_args = {
+                "model": self.classification_model if classification_task else self.model,
+                "temperature": 0.0,
+                "response_format": response_format,
+                "messages": messages,
+                "stream": True
+            }
         else:
-            yield answer, True
-        self.started_streaming = False
+            logger.info(f"request to open ai {messages} max tokens {self.max_tokens} ")
+            model_args = {
+                **self.model_args,
+                "response_format": response_format,
+                "messages": messages,
+                "stream": True,
+                "stop": self.model_args.get("stop") or ["User:"]
+            }
+            if classification_task:
+                model_args["model"] = self.classification_model
+                model_args["temperature"] = 0.0
+        completion_stream = await self.async_client.chat.completions.create(**model_args)
+        try:
+            async for chunk in completion_stream:
+                if text_chunk := chunk.choices[0].delta.content:
+                    yield text_chunk
+        finally:
+            # When the consumer stops early, drop the connection instead of reading the rest of the generation
+            await completion_stream.response.aclose()
 
     async def generate(self, messages, classification_task=False, stream=False, synthesize=True, request_json=False):
         response_format = self.get_response_format(request_json)
@@ -94,6 +107,7 @@ class OpenAiLLM(BaseLLM):
         completion = await self.async_client.chat.completions.create(model=model, temperature=0.0, messages=messages,
                                                                      stream=False, response_format=response_format)
         res = completion.choices[0].message.content
+        self.record_usage(model, completion.usage, purpose="classification" if classification_task else "generation")
         return res
 
     def get_response_format(self, is_json_format: bool):
@@ -1 +1,4 @@
-from .inmemory_scalar_cache import InmemoryScalarCache
\ No newline at end of file
+from .inmemory_scalar_cache import InmemoryScalarCache
+from .conversation_response_cache import ConversationResponseCache
+from .vector_cache import VectorCache
+from bolna.helpers.embeddings import BaseEmbedding, HashedNgramEmbedding
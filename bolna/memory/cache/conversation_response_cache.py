@@ -0,0 +1,42 @@
+from collections import defaultdict
+from .BaseCache import BaseCache
+from .inmemory_scalar_cache import InmemoryScalarCache
+from bolna.helpers.logger_config import configure_logger
+from bolna.helpers.utils import get_conversation_fingerprint
+
+logger = configure_logger(__name__)
+
+
+class ConversationResponseCache(BaseCache):
+    """
+    Caches the streamed LLM response, i.e. the list of (text_chunk, end_of_llm_stream) tuples, keyed by a fingerprint of
+    the conversation state. Hit and miss counts are kept per agent.
+    """
+    def __init__(self, cache=None, last_n_turns=3, ttl=-1):
+        self.cache = cache if cache is not None else InmemoryScalarCache(ttl=ttl)
+        self.last_n_turns = last_n_turns
+        self.stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    def get_fingerprint(self, messages, agent_id=None):
+        fingerprint = get_conversation_fingerprint(messages, self.last_n_turns)
+        return fingerprint if agent_id is None else f"{agent_id}#{fingerprint}"
+
+    def get(self, key, agent_id=None):
+        response = self.cache.get(key)
+        if response is None:
+            self.stats[agent_id]["misses"] += 1
+        else:
+            self.stats[agent_id]["hits"] += 1
+        return response
+
+    def set(self, key, value):
+        self.cache.set(key, list(value))
+
+    def get_stats(self, agent_id=None):
+        stats = self.stats[agent_id]
+        total = stats["hits"] + stats["misses"]
+        return {
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "hit_ratio": round(stats["hits"] / total, 4) if total > 0 else 0
+        }
@@ -26,6 +26,6 @@ class InmemoryScalarCache(BaseCache):
         self.ttl_dict[key] = time.time() + self.ttl
     
     def flush_cache(self):
-        self.cache_dict.clear()
+        self.data_dict.clear()
         self.ttl_dict.clear()
 
@@ -0,0 +1,125 @@
+import numpy as np
+from .BaseCache import BaseCache
+from bolna.helpers.embeddings import normalize_text, HashedNgramEmbedding
+from bolna.helpers.logger_config import configure_logger
+
+logger = configure_logger(__name__)
+
+
+class VectorCache(BaseCache):
+    """
+    Semantic cache which stores normalised utterance embeddings in one contiguous matrix and looks them up with a
+    vectorised cosine similarity. Entries only match lookups of the same scope, e.g. the agent and conversation state
+    they were cached in. Once full, the least recently used entry is evicted.
+    """
+    def __init__(self, embedding_model=None, capacity=1000, similarity_threshold=0.8, top_k=3, min_key_words=3):
+        self.embedding_model = embedding_model if embedding_model is not None else HashedNgramEmbedding()
+        self.capacity = capacity
+        self.similarity_threshold = similarity_threshold
+        self.top_k = top_k
+        # Short utterances like "yes" or "okay" mean different things in different conversations
+        self.min_key_words = min_key_words
+        self.embeddings = np.zeros((capacity, self.embedding_model.dimension), dtype=np.float32)
+        self.keys = [None] * capacity
+        self.values = [None] * capacity
+        self.key_to_index = {}
+        # Scopes are numbered so that the lookup can mask other scopes' rows without a python loop
+        self.scope_ids = {}
+        self.next_scope_id = 0
+        self.entry_scopes = np.full(capacity, -1, dtype=np.int64)
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __tick(self):
+        self.clock += 1
+        return self.clock
+
+    def __get_scope_id(self, scope):
+        if scope not in self.scope_ids:
+            if len(self.scope_ids) >= 4 * self.capacity:
+                self.__compact_scopes()
+            self.scope_ids[scope] = self.next_scope_id
+            self.next_scope_id += 1
+        return self.scope_ids[scope]
+
+    def __compact_scopes(self):
+        """Forgets the scopes which no longer have any entries"""
+        live_scope_ids = set(self.entry_scopes[:self.size].tolist())
+        self.scope_ids = {scope: scope_id for scope, scope_id in self.scope_ids.items() if scope_id in live_scope_ids}
+
+    def __nearest(self, key, top_k, scope=None):
+        scope_id = self.scope_ids.get(scope)
+        if self.size == 0 or scope_id is None:
+            return [], None
+        query = self.embedding_model.embed([key])[0]
+        # Rows are unit vectors and hence the dot product is the cosine similarity
+        similarities = self.embeddings[:self.size] @ query
+        similarities[self.entry_scopes[:self.size] != scope_id] = -np.inf
+        k = min(top_k, self.size)
+        candidates = np.argpartition(-similarities, k - 1)[:k]
+        candidates = candidates[np.isfinite(similarities[candidates])]
+        return candidates[np.argsort(-similarities[candidates])], similarities
+
+    def search(self, key, top_k=None, scope=None):
+        """Returns upto top_k (key, value, similarity) tuples of the scope ordered by similarity"""
+        candidates, similarities = self.__nearest(key, top_k or self.top_k, scope)
+        return [(self.keys[index], self.values[index], float(similarities[index])) for index in candidates]
+
+    def get(self, key, scope=None):
+        if len(normalize_text(key).split()) < self.min_key_words:
+            return None
+        candidates, similarities = self.__nearest(key, 1, scope)
+        if len(candidates) == 0 or similarities[candidates[0]] < self.similarity_threshold:
+            self.misses += 1
+            return None
+        index = candidates[0]
+        self.hits += 1
+        self.last_used[index] = self.__tick()
+        logger.info(f"Semantic cache hit for {key} with {self.keys[index]} similarity {similarities[index]}")
+        return self.values[index]
+
+    def set(self, key, value, scope=None):
+        normalized_key = normalize_text(key)
+        if len(normalized_key.split()) < self.min_key_words:
+            return
+        embedding = self.embedding_model.embed([key])[0]
+        scope_id = self.__get_scope_id(scope)
+        if (scope_id, normalized_key) in self.key_to_index:
+            index = self.key_to_index[(scope_id, normalized_key)]
+        elif self.size < self.capacity:
+            index = self.size
+            self.size += 1
+        else:
+            index = int(np.argmin(self.last_used))
+            logger.info(f"Semantic cache is full and hence evicting {self.keys[index]}")
+            del self.key_to_index[(int(self.entry_scopes[index]), self.keys[index])]
+        self.key_to_index[(scope_id, normalized_key)] = index
+        self.entry_scopes[index] = scope_id
+        self.embeddings[index] = embedding
+        self.keys[index] = normalized_key
+        self.values[index] = value
+        self.last_used[index] = self.__tick()
+
+    def flush_cache(self):
+        self.embeddings[:] = 0
+        self.keys = [None] * self.capacity
+        self.values = [None] * self.capacity
+        self.key_to_index = {}
+        self.scope_ids = {}
+        self.next_scope_id = 0
+        self.entry_scopes[:] = -1
+        self.last_used[:] = 0
+        self.size = 0
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total > 0 else 0,
+            "size": self.size,
+            "scopes": len(self.scope_ids)
+        }
@@ -70,6 +70,15 @@ class Synthesizer(BaseModel):
     stream: bool = False
     buffer_size: Optional[int] = 40  # 40 characters in a buffer
     audio_format: Optional[str] = "pcm"
+    backup_provider: Optional[str] = None  # Used when the primary provider misses the first byte deadline
+    backup_provider_config: Optional[Union[PollyConfig, XTTSConfig, ElevenLabsConfig, OpenAIConfig, FourieConfig, DeepgramConfig]] = None
+    first_byte_deadline: Optional[float] = 1.0  # In seconds
+
+    @validator("backup_provider")
+    def validate_backup_provider(cls, value):
+        if value is None:
+            return value
+        return validate_attribute(value, ["polly", "xtts", "elevenlabs", "openai", "deepgram"])
 
     @validator("provider")
     def validate_model(cls, value):
@@ -100,6 +109,15 @@ class LLM(BaseModel):
     min_p: Optional[float] = 0.1
     frequency_penalty: Optional[float] = 0.0  
     presence_penalty: Optional[float] = 0.0
+    context_token_budget: Optional[int] = None  # Older turns are trimmed to keep the prompt within this many tokens
+    summarize_context: Optional[bool] = False  # Summarize trimmed turns instead of simply dropping them
+    fallback_family: Optional[str] = None  # Used with use_fallback, defaults to the primary family
+    fallback_model: Optional[str] = None
+    fallback_first_token_deadline: Optional[float] = 1.5  # Seconds to wait for the primary before hedging to the fallback
+    local_classifier: Optional[bool] = False  # Preprocessed graphs classify confident transitions locally from the prompt examples
+    local_classifier_threshold: Optional[float] = 0.5
+    local_classifier_margin: Optional[float] = 0.1
+    local_classifier_verify_rate: Optional[float] = 0.1
 
 class MessagingModel(BaseModel):
     provider: str
@@ -140,6 +158,12 @@ class Task(BaseModel):
     tools_config: ToolsConfig
     toolchain: ToolsChainModel
     task_type: Optional[str] = "conversation"  # extraction, summarization, notification
+    use_fillers: Optional[bool] = False
+    filler_phrases: Optional[List[str]] = None  # Defaults to a few phrases in the transcriber's language
+    filler_threshold: Optional[float] = 1.0  # Seconds to wait for the first LLM token before playing a filler
+    hangup_after_LLMCall: Optional[bool] = False
+    call_cancellation_prompt: Optional[str] = None
+    check_for_completion_llm: Optional[str] = None  # Cheaper model used to decide if the call should be hung up
 
 
 class AgentModel(BaseModel):
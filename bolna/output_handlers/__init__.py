@@ -1,3 +1,8 @@
-from .default import DefaultOutputHandler
-from .telephony_providers.twilio import TwilioOutputHandler
-from .telephony_providers.exotel import ExotelOutputHandler
+from bolna.helpers.lazy_import import lazy_module_getattr
+
+# Handlers are imported on first access, see bolna.providers
+__getattr__ = lazy_module_getattr(__name__, {
+    "DefaultOutputHandler": ".default",
+    "TwilioOutputHandler": ".telephony_providers.twilio",
+    "ExotelOutputHandler": ".telephony_providers.exotel",
+})
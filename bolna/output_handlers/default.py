@@ -1,37 +1,51 @@
 import base64
 from dotenv import load_dotenv
 from bolna.helpers.logger_config import configure_logger
+from bolna.helpers import json_codec
+from bolna.helpers.ws_framing import encode_frame
 
 logger = configure_logger(__name__)
 load_dotenv()
 
 
 class DefaultOutputHandler:
-    def __init__(self, websocket=None, queue = None):
+    def __init__(self, websocket=None, queue = None, framing=None):
         self.websocket = websocket
         self.is_interruption_task_on = False
         self.queue = queue
+        # Shared with the input handler, audio goes out as binary frames once the client has negotiated them
+        self.framing = framing
+        # Whether handle paces audio itself, otherwise the task manager sleeps for each chunk's duration
+        self.flow_controlled = False
 
     # @TODO Figure out the best way to handle this
     async def handle_interruption(self):
         logger.info("#######   Sending interruption message ####################")
         response = {"data": None, "type": "clear"}
-        await self.websocket.send_json(response)
+        await self.websocket.send_text(json_codec.dumps(response))
+
+    async def wait_until_played(self):
+        """Audio is paced by the task manager and hence has already played by the time it's handled"""
+        return True
 
     async def handle(self, packet):
         try:
-            logger.info(f"Packet received:")
+            logger.hot("packet_received", "Packet received:")
             data = None
             if packet["meta_info"]['type'] in ('audio', 'text'):
                 if packet["meta_info"]['type'] == 'audio':
-                    logger.info(f"Sending audio")
+                    logger.hot("sending_audio", "Sending audio")
+                    if self.framing is not None and self.framing.binary_audio:
+                        await self.websocket.send_bytes(encode_frame(packet['data'], audio_format=packet["meta_info"].get('format'),
+                                                                     sequence_id=packet["meta_info"].get('sequence_id')))
+                        return
                     data = base64.b64encode(packet['data']).decode("utf-8")
                 elif packet["meta_info"]['type'] == 'text':
-                    logger.info(f"Sending text response {packet['data']}")
+                    logger.hot("sending_text", "Sending text response %s", packet['data'])
                     data = packet['data']
 
                 response = {"data": data, "type": packet["meta_info"]['type']}
-                await self.websocket.send_json(response)
+                await self.websocket.send_text(json_codec.dumps(response))
 
             else:
                 logger.error("Other modalities are not implemented yet")
@@ -1,5 +1,4 @@
 import base64
-import json
 import os
 import audioop
 import uuid
@@ -7,14 +6,23 @@ import traceback
 from dotenv import load_dotenv
 from .default import DefaultOutputHandler
 from bolna.helpers.logger_config import configure_logger
+from bolna.helpers import json_codec
 logger = configure_logger(__name__)
 load_dotenv()
 
 
 class TelephonyOutputHandler(DefaultOutputHandler):
-    def __init__(self, websocket=None, mark_set=None, log_dir_name=None):
+    def __init__(self, websocket=None, mark_set=None, log_dir_name=None, max_buffered_duration=1.0, mark_interval=0.2,
+                 ack_timeout=2.0):
         super().__init__(websocket, log_dir_name)
+        # MarkTracker shared with the input handler which acks marks as the provider plays them
         self.mark_set = mark_set
+        # Audio waits on our side once this many seconds are buffered at the provider, so a clear drops at most that
+        self.max_buffered_duration = max_buffered_duration
+        # A mark goes out once this much audio has been sent since the last one, and after the last chunk of a response
+        self.mark_interval = mark_interval
+        self.ack_timeout = ack_timeout
+        self.flow_controlled = True
 
         self.stream_sid = None
         self.current_request_id = None
@@ -29,6 +37,22 @@ class TelephonyOutputHandler(DefaultOutputHandler):
     async def form_mark_message(self, mark_id):
         pass
 
+    def get_buffered_duration(self):
+        """Seconds of audio sent to the provider which it hasn't played yet"""
+        return self.mark_set.in_flight_duration
+
+    async def wait_until_played(self):
+        """Marks the audio sent so far and waits for the provider to play all of it, False on timeout"""
+        if self.mark_set.unmarked_duration > 0 and self.stream_sid:
+            await self.__send_mark()
+        return await self.mark_set.wait_until_played(self.get_buffered_duration() + self.ack_timeout)
+
+    async def __send_mark(self):
+        mark_id = str(uuid.uuid4())
+        self.mark_set.add(mark_id)
+        mark_message = await self.form_mark_message(mark_id)
+        await self.websocket.send_text(json_codec.dumps(mark_message))
+
     async def handle(self, ws_data_packet):
         try:
             audio_chunk = ws_data_packet.get('data')
@@ -42,14 +66,21 @@ class TelephonyOutputHandler(DefaultOutputHandler):
 
                 if audio_chunk and self.stream_sid and len(audio_chunk) != 1:
                     audio_format = meta_info.get("format", "wav")
-                    media_message = await self.form_media_message(audio_chunk, audio_format)
-                    await self.websocket.send_text(json.dumps(media_message))
+                    # Audio is 8kHz, a byte per sample as mulaw and two otherwise
+                    duration = len(audio_chunk) / (8000 if audio_format == "mulaw" else 16000)
+                    clears = self.mark_set.clears
+                    if not await self.mark_set.wait_for_room(max(self.max_buffered_duration - duration, 0), self.ack_timeout):
+                        logger.info(f"No mark acked in {self.ack_timeout}s with {self.get_buffered_duration():.2f}s buffered, sending anyway")
+                    if self.mark_set.clears != clears:
+                        logger.info("Dropping audio which was waiting when the provider's buffer got cleared")
+                        return
 
-                    mark_id = str(uuid.uuid4())
-                    self.mark_set.add(mark_id)
+                    media_message = await self.form_media_message(audio_chunk, audio_format)
+                    await self.websocket.send_text(json_codec.dumps(media_message))
+                    self.mark_set.add_audio(duration)
 
-                    mark_message = await self.form_mark_message(mark_id)
-                    await self.websocket.send_text(json.dumps(mark_message))
+                    if self.mark_set.unmarked_duration >= self.mark_interval or meta_info.get("is_final_chunk_of_entire_response"):
+                        await self.__send_mark()
             except Exception as e:
                 traceback.print_exc()
                 logger.error(f'something went wrong while sending message to twilio {e}')
@@ -1,16 +1,16 @@
 import base64
-import json
 from dotenv import load_dotenv
 from bolna.output_handlers.telephony import TelephonyOutputHandler
 from bolna.helpers.logger_config import configure_logger
+from bolna.helpers import json_codec
 
 logger = configure_logger(__name__)
 load_dotenv()
 
 
 class ExotelOutputHandler(TelephonyOutputHandler):
-    def __init__(self, websocket=None, mark_set=None, log_dir_name=None):
-        super().__init__(websocket, mark_set, log_dir_name)
+    def __init__(self, websocket=None, mark_set=None, log_dir_name=None, max_buffered_duration=1.0):
+        super().__init__(websocket, mark_set, log_dir_name, max_buffered_duration)
         self.io_provider = 'exotel'
 
     async def handle_interruption(self):
@@ -19,8 +19,8 @@ class ExotelOutputHandler(TelephonyOutputHandler):
             "event": "clear",
             "stream_sid": self.stream_sid,
         }
-        await self.websocket.send_text(json.dumps(message_clear))
-        self.mark_set = set()
+        await self.websocket.send_text(json_codec.dumps(message_clear))
+        self.mark_set.clear()
 
     async def form_media_message(self, audio_data, audio_format):
         base64_audio = base64.b64encode(audio_data).decode("ascii")
@@ -1,10 +1,10 @@
 import base64
-import json
 import os
 import audioop
 from twilio.rest import Client
 from dotenv import load_dotenv
 from bolna.helpers.logger_config import configure_logger
+from bolna.helpers import json_codec
 from bolna.output_handlers.telephony import TelephonyOutputHandler
 
 logger = configure_logger(__name__)
@@ -12,8 +12,8 @@ load_dotenv()
 
 
 class TwilioOutputHandler(TelephonyOutputHandler):
-    def __init__(self, websocket=None, mark_set=None, log_dir_name=None):
-        super().__init__(websocket, mark_set, log_dir_name)
+    def __init__(self, websocket=None, mark_set=None, log_dir_name=None, max_buffered_duration=1.0):
+        super().__init__(websocket, mark_set, log_dir_name, max_buffered_duration)
         self.io_provider = 'twilio'
         self.client = Client(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'))
 
@@ -23,8 +23,8 @@ class TwilioOutputHandler(TelephonyOutputHandler):
             "event": "clear",
             "streamSid": self.stream_sid,
         }
-        await self.websocket.send_text(json.dumps(message_clear))
-        self.mark_set = set()
+        await self.websocket.send_text(json_codec.dumps(message_clear))
+        self.mark_set.clear()
 
     async def form_media_message(self, audio_data, audio_format="wav"):
         if audio_format != "mulaw":
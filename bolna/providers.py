@@ -1,47 +1,44 @@
-from .synthesizer import PollySynthesizer, XTTSSynthesizer, ElevenlabsSynthesizer, OPENAISynthesizer, FourieSynthesizer, DeepgramSynthesizer
-from .transcriber import DeepgramTranscriber
-from .input_handlers import DefaultInputHandler, TwilioInputHandler, ExotelInputHandler
-from .output_handlers import DefaultOutputHandler, TwilioOutputHandler, ExotelOutputHandler
-from .llms import OpenAiLLM, LiteLLM
+from bolna.helpers.lazy_import import LazyRegistry
 
-SUPPORTED_SYNTHESIZER_MODELS = {
-    'polly': PollySynthesizer,
-    'xtts': XTTSSynthesizer,
-    'elevenlabs': ElevenlabsSynthesizer,
-    'openai': OPENAISynthesizer,
-    'fourie': FourieSynthesizer,
-    'deepgram': DeepgramSynthesizer
-}
-SUPPORTED_TRANSCRIBER_MODELS = {
-    'deepgram': DeepgramTranscriber,
-    'whisper': DeepgramTranscriber #Seperate out a transcriber for https://github.com/bolna-ai/streaming-transcriber-server or build a deepgram compatible proxy
-}
-SUPPORTED_LLM_MODELS = {
-    'openai': OpenAiLLM,
-    'cohere': LiteLLM,
-    'ollama': LiteLLM,
-    'mistral': LiteLLM,
-    'llama': LiteLLM,
-    'zephyr': LiteLLM,
-    'azure-openai': LiteLLM,
-    'perplexity': LiteLLM,
-    'vllm': OpenAiLLM
-}
-SUPPORTED_INPUT_HANDLERS = {
-    'default': DefaultInputHandler,
-    'twilio': TwilioInputHandler,
-    'exotel': ExotelInputHandler
-}
-SUPPORTED_INPUT_TELEPHONY_HANDLERS = {
-    'twilio': TwilioInputHandler,
-    'exotel': ExotelInputHandler
-}
-SUPPORTED_OUTPUT_HANDLERS = {
-    'default': DefaultOutputHandler,
-    'twilio': TwilioOutputHandler,
-    'exotel': ExotelOutputHandler
-}
-SUPPORTED_OUTPUT_TELEPHONY_HANDLERS = {
-    'twilio': TwilioOutputHandler,
-    'exotel': ExotelOutputHandler
-}
+# Providers are imported on first lookup, this keeps heavy dependencies of unused providers out of the worker
+SUPPORTED_SYNTHESIZER_MODELS = LazyRegistry({
+    'polly': 'bolna.synthesizer.polly_synthesizer:PollySynthesizer',
+    'xtts': 'bolna.synthesizer.xtts_synthesizer:XTTSSynthesizer',
+    'elevenlabs': 'bolna.synthesizer.elevenlabs_synthesizer:ElevenlabsSynthesizer',
+    'openai': 'bolna.synthesizer.openai_synthesizer:OPENAISynthesizer',
+    'fourie': 'bolna.synthesizer.fourie_synthesizer:FourieSynthesizer',
+    'deepgram': 'bolna.synthesizer.deepgram_synthesizer:DeepgramSynthesizer'
+})
+SUPPORTED_TRANSCRIBER_MODELS = LazyRegistry({
+    'deepgram': 'bolna.transcriber.deepgram_transcriber:DeepgramTranscriber',
+    'whisper': 'bolna.transcriber.deepgram_transcriber:DeepgramTranscriber' #Seperate out a transcriber for https://github.com/bolna-ai/streaming-transcriber-server or build a deepgram compatible proxy
+})
+SUPPORTED_LLM_MODELS = LazyRegistry({
+    'openai': 'bolna.llms.openai_llm:OpenAiLLM',
+    'cohere': 'bolna.llms.litellm:LiteLLM',
+    'ollama': 'bolna.llms.litellm:LiteLLM',
+    'mistral': 'bolna.llms.litellm:LiteLLM',
+    'llama': 'bolna.llms.litellm:LiteLLM',
+    'zephyr': 'bolna.llms.litellm:LiteLLM',
+    'azure-openai': 'bolna.llms.litellm:LiteLLM',
+    'perplexity': 'bolna.llms.litellm:LiteLLM',
+    'vllm': 'bolna.llms.openai_llm:OpenAiLLM'
+})
+SUPPORTED_INPUT_HANDLERS = LazyRegistry({
+    'default': 'bolna.input_handlers.default:DefaultInputHandler',
+    'twilio': 'bolna.input_handlers.telephony_providers.twilio:TwilioInputHandler',
+    'exotel': 'bolna.input_handlers.telephony_providers.exotel:ExotelInputHandler'
+})
+SUPPORTED_INPUT_TELEPHONY_HANDLERS = LazyRegistry({
+    'twilio': 'bolna.input_handlers.telephony_providers.twilio:TwilioInputHandler',
+    'exotel': 'bolna.input_handlers.telephony_providers.exotel:ExotelInputHandler'
+})
+SUPPORTED_OUTPUT_HANDLERS = LazyRegistry({
+    'default': 'bolna.output_handlers.default:DefaultOutputHandler',
+    'twilio': 'bolna.output_handlers.telephony_providers.twilio:TwilioOutputHandler',
+    'exotel': 'bolna.output_handlers.telephony_providers.exotel:ExotelOutputHandler'
+})
+SUPPORTED_OUTPUT_TELEPHONY_HANDLERS = LazyRegistry({
+    'twilio': 'bolna.output_handlers.telephony_providers.twilio:TwilioOutputHandler',
+    'exotel': 'bolna.output_handlers.telephony_providers.exotel:ExotelOutputHandler'
+})
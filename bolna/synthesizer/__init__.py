@@ -1,6 +1,11 @@
-from .polly_synthesizer import PollySynthesizer
-from .xtts_synthesizer import XTTSSynthesizer
-from .elevenlabs_synthesizer import ElevenlabsSynthesizer
-from .openai_synthesizer import OPENAISynthesizer
-from .fourie_synthesizer import FourieSynthesizer
-from .deepgram_synthesizer import DeepgramSynthesizer
+from bolna.helpers.lazy_import import lazy_module_getattr
+
+# Synthesizers are imported on first access, see bolna.providers
+__getattr__ = lazy_module_getattr(__name__, {
+    "PollySynthesizer": ".polly_synthesizer",
+    "XTTSSynthesizer": ".xtts_synthesizer",
+    "ElevenlabsSynthesizer": ".elevenlabs_synthesizer",
+    "OPENAISynthesizer": ".openai_synthesizer",
+    "FourieSynthesizer": ".fourie_synthesizer",
+    "DeepgramSynthesizer": ".deepgram_synthesizer",
+})
@@ -1,7 +1,7 @@
 import io
-import torchaudio
 import uvloop
 from bolna.helpers.logger_config import configure_logger
+from bolna.helpers.utils import torchaudio
 import asyncio
 
 logger = configure_logger(__name__)
@@ -18,6 +18,11 @@ class BaseSynthesizer:
     def clear_internal_queue(self):
         logger.info(f"Clearing out internal queue")
         self.internal_queue = asyncio.Queue()
+
+    async def handle_interruption(self):
+        # Drop whatever hasn't been picked up for generation yet so that we don't pay for audio which won't be played
+        while not self.internal_queue.empty():
+            self.internal_queue.get_nowait()
         
     def generate(self):
         pass
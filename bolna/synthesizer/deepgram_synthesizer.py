@@ -2,7 +2,7 @@ import aiohttp
 import os
 from dotenv import load_dotenv
 from bolna.helpers.logger_config import configure_logger
-from bolna.helpers.utils import create_ws_data_packet
+from bolna.helpers.utils import create_ws_data_packet, yield_frames_from_stream
 from .base_synthesizer import BaseSynthesizer
 
 logger = configure_logger(__name__)
@@ -19,15 +19,33 @@ class DeepgramSynthesizer(BaseSynthesizer):
         self.sample_rate = str(sampling_rate)
         self.first_chunk_generated = False
         self.api_key = kwargs.get("transcriber_key", os.getenv('DEEPGRAM_AUTH_TOKEN'))
+        # linear16 samples are 2 bytes wide, send 100ms worth of audio as soon as it arrives
+        self.sample_width = 2 if self.format == "linear16" else 1
+        self.frame_size = int(self.sample_rate) * self.sample_width // 10
 
-    async def __generate_http(self, text):
+    def __get_url(self, container="none"):
+        if self.format in ("linear16", "mulaw", "alaw"):
+            return DEEPGRAM_TTS_URL + "?encoding={}&container={}&sample_rate={}&model={}".format(
+                self.format, container, self.sample_rate, self.voice
+            )
+        # Compressed encodings come in their own container at a fixed sample rate
+        return DEEPGRAM_TTS_URL + "?encoding={}&model={}".format(self.format, self.voice)
+
+    async def synthesize(self, text):
+        # This is used for one off synthesis mainly for use cases like voice lab and fillers, raw audio is wrapped in a
+        # wav container so that it can be decoded without knowing its format
+        audio = b""
+        async for chunk in self.__generate_http(text, container="wav", stream=False):
+            audio += chunk
+        return audio if len(audio) > 0 else None
+
+    async def __generate_http(self, text, container="none", stream=None):
+        stream = self.stream if stream is None else stream
         headers = {
             "Authorization": "Token {}".format(self.api_key),
             "Content-Type": "application/json"
         }
-        url = DEEPGRAM_TTS_URL + "?encoding={}&container=none&sample_rate={}&model={}".format(
-            self.format, self.sample_rate, self.voice
-        )
+        url = self.__get_url(container)
 
         payload = {
             "text": text
@@ -36,9 +54,15 @@ class DeepgramSynthesizer(BaseSynthesizer):
         async with aiohttp.ClientSession() as session:
             if payload is not None:
                 async with session.post(url, headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        chunk = await response.read()
-                        yield chunk
+                    if response.status == 200 and not stream:
+                        yield await response.read()
+                    elif response.status == 200:
+                        async for frame in yield_frames_from_stream(response.content.iter_chunked(self.frame_size),
+                                                                    frame_size=self.frame_size,
+                                                                    sample_width=self.sample_width):
+                            yield frame
+                    else:
+                        logger.error(f"Error: {response.status} - {await response.text()}")
             else:
                 logger.info("Payload was null")
 
@@ -51,20 +75,31 @@ class DeepgramSynthesizer(BaseSynthesizer):
             logger.info(f"Generating TTS response for message: {message}")
 
             meta_info, text = message.get("meta_info"), message.get("data")
-            async for message in self.__generate_http(text):
-                if not self.first_chunk_generated:
-                    meta_info["is_first_chunk"] = True
-                    self.first_chunk_generated = True
-                else:
-                    meta_info["is_first_chunk"] = False
-                if "end_of_llm_stream" in meta_info and meta_info["end_of_llm_stream"]:
-                    meta_info["end_of_synthesizer_stream"] = True
-                    self.first_chunk_generated = False
+            meta_info['text'] = text
+            meta_info['format'] = self.format
+            # Hold back one frame so that only the very last frame is marked as the end of the synthesizer stream
+            previous_frame = None
+            async for frame in self.__generate_http(text):
+                if previous_frame is not None:
+                    yield self.__create_packet(previous_frame, meta_info, is_last_frame=False)
+                previous_frame = frame
+
+            if previous_frame is not None:
+                yield self.__create_packet(previous_frame, meta_info, is_last_frame=True)
+            elif "end_of_llm_stream" in meta_info and meta_info["end_of_llm_stream"]:
+                self.first_chunk_generated = False
 
-                meta_info['text'] = text
-                meta_info['format'] = self.format
-                yield create_ws_data_packet(message, meta_info)
+    def __create_packet(self, frame, meta_info, is_last_frame):
+        if not self.first_chunk_generated:
+            meta_info["is_first_chunk"] = True
+            self.first_chunk_generated = True
+        else:
+            meta_info["is_first_chunk"] = False
+        if is_last_frame and "end_of_llm_stream" in meta_info and meta_info["end_of_llm_stream"]:
+            meta_info["end_of_synthesizer_stream"] = True
+            self.first_chunk_generated = False
+        return create_ws_data_packet(frame, meta_info)
 
     async def push(self, message):
-        logger.info("Pushed message to internal queue")
+        logger.hot("deepgram_push", "Pushed message to internal queue")
         self.internal_queue.put_nowait(message)
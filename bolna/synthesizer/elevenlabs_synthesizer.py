@@ -1,14 +1,16 @@
 import asyncio
 import copy
+from collections import deque
 import websockets
 import base64
-import json
 import aiohttp
 import os
 import traceback
-from collections import deque
+import io
+import wave
 from .base_synthesizer import BaseSynthesizer
 from bolna.helpers.logger_config import configure_logger
+from bolna.helpers import json_codec
 from bolna.helpers.utils import convert_audio_to_wav, create_ws_data_packet, pcm_to_wav_bytes, resample
 
 import uvloop
@@ -26,18 +28,19 @@ class ElevenlabsSynthesizer(BaseSynthesizer):
         self.use_turbo = kwargs.get("use_turbo", False)
         self.model = "eleven_turbo_v2" if self.use_turbo else "eleven_multilingual_v2"
         logger.info(f"Using turbo or not {self.model}")
-        self.stream = False  # Issue with elevenlabs streaming that we need to always send the text quickly
+        self.stream = stream
         self.websocket_connection = None
-        self.connection_open = False
         self.sampling_rate = sampling_rate
         self.audio_format = "mp3"
         self.use_mulaw = kwargs.get("use_mulaw", False)
-        self.ws_url = f"wss://api.elevenlabs.io/v1/text-to-speech/{self.voice}/stream-input?model_id={self.model}&optimize_streaming_latency=2&output_format={self.get_format(self.audio_format, self.sampling_rate)}"
+        # A single multi context connection is kept for the whole call and every turn is generated in its own context
+        self.ws_url = f"wss://api.elevenlabs.io/v1/text-to-speech/{self.voice}/multi-stream-input?model_id={self.model}&optimize_streaming_latency=2&inactivity_timeout=180&output_format={self.get_format(self.audio_format, self.sampling_rate)}"
         self.api_url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.voice}?optimize_streaming_latency=2&output_format="
         self.first_chunk_generated = False
-        self.last_text_sent = False
-        self.text_queue = deque()
-        self.meta_info = None
+        self.sender_queue = asyncio.Queue()
+        self.sender_task = None
+        self.contexts = {}
+        self.cancelled_context_ids = set()
 
     # Ensuring we only do wav output for now
     def get_format(self, format, sampling_rate):
@@ -56,63 +59,119 @@ class ElevenlabsSynthesizer(BaseSynthesizer):
             return "ulaw_8000"
         return f"mp3_44100_128"
 
-    # Don't send EOS signal. Let        
-    async def sender(self, text, end_of_llm_stream=False):  # sends text to websocket
-        if self.websocket_connection is not None and not self.websocket_connection.open:
-            self.connection_open = False
+    def __get_context_id(self, meta_info):
+        # Every turn (sequence id) gets its own generation context on the shared connection
+        return str(meta_info.get("sequence_id"))
+
+    def __end_of_stream_audio(self):
+        # 20ms of silence which can be safely pushed through the pcm conversion in the task manager
+        if self.use_mulaw:
+            return b'\xff' * 160
+        wav_io = io.BytesIO()
+        with wave.open(wav_io, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(int(self.sampling_rate))
+            wav_file.writeframes(b'\x00' * (int(self.sampling_rate) // 50 * 2))
+        return wav_io.getvalue()
+
+    async def __send_to_context(self, message):
+        meta_info, text = message.get("meta_info"), message.get("data")
+        context_id = self.__get_context_id(meta_info)
+        if context_id in self.cancelled_context_ids:
+            logger.info(f"Context {context_id} was cancelled and hence not sending {text}")
+            return
+
+        if self.websocket_connection is None or not self.websocket_connection.open:
             logger.info(f"Connection was closed and hence opening connection")
             await self.open_connection()
 
-        if not self.connection_open:
-            logger.info("Connecting to elevenlabs websocket...")
+        if context_id not in self.contexts:
+            # pending holds [meta_info, characters not yet spoken] of every text pushed into the context, oldest first
+            self.contexts[context_id] = {"meta_info": meta_info, "pending": deque(), "first_chunk_generated": False}
             bos_message = {
                 "text": " ",
                 "voice_settings": {
                     "stability": 0.5,
                     "similarity_boost": 0.5
                 },
-                "xi_api_key": self.api_key,
+                "context_id": context_id
             }
-            await self.websocket_connection.send(json.dumps(bos_message))
-            self.connection_open = True
+            await self.websocket_connection.send(json_codec.dumps(bos_message))
+        # The end of stream flags of the last push go out with the context's final packet
+        self.contexts[context_id]["meta_info"] = meta_info
 
         if text != "":
-            logger.info(f"Sending message {text}")
-
+            self.contexts[context_id]["pending"].append([meta_info, self.__count_characters(text)])
+            logger.info(f"Sending message {text} to context {context_id}")
             input_message = {
                 "text": f"{text} ",
-                "try_trigger_generation": True,
+                "context_id": context_id,
                 "flush": True
             }
-            await self.websocket_connection.send(json.dumps(input_message))
-            if end_of_llm_stream:
-                self.last_text_sent = True
+            await self.websocket_connection.send(json_codec.dumps(input_message))
 
-            # self.connection_open = False
+        if "end_of_llm_stream" in meta_info and meta_info["end_of_llm_stream"]:
+            await self.websocket_connection.send(json_codec.dumps({"context_id": context_id, "close_context": True}))
+
+    async def sender(self):
+        # Single sender per connection so that text for a context always goes out in order
+        while True:
+            message = await self.sender_queue.get()
+            try:
+                await self.__send_to_context(message)
+            except Exception as e:
+                traceback.print_exc()
+                logger.error(f"Error sending text to eleven labs {e}")
 
     async def receiver(self):
         while True:
-            if not self.connection_open:
-                logger.info("Since eleven labs always closes the connection after every leg, simply open it...")
-                await self.open_connection()
+            if self.websocket_connection is None or not self.websocket_connection.open:
+                await asyncio.sleep(0.05)
+                continue
             try:
                 response = await self.websocket_connection.recv()
-                data = json.loads(response)
-                logger.info("response for isFinal: {}".format(data.get('isFinal', False)))
+                data = json_codec.loads(response)
+                context_id = data.get("contextId")
+                if context_id in self.cancelled_context_ids:
+                    logger.info(f"Dropping audio for cancelled context {context_id}")
+                    continue
+
                 if "audio" in data and data["audio"]:
                     chunk = base64.b64decode(data["audio"])
                     if len(chunk) % 2 == 1:
                         chunk += b'\x00'
-                    # @TODO make it better - for example sample rate changing for mp3 and other formats  
-                    yield chunk
-
-                    if "isFinal" in data and data["isFinal"]:
-                        self.connection_open = False
-                        yield b'\x00'
-                else:
-                    logger.info("No audio data in the response")
+                    alignment = data.get("alignment") or {}
+                    yield chunk, context_id, self.__count_characters("".join(alignment.get("chars") or []))
+
+                if "isFinal" in data and data["isFinal"]:
+                    logger.info(f"Context {context_id} is finished")
+                    yield None, context_id, 0
             except websockets.exceptions.ConnectionClosed:
+                logger.info("Eleven labs connection got closed, will reopen it on the next message")
+                self.contexts = {}
+
+    @staticmethod
+    def __count_characters(text):
+        # Whitespace isn't counted as eleven labs doesn't echo it back consistently
+        return sum(1 for character in text if not character.isspace())
+
+    def __get_chunk_meta_info(self, context, spoken_characters):
+        """meta_info of the text this audio was generated from, found by counting the characters spoken so far"""
+        pending = context["pending"]
+        # Texts spoken in full make way for the next one, the last one stays for audio without alignment
+        while len(pending) > 1 and pending[0][1] <= 0:
+            pending.popleft()
+        if len(pending) == 0:
+            return copy.deepcopy(context["meta_info"])
+        meta_info = copy.deepcopy(pending[0][0])
+        for entry in pending:
+            if spoken_characters <= 0:
                 break
+            spoken = min(spoken_characters, entry[1])
+            entry[1] -= spoken
+            spoken_characters -= spoken
+        return meta_info
 
     async def __send_payload(self, payload, format=None):
         headers = {
@@ -153,36 +212,35 @@ class ElevenlabsSynthesizer(BaseSynthesizer):
     async def generate(self):
         try:
             if self.stream:
-                async for message in self.receiver():
-                    logger.info(f"Received message from server")
+                async for message, context_id, spoken_characters in self.receiver():
+                    logger.hot("elevenlabs_audio", "Received message from server")
+                    if context_id not in self.contexts:
+                        continue
+                    context = self.contexts[context_id]
 
-                    if len(self.text_queue) > 0:
-                        self.meta_info = self.text_queue.popleft()
-                    audio = ""
+                    if message is None:
+                        meta_info = copy.deepcopy(context["meta_info"])
+                        logger.info("received final message for context and hence end of stream")
+                        del self.contexts[context_id]
+                        meta_info["end_of_synthesizer_stream"] = True
+                        meta_info['format'] = 'mulaw' if self.use_mulaw else 'wav'
+                        yield create_ws_data_packet(self.__end_of_stream_audio(), meta_info)
+                        continue
+
+                    meta_info = self.__get_chunk_meta_info(context, spoken_characters)
+                    if not context["first_chunk_generated"]:
+                        meta_info["is_first_chunk"] = True
+                        context["first_chunk_generated"] = True
 
                     if self.use_mulaw:
-                        self.meta_info['format'] = 'mulaw'
+                        meta_info['format'] = 'mulaw'
                         audio = message
                     else:
-                        self.meta_info['format'] = "wav"
+                        meta_info['format'] = "wav"
                         audio = resample(convert_audio_to_wav(message, source_format="mp3"), int(self.sampling_rate),
-                                             format="wav")
-
-                    yield create_ws_data_packet(audio, self.meta_info)
-                    if not self.first_chunk_generated:
-                        self.meta_info["is_first_chunk"] = True
-                        self.first_chunk_generated = True
+                                         format="wav")
 
-                    if self.last_text_sent:
-                        # Reset the last_text_sent and first_chunk converted to reset synth latency
-                        self.first_chunk_generated = False
-                        self.last_text_sent = True
-
-                    if message == b'\x00':
-                        logger.info("received null byte and hence end of stream")
-                        self.meta_info["end_of_synthesizer_stream"] = True
-                        yield create_ws_data_packet(resample(message, int(self.sampling_rate)), self.meta_info)
-                        self.first_chunk_generated = False
+                    yield create_ws_data_packet(audio, meta_info)
 
             else:
                 while True:
@@ -213,18 +271,33 @@ class ElevenlabsSynthesizer(BaseSynthesizer):
             logger.error(f"Error in eleven labs generate {e}")
 
     async def open_connection(self):
-        if self.websocket_connection is None or self.connection_open is False:
-            self.websocket_connection = await websockets.connect(self.ws_url)
+        if self.websocket_connection is None or not self.websocket_connection.open:
+            self.websocket_connection = await websockets.connect(self.ws_url, extra_headers={"xi-api-key": self.api_key})
+            self.contexts = {}
             logger.info("Connected to the server")
+        if self.sender_task is None or self.sender_task.done():
+            self.sender_task = asyncio.create_task(self.sender())
+
+    async def handle_interruption(self):
+        await super().handle_interruption()
+        while not self.sender_queue.empty():
+            self.sender_queue.get_nowait()
+
+        for context_id in list(self.contexts.keys()):
+            logger.info(f"Closing eleven labs context {context_id} because of interruption")
+            self.cancelled_context_ids.add(context_id)
+            del self.contexts[context_id]
+            try:
+                if self.websocket_connection is not None and self.websocket_connection.open:
+                    await self.websocket_connection.send(json_codec.dumps({"context_id": context_id, "close_context": True}))
+            except Exception as e:
+                logger.error(f"Error while closing eleven labs context {context_id}: {e}")
 
     async def push(self, message):
-        logger.info(f"Pushed message to internal queue {message}")
+        logger.hot("elevenlabs_push", "Pushed message to internal queue %s", message)
         if self.stream:
             meta_info, text = message.get("meta_info"), message.get("data")
-            end_of_llm_stream = "end_of_llm_stream" in meta_info and meta_info["end_of_llm_stream"]
-            self.meta_info = copy.deepcopy(meta_info)
             meta_info["text"] = text
-            self.sender_task = asyncio.create_task(self.sender(text, end_of_llm_stream))
-            self.text_queue.append(meta_info)
+            self.sender_queue.put_nowait(message)
         else:
             self.internal_queue.put_nowait(message)
@@ -84,5 +84,5 @@ class FourieSynthesizer(BaseSynthesizer):
         pass
 
     async def push(self, message):
-        logger.info(f"Pushed message to internal queue {message}")
+        logger.hot("fourie_push", "Pushed message to internal queue %s", message)
         self.internal_queue.put_nowait(message)
\ No newline at end of file
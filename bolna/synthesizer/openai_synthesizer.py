@@ -1,29 +1,35 @@
 from collections import deque
 import os
+import audioop
+import aiohttp
 from dotenv import load_dotenv
 from bolna.helpers.logger_config import configure_logger
-from bolna.helpers.utils import convert_audio_to_wav, create_ws_data_packet, pcm_to_wav_bytes, resample
+from bolna.helpers.utils import convert_audio_to_wav, create_ws_data_packet, pcm_to_wav_bytes, resample, yield_frames_from_stream
 from .base_synthesizer import BaseSynthesizer
-from openai import AsyncOpenAI
+from bolna.llms.client_pool import get_openai_client
 import io
 
 logger = configure_logger(__name__)
 load_dotenv()
+OPENAI_TTS_URL = "https://api.openai.com/v1/audio/speech"
+OPENAI_PCM_SAMPLING_RATE = 24000  # response_format=pcm is always 24kHz, 16 bit, mono
 
 class OPENAISynthesizer(BaseSynthesizer):
     def __init__(self, voice, audio_format="mp3", model = "tts-1", stream=False, sampling_rate=8000, buffer_size=400, **kwargs):
         super().__init__(stream, buffer_size)
         self.format = self.get_format(audio_format.lower())
+        self.audio_format = audio_format.lower()
         self.voice = voice
         self.sample_rate = sampling_rate
-        api_key = kwargs.get("synthesizer_key", os.getenv("OPENAI_API_KEY"))
-        self.async_client = AsyncOpenAI(api_key= api_key)
+        self.api_key = kwargs.get("synthesizer_key", os.getenv("OPENAI_API_KEY"))
+        self.async_client = get_openai_client(self.api_key)
         self.model = model
         self.first_chunk_generated = False 
         self.text_queue = deque()
-        self.stream = False
         if type(self.sample_rate) is str:
             self.sample_rate = int(self.sample_rate)
+        # Send 100ms worth of audio as soon as it arrives
+        self.frame_size = OPENAI_PCM_SAMPLING_RATE * 2 // 10
         
     # Ensuring we can only do wav outputs becasue mulaw conversion for others messes up twilio
     def get_format(self, format):
@@ -49,15 +55,40 @@ class OPENAISynthesizer(BaseSynthesizer):
         return buffer.getvalue()
     
     async def __generate_stream(self, text):
-        spoken_response = await self.async_client.audio.speech.create(
-            model=self.model,
-            voice=self.voice,
-            response_format="mp3",
-            input=text
-            )
+        # The SDK reads the entire body before returning, hence reading the raw pcm stream ourselves
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": self.model,
+            "voice": self.voice,
+            "response_format": "pcm",
+            "input": text
+        }
+        resample_state = None
+        async with aiohttp.ClientSession() as session:
+            async with session.post(OPENAI_TTS_URL, headers=headers, json=payload) as response:
+                if response.status != 200:
+                    logger.error(f"Error: {response.status} - {await response.text()}")
+                    return
+                async for frame in yield_frames_from_stream(response.content.iter_chunked(self.frame_size),
+                                                            frame_size=self.frame_size):
+                    if self.sample_rate != OPENAI_PCM_SAMPLING_RATE:
+                        frame, resample_state = audioop.ratecv(frame, 2, 1, OPENAI_PCM_SAMPLING_RATE,
+                                                               self.sample_rate, resample_state)
+                    yield frame if self.audio_format == "pcm" else pcm_to_wav_bytes(frame, self.sample_rate)
 
-        for chunk in spoken_response.iter_bytes(chunk_size=4096):
-            yield chunk
+    def __create_packet(self, audio, meta_info, is_last_chunk):
+        if not self.first_chunk_generated:
+            meta_info["is_first_chunk"] = True
+            self.first_chunk_generated = True
+        else:
+            meta_info["is_first_chunk"] = False
+        if is_last_chunk and "end_of_llm_stream" in meta_info and meta_info["end_of_llm_stream"]:
+            meta_info["end_of_synthesizer_stream"] = True
+            self.first_chunk_generated = False
+        return create_ws_data_packet(audio, meta_info)
 
     async def generate(self):
         try:
@@ -67,16 +98,18 @@ class OPENAISynthesizer(BaseSynthesizer):
                 meta_info, text = message.get("meta_info"), message.get("data")
                 meta_info["text"] = text
                 if self.stream:
-                    async for chunk in self.__generate_stream(text):
-                        if not self.first_chunk_generated:
-                            meta_info["is_first_chunk"] = True
-                            self.first_chunk_generated = True
-                        yield create_ws_data_packet(resample(convert_audio_to_wav(chunk, 'mp3'), self.sample_rate, format="wav"), meta_info)
-                        
-                    if "end_of_llm_stream" in meta_info and meta_info["end_of_llm_stream"]:
-                        meta_info["end_of_synthesizer_stream"] = True
+                    meta_info["format"] = "pcm" if self.audio_format == "pcm" else "wav"
+                    # Hold back one frame so that only the very last frame is marked as the end of the synthesizer stream
+                    previous_frame = None
+                    async for frame in self.__generate_stream(text):
+                        if previous_frame is not None:
+                            yield self.__create_packet(previous_frame, meta_info, is_last_chunk=False)
+                        previous_frame = frame
+
+                    if previous_frame is not None:
+                        yield self.__create_packet(previous_frame, meta_info, is_last_chunk=True)
+                    elif "end_of_llm_stream" in meta_info and meta_info["end_of_llm_stream"]:
                         self.first_chunk_generated = False
-                        yield create_ws_data_packet(b"\x00", meta_info)
 
                 else:
                     logger.info(f"Generating without a stream")
@@ -97,5 +130,5 @@ class OPENAISynthesizer(BaseSynthesizer):
         pass
 
     async def push(self, message):
-        logger.info(f"Pushed message to internal queue {message}")
+        logger.hot("openai_push", "Pushed message to internal queue %s", message)
         self.internal_queue.put_nowait(message)
@@ -83,5 +83,5 @@ class PollySynthesizer(BaseSynthesizer):
             yield create_ws_data_packet(message, meta_info)
 
     async def push(self, message):
-        logger.info("Pushed message to internal queue")
+        logger.hot("polly_push", "Pushed message to internal queue")
         self.internal_queue.put_nowait(message)
@@ -0,0 +1,204 @@
+import time
+import uuid
+from collections import OrderedDict, deque
+from bolna.helpers.logger_config import configure_logger
+
+logger = configure_logger(__name__)
+
+
+class SynthesizerRouter:
+    """
+    Keeps track of first byte latency of the primary and backup synthesizers and decides whose audio is used for each
+    turn. A turn's sentences are separate requests which a synthesizer works through one at a time, so only the
+    request at the head of the primary's queue is timed, from when it was pushed or the primary last produced audio,
+    whichever is later. If it misses its deadline the rest of the turn is hedged to the backup and whichever answers
+    that request first keeps the turn. The backup's audio is held until the primary is done with the audio before
+    it, so that the caller never hears the two out of order. Everything is keyed by role, the backup can be another
+    voice of the primary's provider.
+    """
+    def __init__(self, primary_provider, backup_provider, first_byte_deadline=1.0, min_deadline=0.3, max_deadline=3.0,
+                 percentile=0.95, deadline_multiplier=1.5, window_size=50, max_tracked_requests=256, poll_interval=0.1):
+        self.primary_provider = primary_provider
+        self.backup_provider = backup_provider
+        self.first_byte_deadline = first_byte_deadline
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+        self.percentile = percentile
+        self.deadline_multiplier = deadline_multiplier
+        self.poll_interval = poll_interval
+        self.latencies = {"primary": deque(maxlen=window_size), "backup": deque(maxlen=window_size)}
+        self.requests = OrderedDict()
+        # sequence id -> {"request_ids": [...], "failover": None or the turn's hedge, "emitted": bool}
+        self.turns = OrderedDict()
+        self.max_tracked_requests = max_tracked_requests
+        self.last_primary_audio_at = 0
+        self.wins = {"primary": 0, "backup": 0}
+        self.hedged_requests = 0
+
+    @staticmethod
+    def __get_percentile(samples, percentile):
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(round(percentile * (len(ordered) - 1))))
+        return ordered[index]
+
+    def get_latency_percentiles(self, role):
+        samples = self.latencies.get(role, [])
+        if len(samples) == 0:
+            return None
+        return {
+            "p50": round(self.__get_percentile(samples, 0.5), 4),
+            "p95": round(self.__get_percentile(samples, 0.95), 4),
+            "samples": len(samples)
+        }
+
+    def get_deadline(self, role="primary"):
+        samples = self.latencies.get(role, [])
+        # Not enough history yet, stick to the configured deadline
+        if len(samples) < 5:
+            return self.first_byte_deadline
+        deadline = self.__get_percentile(samples, self.percentile) * self.deadline_multiplier
+        return min(max(deadline, self.min_deadline), self.max_deadline)
+
+    def register_request(self, meta_info):
+        request_id = str(uuid.uuid4())
+        meta_info["synthesizer_request_id"] = request_id
+        sequence_id = meta_info.get("sequence_id")
+        if sequence_id not in self.turns:
+            self.turns[sequence_id] = {"request_ids": [], "failover": None, "emitted": False}
+        turn = self.turns[sequence_id]
+        self.requests[request_id] = {"sequence_id": sequence_id, "index": len(turn["request_ids"]), "pushed_at": time.time(),
+                                     "primary_audio": False, "backup_pushed_at": None, "backup_audio": False}
+        turn["request_ids"].append(request_id)
+        while len(self.requests) > self.max_tracked_requests:
+            self.requests.popitem(last=False)
+        while len(self.turns) > self.max_tracked_requests:
+            self.turns.popitem(last=False)
+        return request_id
+
+    def __get_request(self, request_id):
+        request = self.requests.get(request_id)
+        if request is None or request["sequence_id"] not in self.turns:
+            return None, None
+        return request, self.turns[request["sequence_id"]]
+
+    def __is_head(self, request, turn):
+        """The oldest request of the turn the primary hasn't produced audio for, the one it's working on"""
+        for request_id in turn["request_ids"]:
+            if request_id in self.requests and not self.requests[request_id]["primary_audio"]:
+                return self.requests[request_id] is request
+        return False
+
+    def get_hedge_delay(self, request_id):
+        """Seconds until the request should be pushed to the backup, None if it never should"""
+        request, turn = self.__get_request(request_id)
+        if request is None or request["backup_pushed_at"] is not None:
+            return None
+        failover = turn["failover"]
+        if failover is not None:
+            # Requests of a failed over turn go to the backup as well, unless the primary won after all
+            if failover["winner"] == "primary" or request["index"] < failover["index"]:
+                return None
+            return 0
+        if request["primary_audio"]:
+            return None
+        if not self.__is_head(request, turn):
+            return self.poll_interval
+        started_at = max(request["pushed_at"], self.last_primary_audio_at)
+        return started_at + self.get_deadline() - time.time()
+
+    def mark_hedged(self, request_id):
+        request, turn = self.__get_request(request_id)
+        if request is None:
+            return
+        request["backup_pushed_at"] = time.time()
+        if turn["failover"] is None:
+            self.hedged_requests += 1
+            turn["failover"] = {"request_id": request_id, "index": request["index"], "winner": None, "released": False,
+                                "held": []}
+
+    def __is_stalled(self):
+        return time.time() - self.last_primary_audio_at >= self.get_deadline()
+
+    def __finish_failover(self, failover):
+        """Releases the backup's held audio as the primary is done with everything before it"""
+        failover["released"] = True
+        held, failover["held"] = failover["held"], []
+        return held
+
+    def release_if_stalled(self, request_id):
+        """
+        Returns the backup's held audio if the primary stalled on the audio before the failed over request, an empty
+        list to check again later and None once there's nothing left to release.
+        """
+        request, turn = self.__get_request(request_id)
+        if request is None or turn["failover"] is None or turn["failover"]["request_id"] != request_id:
+            return None
+        failover = turn["failover"]
+        if failover["released"] or failover["winner"] == "primary":
+            return None
+        if failover["winner"] == "backup" and self.__is_stalled():
+            logger.info(f"Primary synthesizer stalled, releasing the backup's audio of turn {request['sequence_id']}")
+            return self.__finish_failover(failover)
+        return []
+
+    def __emit(self, turn, role, packet):
+        if turn["emitted"] and packet["meta_info"].get("is_first_chunk"):
+            # The turn already started with the other synthesizer's audio
+            packet["meta_info"]["is_first_chunk"] = False
+        turn["emitted"] = True
+        return [(role, packet)]
+
+    def route(self, role, packet):
+        """Returns the (role, packet) pairs which should be sent to the output now, in order"""
+        meta_info = packet["meta_info"]
+        request, turn = self.__get_request(meta_info.get("synthesizer_request_id"))
+        if request is None:
+            return [(role, packet)]
+        failover = turn["failover"]
+
+        if role == "primary":
+            if not request["primary_audio"]:
+                request["primary_audio"] = True
+                # Timed from when the primary got to it, not from when it was queued behind the previous request
+                self.latencies["primary"].append(time.time() - max(request["pushed_at"], self.last_primary_audio_at))
+            self.last_primary_audio_at = time.time()
+            if failover is None or failover["winner"] == "primary":
+                return self.__emit(turn, role, packet)
+            if failover["winner"] is None:
+                if request["index"] >= failover["index"]:
+                    failover["winner"] = "primary"
+                    self.wins["primary"] += 1
+                return self.__emit(turn, role, packet)
+            if failover["released"]:
+                return []
+            if request["index"] < failover["index"] and not meta_info.get("end_of_synthesizer_stream"):
+                # The tail of audio from before the failover, the backup's audio waits for it
+                return self.__emit(turn, role, packet)
+            return [pair for held_role, held_packet in self.__finish_failover(failover)
+                    for pair in self.__emit(turn, held_role, held_packet)]
+
+        if failover is None or failover["winner"] == "primary":
+            return []
+        if request["backup_pushed_at"] is not None and not request["backup_audio"]:
+            request["backup_audio"] = True
+            self.latencies["backup"].append(time.time() - request["backup_pushed_at"])
+        if failover["winner"] is None:
+            failover["winner"] = "backup"
+            self.wins["backup"] += 1
+            logger.info(f"Backup synthesizer {self.backup_provider} answered first for turn {request['sequence_id']}")
+            # Nothing of the turn was sent yet or the primary has been silent since, there's nothing to wait for
+            if not turn["emitted"] or self.__is_stalled():
+                failover["released"] = True
+        if failover["released"]:
+            return self.__emit(turn, role, packet)
+        failover["held"].append((role, packet))
+        return []
+
+    def get_stats(self):
+        return {
+            "providers": {"primary": self.primary_provider, "backup": self.backup_provider},
+            "hedged_requests": self.hedged_requests,
+            "wins": self.wins,
+            "latency": {role: self.get_latency_percentiles(role) for role in self.latencies},
+            "deadline": self.get_deadline()
+        }
@@ -2,12 +2,12 @@ from collections import deque
 import aiohttp
 import websockets
 from websockets.exceptions import ConnectionClosed
-import json
 import os
 import audioop
 from dotenv import load_dotenv
 from .base_synthesizer import BaseSynthesizer
 from bolna.helpers.logger_config import configure_logger
+from bolna.helpers import json_codec
 from bolna.helpers.utils import create_ws_data_packet
 
 import asyncio
@@ -84,7 +84,7 @@ class XTTSSynthesizer(BaseSynthesizer):
             "end_of_stream": end_of_llm_stream
         }
 
-        await self.websocket_connection.send(json.dumps(input_message))
+        await self.websocket_connection.send(json_codec.dumps(input_message))
         logger.info(f"Sent to the server {input_message}")
 
     async def receiver(self):
@@ -127,7 +127,7 @@ class XTTSSynthesizer(BaseSynthesizer):
         try:
             if self.stream:
                 async for message in self.receiver():
-                    logger.info(f"Received message friom server")
+                    logger.hot("xtts_audio", "Received message from server")
                     yield create_ws_data_packet(message, self.meta_info)
                     
                     if not self.first_chunk_generated:
@@ -164,7 +164,7 @@ class XTTSSynthesizer(BaseSynthesizer):
                 logger.error(f"Error in xtts generate {e}")
     
     async def push(self, message):
-        logger.info(f"Pushed message to internal queue {message}")
+        logger.hot("xtts_push", "Pushed message to internal queue %s", message)
         if self.stream:
             logger.info(f"Pushing message to internal queue {message}")
             meta_info, text = message.get("meta_info"), message.get("data")
@@ -1,2 +1,7 @@
-from .base_transcriber import BaseTranscriber
-from .deepgram_transcriber import DeepgramTranscriber
+from bolna.helpers.lazy_import import lazy_module_getattr
+
+# Transcribers are imported on first access, see bolna.providers
+__getattr__ = lazy_module_getattr(__name__, {
+    "BaseTranscriber": ".base_transcriber",
+    "DeepgramTranscriber": ".deepgram_transcriber",
+})
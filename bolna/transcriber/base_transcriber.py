@@ -1,8 +1,8 @@
-import json
 import time
 import uuid
 from dotenv import load_dotenv
 from bolna.helpers.logger_config import configure_logger
+from bolna.helpers import json_codec
 
 import asyncio
 import uvloop
@@ -60,7 +60,7 @@ class BaseTranscriber:
 
     async def _close(self, ws, data):
         try:
-            await ws.send(json.dumps(data))
+            await ws.send(json_codec.dumps(data))
         except Exception as e:
             logger.error(f"Error while closing transcriber stream {e}")
     def get_event_loop(self):
@@ -1,25 +1,21 @@
 import asyncio
 import traceback
 import numpy as np
-import torch
 import websockets
 import os
-import json
 import aiohttp
 import time
 from urllib.parse import urlencode
 from dotenv import load_dotenv
 from .base_transcriber import BaseTranscriber
 from bolna.helpers.logger_config import configure_logger
-from bolna.helpers.utils import create_ws_data_packet, int2float
-from bolna.helpers.vad import VAD
+from bolna.helpers import json_codec
+from bolna.helpers.utils import create_ws_data_packet, int2float, torch
 
 import uvloop
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 
-torch.set_num_threads(1)
-
 logger = configure_logger(__name__)
 load_dotenv()
 
@@ -46,6 +42,9 @@ class DeepgramTranscriber(BaseTranscriber):
         self.keywords = keywords
         logger.info(f"self.stream: {self.stream}")
         if self.on_device_vad:
+            # torch and onnxruntime are only needed for on device VAD
+            from bolna.helpers.vad import VAD
+            torch.set_num_threads(1)
             self.vad_model = VAD()
             self.audio = []
             # logger.info("on_device_vad is TRue")
@@ -68,6 +67,9 @@ class DeepgramTranscriber(BaseTranscriber):
         self.last_utterance_time_stamp = time.time()
         self.utterance_end_task = None
         self.audio_frame_duration = 0.0
+        # Inbound telephony audio comes in batches of varying size, so how much was sent is worked out from the bytes
+        self.audio_bytes_per_second = None
+        self.audio_duration_sent = 0.0
 
     def __get_speaker_transcript(self, data):
         transcript_words = []
@@ -94,7 +96,7 @@ class DeepgramTranscriber(BaseTranscriber):
         if self.provider in ('twilio', 'exotel'):
             self.encoding = 'mulaw' if self.provider == "twilio" else "linear16"
             self.sampling_rate = 8000
-            self.audio_frame_duration = 0.2  # With twilio we are sending 200ms at a time
+            self.audio_bytes_per_second = self.sampling_rate * (1 if self.encoding == 'mulaw' else 2)
 
             dg_params['encoding'] = self.encoding
             dg_params['sample_rate'] = self.sampling_rate
@@ -128,7 +130,7 @@ class DeepgramTranscriber(BaseTranscriber):
         try:
             while True:
                 data = {'type': 'KeepAlive'}
-                await ws.send(json.dumps(data))
+                await ws.send(json_codec.dumps(data))
                 await asyncio.sleep(5)  # Send a heartbeat message every 5 seconds
         except Exception as e:
             logger.error('Error while sending: ' + str(e))
@@ -211,7 +213,7 @@ class DeepgramTranscriber(BaseTranscriber):
         frame_np = int2float(audio_int16)
 
         speech_prob = self.vad_model(torch.from_numpy(frame_np.copy()), self.sampling_rate).item()
-        logger.info(f"Speech probability {speech_prob}")
+        logger.hot("speech_probability", "Speech probability %s", speech_prob)
         if float(speech_prob) >= float(self.voice_threshold):
             logger.info(f"It's definitely human voice and hence interrupting {self.meta_info}")
             self.interruption_signalled = True
@@ -237,6 +239,10 @@ class DeepgramTranscriber(BaseTranscriber):
                 if end_of_stream:
                     break
                 self.num_frames += 1
+                if self.audio_bytes_per_second is not None:
+                    self.audio_duration_sent += len(audio_bytes) / self.audio_bytes_per_second
+                else:
+                    self.audio_duration_sent += self.audio_frame_duration
                 await ws.send(ws_data_packet.get('data'))
 
         except Exception as e:
@@ -248,15 +254,15 @@ class DeepgramTranscriber(BaseTranscriber):
         finalized_transcript = ""
         async for msg in ws:
             try:
-                msg = json.loads(msg)
+                msg = json_codec.loads(msg)
 
                 # If connection_start_time is None, it is the duratons of frame submitted till now minus current time
                 if self.connection_start_time is None:
-                    self.connection_start_time = (time.time() - (self.num_frames * self.audio_frame_duration))
+                    self.connection_start_time = time.time() - self.audio_duration_sent
                     logger.info(
-                        f"Connecton start time {self.connection_start_time} {self.num_frames} and {self.audio_frame_duration}")
+                        f"Connecton start time {self.connection_start_time} {self.num_frames} frames and {self.audio_duration_sent}s of audio sent")
 
-                logger.info(f"###### ######### ############# Message from the transcriber {msg}")
+                logger.hot("deepgram_message", lambda: f"###### ######### ############# Message from the transcriber {msg}")
                 if msg['type'] == "Metadata":
                     logger.info(f"Got a summary object {msg}")
                     self.meta_info["transcriber_duration"] = msg["duration"]
@@ -317,7 +323,7 @@ class DeepgramTranscriber(BaseTranscriber):
                     # curr_message = self.__get_speaker_transcript(msg)
                     # Just yield the current transcript as we do not want to wait for is_final. Is_final is just to make 
                     curr_message = finalized_transcript + " " + transcript
-                    logger.info(f"Yielding interim-message current_message = {curr_message}")
+                    logger.hot("interim_message", "Yielding interim-message current_message = %s", curr_message)
                     self.meta_info["include_latency"] = False
                     self.meta_info["utterance_end"] = self.__calculate_utterance_end(msg)
                     self.meta_info["time_received"] = time.time()
@@ -391,7 +397,7 @@ class DeepgramTranscriber(BaseTranscriber):
                 if 'words' in alternative:
                     final_word = alternative['words'][-1]
                     utterance_end = self.connection_start_time + final_word['end']
-                    logger.info(f"Final word ended at {utterance_end}")
+                    logger.hot("final_word", "Final word ended at %s", utterance_end)
         return utterance_end
 
     async def transcribe(self):
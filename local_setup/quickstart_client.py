@@ -4,6 +4,7 @@ import websockets
 import logging
 import base64
 import json
+import struct
 import wave
 import time
 import argparse
@@ -16,6 +17,7 @@ load_dotenv()
 # Argument parsing
 parser = argparse.ArgumentParser(description="Client for WebSocket communication")
 parser.add_argument('--run_mode', type=str, default="tts", choices=["tts", "e2e", "asr"], help="Choose between 'tts', 'asr' and 'e2e'")
+parser.add_argument('--binary_audio', action='store_true', help="Send and receive audio as binary frames instead of base64 JSON")
 args = parser.parse_args()
 
 connection_type = args.run_mode
@@ -36,6 +38,9 @@ start_time = time.time()
 chunks = []
 interruption_message = 0
 
+# Header of binary audio frames: frame type (1 is audio), audio format (1 is pcm) and sequence id
+frame_header = struct.Struct("!BBI")
+
 # WebSocket server address based on connection type
 server_url = "ws://localhost:5001" #os.getenv("BOLNA_WS_SERVER_URL")
 assistant_id = "7b01672e-6453-49c6-997c-0a6546aa9c5a" #os.getenv("ASSISTANT_ID") 
@@ -73,8 +78,11 @@ async def microphone():
 async def emitter(ws):
     while True:
         audio_frame = await input_queue.get()
-        base64_audio_frame = base64.b64encode(audio_frame).decode('utf-8')
-        data = json.dumps({"type": "audio", "data": base64_audio_frame})
+        if args.binary_audio:
+            data = frame_header.pack(1, 1, 0) + audio_frame
+        else:
+            base64_audio_frame = base64.b64encode(audio_frame).decode('utf-8')
+            data = json.dumps({"type": "audio", "data": base64_audio_frame})
         
         global start_time 
         start_time = time.time()
@@ -113,8 +121,7 @@ async def play_audio():
         try:
             global chunks
             if len(chunks) > 0:
-                chunk = chunks.pop(0)
-                audio = base64.b64decode(chunk)
+                audio = chunks.pop(0)
                 print(f"Adjusted audio length: {len(audio)}")  
                 if len(audio) % 2 != 0:
                     print(f"Audio chunk length is odd: {len(audio)}")
@@ -137,6 +144,9 @@ async def receiver(ws):
 
     while True:
         response = await ws.recv()
+        if isinstance(response, bytes):
+            chunks.append(response[frame_header.size:])
+            continue
         response = json.loads(response)
         logging.info(f"{response.keys()}")
         if response["type"] != "audio":
@@ -151,10 +161,10 @@ async def receiver(ws):
                 await asyncio.sleep(0)  # Yield control to allow task cancellation to complete
                 play_audio_task = asyncio.create_task(play_audio())
             continue
-        if response["data"] is None:
+        if response.get("data") is None:
             continue
-        b64_audio = response["data"]
-        chunks.append(b64_audio)
+        if response["type"] == "audio":
+            chunks.append(base64.b64decode(response["data"]))
 
 
 stream = start_audio_stream()
@@ -166,6 +176,8 @@ async def main():
     }
     async with websockets.connect(uri, open_timeout=None, extra_headers=headers) as ws:
         global play_audio_task
+        if args.binary_audio:
+            await ws.send(json.dumps({"type": "config", "audio_framing": "binary"}))
         print("NOW IN THE GATHER PART")
         tasks = [microphone(), emitter(ws), receiver(ws)]
         play_audio_task = asyncio.create_task(play_audio())
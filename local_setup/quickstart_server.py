@@ -7,17 +7,27 @@ from fastapi.middleware.cors import CORSMiddleware
 import redis.asyncio as redis
 from dotenv import load_dotenv
 from bolna.helpers.utils import store_file
+from bolna.helpers.filler_helpers import generate_filler_audio
 from bolna.prompts import *
 from bolna.helpers.logger_config import configure_logger
 from bolna.models import *
-from bolna.llms import LiteLLM
 from bolna.agent_manager.assistant_manager import AssistantManager
+from bolna.agent_manager.agent_plan import AgentPlanCache
+from bolna.memory.cache import VectorCache
 
 load_dotenv()
 logger = configure_logger(__name__)
 
 redis_pool = redis.ConnectionPool.from_url(os.getenv('REDIS_URL'), decode_responses=True)
 redis_client = redis.Redis.from_pool(redis_pool)
+agent_plan_cache = AgentPlanCache(redis_client, max_plans=int(os.getenv("AGENT_PLAN_CACHE_SIZE", 256)),
+                                  max_age=float(os.getenv("AGENT_PLAN_MAX_AGE", 30)))
+# Semantic response cache shared by every call, off unless SEMANTIC_CACHE_SIZE is set. Entries are scoped per agent,
+# system prompt and conversation state so calls of different agents never share answers
+semantic_cache_size = int(os.getenv("SEMANTIC_CACHE_SIZE", 0))
+semantic_cache = VectorCache(capacity=semantic_cache_size,
+                             similarity_threshold=float(os.getenv("SEMANTIC_CACHE_SIMILARITY_THRESHOLD", 0.8))) \
+    if semantic_cache_size > 0 else None
 active_websockets: List[WebSocket] = []
 
 app = FastAPI()
@@ -31,6 +41,11 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def listen_for_agent_updates():
+    app.state.agent_updates_task = asyncio.create_task(agent_plan_cache.listen_for_updates())
+
+
 class CreateAgentPayload(BaseModel):
     agent_config: AgentModel
     agent_prompts: Optional[Dict[str, Dict[str, str]]]
@@ -48,6 +63,7 @@ async def create_agent(agent_data: CreateAgentPayload):
         logger.info("Setting up follow up tasks")
         for index, task in enumerate(data_for_db['tasks']):
             if task['task_type'] == "extraction":
+                from bolna.llms import LiteLLM
                 extraction_prompt_llm = os.getenv("EXTRACTION_PROMPT_GENERATION_MODEL")
                 extraction_prompt_generation_llm = LiteLLM(streaming_model=extraction_prompt_llm, max_tokens=2000)
                 extraction_prompt = await extraction_prompt_generation_llm.generate(
@@ -56,12 +72,16 @@ async def create_agent(agent_data: CreateAgentPayload):
                         {'role': 'user', 'content': data_for_db["tasks"][index]['tools_config']["llm_agent"]['extraction_details']}
                     ])
                 data_for_db["tasks"][index]["tools_config"]["llm_agent"]['extraction_json'] = extraction_prompt
+            elif task['task_type'] == "conversation" and task.get("use_fillers", False) and task['tools_config']['synthesizer'] is not None:
+                logger.info(f"Pre-synthesizing filler audio for task {index}")
+                await generate_filler_audio(task, agent_uuid, local=True)
 
     stored_prompt_file_path = f"{agent_uuid}/conversation_details.json"
     await asyncio.gather(
         redis_client.set(agent_uuid, json.dumps(data_for_db)),
         store_file(file_key=stored_prompt_file_path, file_data=agent_prompts, local=True)
     )
+    await agent_plan_cache.publish_update(agent_uuid)
 
     return {"agent_id": agent_uuid, "state": "created"}
 
@@ -74,17 +94,16 @@ async def websocket_endpoint(agent_id: str, websocket: WebSocket, user_agent: st
     logger.info("Connected to ws")
     await websocket.accept()
     active_websockets.append(websocket)
-    agent_config, context_data = None, None
+    agent_plan, context_data = None, None
     try:
-        retrieved_agent_config = await redis_client.get(agent_id)
-        logger.info(
-            f"Retrieved agent config: {retrieved_agent_config}")
-        agent_config = json.loads(retrieved_agent_config)
+        agent_plan = await agent_plan_cache.get(agent_id)
+        logger.info(f"Using plan {agent_plan.version} of agent {agent_id}")
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=404, detail="Agent not found")
 
-    assistant_manager = AssistantManager(agent_config, websocket, agent_id)
+    assistant_manager = AssistantManager(agent_plan.agent_config, websocket, agent_id, semantic_cache=semantic_cache,
+                                         plan=agent_plan)
 
     try:
         async for index, task_output in assistant_manager.run(local=True):